@@ -2,13 +2,119 @@
 Cached, DynamoDB-backed sessions.
 """
 
+import copy
+import itertools
+import threading
+
 from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
 from django.core.cache import cache
 
+from dynamodb_sessions.backends.dynamodb import (
+    CIRCUIT_BREAKER_FALLBACK,
+    HASH_ATTRIB_NAME,
+    next_version,
+)
 from dynamodb_sessions.backends.dynamodb import SessionStore as DynamoDBStore
+from dynamodb_sessions.backends.dynamodb import session_engine
+from dynamodb_sessions.circuit_breaker import is_unavailable
+from dynamodb_sessions.engines import EXISTS, NO_VERSION, VERSION_IS
+from dynamodb_sessions.lru import LRUCache
+from dynamodb_sessions.metrics import CACHE_REQUESTS
+from dynamodb_sessions.write_behind import DELETE, WriteBehindQueue
 
 KEY_PREFIX = "dynamodb_sessions.backends.cached_dynamodb"
 
+# Optional per-process LRU in front of the Django cache. Entries live for at
+# most LOCAL_CACHE_TTL seconds (or until the session expires, if sooner), so
+# writes made by other workers are picked up within that delay. Sessions
+# loaded from it are only written over the version they were loaded at.
+LOCAL_CACHE_SIZE = getattr(settings, "DYNAMODB_SESSIONS_LOCAL_CACHE_SIZE", 0)
+LOCAL_CACHE_TTL = getattr(settings, "DYNAMODB_SESSIONS_LOCAL_CACHE_TTL", 5)
+
+# Write-behind: saves update the cache right away and are written to DynamoDB
+# by a background thread. When the queue is full, saves are synchronous.
+WRITE_BEHIND = getattr(settings, "DYNAMODB_SESSIONS_WRITE_BEHIND", False)
+WRITE_BEHIND_QUEUE_SIZE = getattr(
+    settings, "DYNAMODB_SESSIONS_WRITE_BEHIND_QUEUE_SIZE", 10000
+)
+WRITE_BEHIND_FLUSH_INTERVAL = getattr(
+    settings, "DYNAMODB_SESSIONS_WRITE_BEHIND_FLUSH_INTERVAL", 0.05
+)
+
+
+class LocalCache:
+    """
+    Per-process session cache.
+
+    Every entry carries the version it was stored at, taken from a
+    process-wide counter. Loads take a version before reading the shared
+    cache or DynamoDB, while saves and deletes take a new one when they
+    complete, so a slow load can never replace what a concurrent save or
+    delete stored after it started. Deletes leave a tombstone for the same
+    reason. Data is copied in and out, since sessions are mutated in place.
+
+    The counter only orders what happens in this process: entries written
+    by other processes are told apart by the version stored with the
+    session (see ``SessionStore._build_update()``).
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.ttl = ttl
+        self._entries = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._clock = itertools.count(1)
+
+    def version(self):
+        return next(self._clock)
+
+    def get(self, session_key):
+        return copy.deepcopy(self.peek(session_key))
+
+    def peek(self, session_key):
+        """
+        Returns the cached data itself, which must not be modified.
+        """
+        entry = self._entries.get(session_key)
+        return None if entry is None else entry[1]
+
+    def put(self, session_key, data, expiry_age, version):
+        """
+        Stores ``data`` as read (or written) at ``version``, unless the
+        session was written or deleted by this process since.
+        """
+        data = copy.deepcopy(data)
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is not None and entry[0] > version:
+                return
+            self._entries.set(session_key, (version, data), min(self.ttl, expiry_age))
+
+    def invalidate(self, session_key):
+        with self._lock:
+            self._entries.set(session_key, (self.version(), None))
+
+    def clear(self):
+        self._entries.clear()
+
+
+class VersionConflict(Exception):
+    """
+    Raised when a session loaded from the local cache was written elsewhere
+    since.
+    """
+
+
+local_cache = LocalCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL) if LOCAL_CACHE_SIZE else None
+
+write_behind = (
+    WriteBehindQueue(
+        session_engine, WRITE_BEHIND_QUEUE_SIZE, WRITE_BEHIND_FLUSH_INTERVAL
+    )
+    if WRITE_BEHIND
+    else None
+)
+
 
 class SessionStore(DynamoDBStore):
     """
@@ -17,35 +123,525 @@ class SessionStore(DynamoDBStore):
 
     def __init__(self, session_key=None):
         super().__init__(session_key)
+        # Whether the last save only wrote the entries it changed.
+        self._delta_written = False
+        # (session_key, version) of what's known to be stored, and
+        # (session_key, cached data) of the local cache entry the session
+        # was loaded from.
+        self._stored_version = None
+        self._local_entry = None
 
     @property
     def cache_key(self):
         return KEY_PREFIX + self._get_or_create_session_key()
 
     def load(self):
-        data = cache.get(self.cache_key, None)
+        session_key = self.session_key
+        use_local = local_cache is not None and session_key is not None
+        self._local_entry = None
+        if use_local:
+            entry = local_cache.peek(session_key)
+            data = self._from_cache(copy.deepcopy(entry))
+            self._cache_lookup("local", data)
+            if data is not None:
+                self._local_entry = (session_key, entry)
+                return data
+            version = local_cache.version()
+
+        data = self._from_cache(cache.get(self.cache_key, None))
+        self._cache_lookup("shared", data)
+        if data is None:
+            data = self._load_pending()
         if data is None:
             data = super().load()
+            if self._degraded:
+                # Not cached, the next request tries DynamoDB again.
+                return data
             if self.session_key is not None:
-                cache.set(self.cache_key, data, self.get_expiry_date())
+                cache.set(
+                    self.cache_key,
+                    self._cache_entry(data),
+                    self.get_expiry_age(expiry=data.get("_session_expiry")),
+                )
+        if use_local and self.session_key is not None:
+            self._put_local(
+                data, self.get_expiry_age(expiry=data.get("_session_expiry")), version
+            )
         return data
 
+    async def aload(self):
+        session_key = self.session_key
+        use_local = local_cache is not None and session_key is not None
+        self._local_entry = None
+        if use_local:
+            entry = local_cache.peek(session_key)
+            data = self._from_cache(copy.deepcopy(entry))
+            self._cache_lookup("local", data)
+            if data is not None:
+                self._local_entry = (session_key, entry)
+                return data
+            version = local_cache.version()
+
+        data = self._from_cache(await cache.aget(self.cache_key, None))
+        self._cache_lookup("shared", data)
+        if data is None:
+            data = self._load_pending()
+        if data is None:
+            data = await super().aload()
+            if self._degraded:
+                return data
+            if self.session_key is not None:
+                await cache.aset(
+                    self.cache_key,
+                    self._cache_entry(data),
+                    self.get_expiry_age(expiry=data.get("_session_expiry")),
+                )
+        if use_local and self.session_key is not None:
+            self._put_local(
+                data, self.get_expiry_age(expiry=data.get("_session_expiry")), version
+            )
+        return data
+
+    def _cache_entry(self, data):
+        """
+        Returns what's cached for the session: its data and, when known, the
+        digest, TTL, chunks and version of the stored session, so that loads
+        from the cache can still skip unchanged writes.
+        """
+        if (
+            self._stored is None
+            or self._stored[0] != self.session_key
+            or self._stored_chunks is None
+            or self._stored_chunks[0] != self.session_key
+            or self._stored_version is None
+            or self._stored_version[0] != self.session_key
+        ):
+            return data
+        return (
+            data,
+            self._stored[1],
+            self._stored[2],
+            self._stored_chunks[1],
+            self._stored_version[1],
+        )
+
+    def _from_cache(self, entry):
+        """
+        Returns the session data of a cache entry, restoring what's known of
+        the stored session.
+        """
+        if isinstance(entry, tuple):
+            data, digest, ttl, chunks = entry[:4]
+            self._stored = (self.session_key, digest, ttl)
+            self._stored_chunks = (self.session_key, list(chunks))
+            # Entries cached by earlier versions don't have it.
+            self._stored_version = (
+                (self.session_key, entry[4]) if len(entry) > 4 else None
+            )
+            return data
+        return entry
+
+    def _session_from_item(self, item, response, duration):
+        session_data = super()._session_from_item(item, response, duration)
+        if session_data is not None:
+            self._stored_version = (self.session_key, item.get("version"))
+        return session_data
+
+    @staticmethod
+    def _cached_data(entry):
+        return entry[0] if isinstance(entry, tuple) else entry
+
+    def _cache_lookup(self, cache_name, data):
+        self.metrics.increment(
+            CACHE_REQUESTS,
+            cache=cache_name,
+            result="miss" if data is None else "hit",
+        )
+
+    def _load_pending(self):
+        """
+        Returns the session data still waiting in the write-behind queue, or
+        ``None`` if nothing is pending for this session.
+        """
+        if write_behind is None:
+            return None
+        pending = write_behind.pending(self.session_key)
+        if pending is False:
+            return None
+        if pending is DELETE:
+            self._session_key = None
+            return {}
+        return self._decode_item(pending)[0]
+
+    def _pending_exists(self, session_key):
+        """
+        Whether the write-behind queue knows if ``session_key`` exists:
+        ``True`` or ``False``, or ``None`` if nothing is pending for it.
+        """
+        if write_behind is None:
+            return None
+        pending = write_behind.pending(session_key)
+        if pending is False:
+            return None
+        return pending is not DELETE
+
     def exists(self, session_key):
         if session_key and (KEY_PREFIX + session_key) in cache:
             return True
+        if session_key:
+            pending = self._pending_exists(session_key)
+            if pending is not None:
+                return pending
         return super().exists(session_key)
 
+    async def aexists(self, session_key):
+        if session_key and await cache.ahas_key(KEY_PREFIX + session_key):
+            return True
+        if session_key:
+            pending = self._pending_exists(session_key)
+            if pending is not None:
+                return pending
+        return await super().aexists(session_key)
+
     def save(self, must_create=False):
-        super().save(must_create)
-        cache.set(self.cache_key, self._session, self.get_expiry_age())
+        if self._degraded:
+            return
+        self._delta_written = False
+        if write_behind is not None and self._queueable(must_create):
+            update = self._build_update(delta=False)
+            if update is not None and not self._queue_update(update):
+                self._write_update(update)
+        else:
+            super().save(must_create)
+        if self._degraded:
+            return
+        if self._delta_written:
+            cache.delete(self.cache_key)
+            _invalidate_local([self.session_key])
+            return
+        cache.set(
+            self.cache_key, self._cache_entry(self._session), self.get_expiry_age()
+        )
+        self._save_local()
+
+    async def asave(self, must_create=False):
+        if self._degraded:
+            return
+        self._delta_written = False
+        if write_behind is not None and self._queueable(must_create):
+            await self._aget_session()
+            update = self._build_update(delta=False)
+            if update is not None and not self._queue_update(update):
+                await self._awrite_update(update)
+        else:
+            await super().asave(must_create)
+        if self._degraded:
+            return
+        if self._delta_written:
+            await cache.adelete(self.cache_key)
+            _invalidate_local([self.session_key])
+            return
+        await cache.aset(
+            self.cache_key, self._cache_entry(self._session), self.get_expiry_age()
+        )
+        self._save_local()
+
+    def _build_update(self, must_create=False, delta=True):
+        update = super()._build_update(must_create, delta)
+        if local_cache is None or update is None or update.kind == "ttl":
+            return update
+        # The local cache of another process may hold an older version of
+        # the session: its saves must not overwrite this one.
+        update.set_values.setdefault("version", next_version())
+        if self._loaded_locally() and update.condition in (None, EXISTS):
+            version = self._stored_version[1]
+            if version is None:
+                return update._replace(condition=NO_VERSION)
+            return update._replace(
+                condition=VERSION_IS, condition_values={":version": version}
+            )
+        return update
+
+    def _loaded_locally(self):
+        return (
+            self._local_entry is not None
+            and self._local_entry[0] == self.session_key
+        )
+
+    def _write_update(self, update):
+        try:
+            super()._write_update(update)
+        except VersionConflict:
+            data = self._load_pending()
+            if data is None:
+                data = super().load()
+            if self._merge(data):
+                update = self._build_update()
+                if update is not None:
+                    super()._write_update(update)
+
+    async def _awrite_update(self, update):
+        try:
+            await super()._awrite_update(update)
+        except VersionConflict:
+            data = self._load_pending()
+            if data is None:
+                data = await super().aload()
+            if self._merge(data):
+                update = self._build_update()
+                if update is not None:
+                    await super()._awrite_update(update)
+
+    def _merge(self, data):
+        """
+        Applies the changes made to the session since it was loaded from the
+        local cache to ``data``, the session as stored by another process:
+        the entries set, changed or deleted since.
+
+        :returns: ``False`` if DynamoDB was unavailable to read ``data``, and
+            the session can't be saved.
+        :raises: ``UpdateError`` if the session was deleted meanwhile.
+        """
+        loaded = self._cached_data(copy.deepcopy(self._local_entry[1]))
+        self._local_entry = None
+        if self._degraded:
+            return False
+        if self.session_key is None:
+            raise UpdateError
+        session = self._session
+        for key in loaded:
+            if key not in session:
+                data.pop(key, None)
+        for key, value in session.items():
+            if key not in loaded or loaded[key] != value:
+                data[key] = value
+        self._session_cache = data
+        return True
+
+    def _update_failed(self, update, error):
+        if (
+            update.condition in (VERSION_IS, NO_VERSION)
+            and error.response["Error"]["Code"] == "ConditionalCheckFailedException"
+        ):
+            raise VersionConflict(update.session_key)
+        return super()._update_failed(update, error)
+
+    def _write_failed(self, update, error):
+        # With the "cache" fallback, the write is queued behind rather than
+        # dropped, while the session is served from the cache.
+        if (
+            CIRCUIT_BREAKER_FALLBACK == "cache"
+            and write_behind is not None
+            and is_unavailable(error)
+            and self._queue_update(update)
+        ):
+            return True
+        return super()._write_failed(update, error)
+
+    def _queueable(self, must_create):
+        # Creates are conditional writes, which can't be queued.
+        # Sessions moving to the current bucket's table need a new key.
+        return (
+            not must_create
+            and self.session_key
+            and not self._key_reserved
+            and not self._rotated_out()
+        )
+
+    def _update_written(self, update):
+        # A delta is merged into the stored session, which may hold entries
+        # saved concurrently that this one doesn't: caching this session
+        # would drop them, so the next load reads the merged item instead.
+        super()._update_written(update)
+        self._delta_written = update.kind == "delta"
+        if update.kind != "ttl":
+            self._stored_version = (
+                update.session_key,
+                update.set_values.get("version"),
+            )
+            self._local_entry = None
+
+    def _save_local(self):
+        if local_cache is not None:
+            self._put_local(self._session, self.get_expiry_age(), local_cache.version())
+
+    def _put_local(self, data, expiry_age, version):
+        entry = self._cache_entry(data)
+        if isinstance(entry, tuple):
+            local_cache.put(self.session_key, entry, expiry_age, version)
+        else:
+            # Without the stored version, saves from the local cache couldn't
+            # be checked against the writes of other processes.
+            local_cache.invalidate(self.session_key)
+
+    def _queue_update(self, update):
+        """
+        Queues ``update`` in the write-behind queue. Conditional creates,
+        writes that don't fit in the queue, writes of chunked payloads
+        (whose chunks must be stored or removed along with the item) and
+        writes of sessions loaded from the local cache (checked against the
+        stored version) must be made synchronously.
+
+        :returns: ``True`` if the update was queued.
+        """
+        if (
+            update.chunks
+            or update.condition in (VERSION_IS, NO_VERSION)
+            or self._stale_chunks(update)
+        ):
+            return False
+        item = None
+        if update.kind == "full":
+            item = dict(update.set_values)
+        else:
+            # A TTL refresh can only be queued on top of a pending put.
+            pending = write_behind.pending(update.session_key)
+            if pending:
+                item = dict(pending, **update.set_values)
+        if item is not None:
+            item[HASH_ATTRIB_NAME] = update.session_key
+            if write_behind.put(update.session_key, item):
+                self._update_written(update)
+                return True
+        return False
 
     def delete(self, session_key=None):
-        super().delete(session_key)
         if session_key is None:
             if self.session_key is None:
                 return
             session_key = self.session_key
+        if write_behind is not None and write_behind.put(session_key, DELETE):
+            self._item_deleted(session_key)
+        else:
+            super().delete(session_key)
         cache.delete(KEY_PREFIX + session_key)
+        if local_cache is not None:
+            local_cache.invalidate(session_key)
+
+    async def adelete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        if write_behind is not None and write_behind.put(session_key, DELETE):
+            self._item_deleted(session_key)
+        else:
+            await super().adelete(session_key)
+        await cache.adelete(KEY_PREFIX + session_key)
+        if local_cache is not None:
+            local_cache.invalidate(session_key)
+
+    @classmethod
+    def load_many(cls, session_keys):
+        """
+        Like ``DynamoDBStore.load_many()``, reading the shared cache and the
+        write-behind queue first. Sessions read from DynamoDB aren't cached.
+        """
+        store, session_keys = cls(), list(session_keys)
+        found, session_keys = store._cached_many(
+            session_keys, cache.get_many(_cache_keys(session_keys))
+        )
+        for session_key, session_data in found.items():
+            if session_data is not None:
+                yield session_key, session_data
+        yield from super().load_many(session_keys)
+
+    @classmethod
+    async def aload_many(cls, session_keys):
+        store, session_keys = cls(), list(session_keys)
+        found, session_keys = store._cached_many(
+            session_keys, await cache.aget_many(_cache_keys(session_keys))
+        )
+        for session_key, session_data in found.items():
+            if session_data is not None:
+                yield session_key, session_data
+        async for pair in super().aload_many(session_keys):
+            yield pair
+
+    @classmethod
+    def exists_many(cls, session_keys):
+        store, session_keys = cls(), list(session_keys)
+        found, session_keys = store._cached_many(
+            session_keys, cache.get_many(_cache_keys(session_keys))
+        )
+        for session_key, session_data in found.items():
+            yield session_key, session_data is not None
+        yield from super().exists_many(session_keys)
+
+    @classmethod
+    async def aexists_many(cls, session_keys):
+        store, session_keys = cls(), list(session_keys)
+        found, session_keys = store._cached_many(
+            session_keys, await cache.aget_many(_cache_keys(session_keys))
+        )
+        for session_key, session_data in found.items():
+            yield session_key, session_data is not None
+        async for pair in super().aexists_many(session_keys):
+            yield pair
+
+    def _cached_many(self, session_keys, cached):
+        """
+        Sorts ``session_keys`` into those known from ``cached`` (what the
+        shared cache holds, by cache key) or the write-behind queue, and
+        those to look up in DynamoDB.
+
+        :returns: ``(found, rest)``: the session data found by key (``None``
+            for sessions pending deletion, or expired), and the other keys.
+        """
+        found, rest = {}, []
+        for session_key in dict.fromkeys(session_keys):
+            if not session_key:
+                continue
+            session_data = self._cached_data(cached.get(KEY_PREFIX + session_key))
+            if session_data is None and write_behind is not None:
+                pending = write_behind.pending(session_key)
+                if pending is DELETE or (
+                    pending is not False and self._live(pending) is None
+                ):
+                    found[session_key] = None
+                    continue
+                if pending is not False:
+                    session_data = self._decode_item(pending)[0]
+            if session_data is None:
+                rest.append(session_key)
+            else:
+                found[session_key] = session_data
+        return found, rest
+
+    @classmethod
+    def delete_many(cls, session_keys):
+        session_keys = [key for key in dict.fromkeys(session_keys) if key]
+        failed = super().delete_many(cls._queue_deletes(session_keys))
+        cache.delete_many(_cache_keys(session_keys))
+        _invalidate_local(session_keys)
+        return failed
+
+    @classmethod
+    async def adelete_many(cls, session_keys):
+        session_keys = [key for key in dict.fromkeys(session_keys) if key]
+        failed = await super().adelete_many(cls._queue_deletes(session_keys))
+        await cache.adelete_many(_cache_keys(session_keys))
+        _invalidate_local(session_keys)
+        return failed
+
+    @classmethod
+    def _queue_deletes(cls, session_keys):
+        """
+        Queues the deletion of ``session_keys`` in the write-behind queue, if
+        any, so pending writes can't bring the sessions back.
+
+        :returns: The keys to delete synchronously.
+        """
+        if write_behind is None:
+            return session_keys
+        store = cls()
+        rest = []
+        for session_key in session_keys:
+            if write_behind.put(session_key, DELETE):
+                store._item_deleted(session_key)
+            else:
+                rest.append(session_key)
+        return rest
 
     def flush(self):
         """
@@ -56,3 +652,18 @@ class SessionStore(DynamoDBStore):
         self.clear()
         self.delete(self.session_key)
         self._session_key = None
+
+    async def aflush(self):
+        self.clear()
+        await self.adelete(self.session_key)
+        self._session_key = None
+
+
+def _cache_keys(session_keys):
+    return [KEY_PREFIX + session_key for session_key in session_keys if session_key]
+
+
+def _invalidate_local(session_keys):
+    if local_cache is not None:
+        for session_key in session_keys:
+            local_cache.invalidate(session_key)
@@ -1,25 +1,80 @@
-import base64
+import asyncio
+import hashlib
 import logging
+import math
 import os
+import re
 import sys
+import threading
 import time
-import zlib
-from datetime import timedelta
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
 
-import boto3
-from boto3.dynamodb.conditions import Attr as DynamoConditionAttr
 from botocore.config import Config
 from botocore.exceptions import ClientError
-from dateutil.parser import parse
 from django.conf import settings
-from django.contrib.sessions.backends.base import CreateError, SessionBase
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.base import (
+    VALID_KEY_CHARS,
+    CreateError,
+    SessionBase,
+)
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+from dynamodb_sessions.chunks import ChunkError, TableChunkStore, chunk_keys
+from dynamodb_sessions.circuit_breaker import is_unavailable
+from dynamodb_sessions.cleanup import ExpiredSessionCleaner
+from dynamodb_sessions.codec import Codec, load_dictionaries
+from dynamodb_sessions.connection import AsyncConnectionManager, ConnectionManager
+from dynamodb_sessions.engines import (
+    BATCH_GET_SIZE,
+    BATCH_WRITE_SIZE,
+    ENGINES,
+    EXISTS,
+    NOT_EXISTS,
+    batches,
+)
+from dynamodb_sessions.lazy import (
+    LazySessionDict,
+    is_index,
+    pack_index,
+    unpack_index,
+)
+from dynamodb_sessions.lru import LRUCache
+from dynamodb_sessions.metrics import (
+    CONSUMED_CAPACITY,
+    PAYLOAD_BYTES,
+    REQUEST_SECONDS,
+    RETRIES,
+    Metrics,
+)
+from dynamodb_sessions.rotation import RotatingEngine
+from dynamodb_sessions.routing import RoutingEngine
 
 TABLE_NAME = getattr(settings, "DYNAMODB_SESSIONS_TABLE_NAME", "sessions")
 HASH_ATTRIB_NAME = getattr(
     settings, "DYNAMODB_SESSIONS_TABLE_HASH_ATTRIB_NAME", "session_key"
 )
 ALWAYS_CONSISTENT = getattr(settings, "DYNAMODB_SESSIONS_ALWAYS_CONSISTENT", True)
+# "strong" reads are always consistent, "eventual" never. "adaptive" reads are
+# eventually consistent, and repeated consistently when the item read is older
+# than a write made in the last CONSISTENCY_WINDOW seconds, as remembered by
+# the process or echoed in the version cookie (see middleware.py).
+READ_CONSISTENCY = getattr(
+    settings,
+    "DYNAMODB_SESSIONS_READ_CONSISTENCY",
+    "strong" if ALWAYS_CONSISTENT else "eventual",
+)
+CONSISTENCY_WINDOW = getattr(settings, "DYNAMODB_SESSIONS_CONSISTENCY_WINDOW", 5)
+RECENT_WRITES_SIZE = getattr(settings, "DYNAMODB_SESSIONS_RECENT_WRITES_SIZE", 10000)
+VERSION_COOKIE_NAME = getattr(
+    settings, "DYNAMODB_SESSIONS_VERSION_COOKIE_NAME", "sessionversion"
+)
 
 USE_LOCAL_DYNAMODB_SERVER = getattr(settings, "USE_LOCAL_DYNAMODB_SERVER", False)
 BOTO_CORE_CONFIG = getattr(settings, "BOTO_CORE_CONFIG", None)
@@ -32,15 +87,131 @@ DYNAMO_SESSION_DATA_SIZE_WARNING_LIMIT = getattr(
 )
 DYNAMO_REGION_NAME = getattr(settings, "DYNAMO_REGION_NAME", "us-west-2")
 
+# Size of the HTTP connection pool shared by every thread of a worker.
+MAX_POOL_CONNECTIONS = getattr(settings, "DYNAMODB_SESSIONS_MAX_POOL_CONNECTIONS", 10)
+TCP_KEEPALIVE = getattr(settings, "DYNAMODB_SESSIONS_TCP_KEEPALIVE", True)
+
+# Number of keep-alive connections prewarm() opens per endpoint. It's called
+# from the server's worker startup hook (see the README).
+PREWARM_CONNECTIONS = getattr(settings, "DYNAMODB_SESSIONS_PREWARM_CONNECTIONS", 1)
+
+# Replicas of a global table, as boto3 client options overriding the default
+# ones (e.g. {"region_name": "eu-west-1"}). Writes and strongly consistent
+# reads go to the home endpoint, eventually consistent reads to the fastest
+# one, hedged to the next fastest after this percentile of its latencies
+# (None disables hedging).
+ENDPOINTS = getattr(settings, "DYNAMODB_SESSIONS_ENDPOINTS", [])
+HOME_ENDPOINT = getattr(settings, "DYNAMODB_SESSIONS_HOME_ENDPOINT", 0)
+HEDGE_PERCENTILE = getattr(settings, "DYNAMODB_SESSIONS_HEDGE_PERCENTILE", 0.95)
+
+# Length, in seconds, of the time buckets sessions tables are rotated by (e.g.
+# a week), or None to keep every session in a single table. See rotation.py.
+TABLE_ROTATION = getattr(settings, "DYNAMODB_SESSIONS_TABLE_ROTATION", None)
+
+# "resource" goes through the boto3 Table resource, "client" talks to the
+# low-level client directly with hand-built attribute maps.
+ENGINE = getattr(settings, "DYNAMODB_SESSIONS_ENGINE", "resource")
+
+# Don't rewrite a payload that is byte-identical to the stored one. Only the
+# TTL is refreshed, and at most once per refresh interval (in seconds).
+SKIP_UNCHANGED_WRITES = getattr(settings, "DYNAMODB_SESSIONS_SKIP_UNCHANGED_WRITES", True)
+TTL_REFRESH_INTERVAL = getattr(settings, "DYNAMODB_SESSIONS_TTL_REFRESH_INTERVAL", 60)
+
+# Payload compression: "zlib", "lz4", "zstd" (when installed) or "none".
+# Payloads below the threshold (in bytes) are stored uncompressed.
+COMPRESSION = getattr(settings, "DYNAMODB_SESSIONS_COMPRESSION", "zlib")
+COMPRESSION_LEVEL = getattr(settings, "DYNAMODB_SESSIONS_COMPRESSION_LEVEL", None)
+COMPRESSION_THRESHOLD = getattr(
+    settings, "DYNAMODB_SESSIONS_COMPRESSION_THRESHOLD", 128
+)
+# Paths of trained zstd dictionaries (see the train_session_dictionary
+# command). The first one compresses new payloads, all of them can be read.
+ZSTD_DICTIONARIES = getattr(settings, "DYNAMODB_SESSIONS_ZSTD_DICTIONARIES", [])
+
+# "blob" stores the whole session in one binary attribute. "attributes"
+# stores each top-level session key in its own entry of a map attribute, and
+# saves only send the entries that changed. "index" stores one binary
+# attribute too, holding each top-level value serialized on its own: values
+# are only deserialized when accessed, and untouched ones are written back as
+# they were read.
+STORAGE_LAYOUT = getattr(settings, "DYNAMODB_SESSIONS_STORAGE_LAYOUT", "blob")
+
+# With the "blob" and "index" layouts, payloads larger than this many bytes
+# (once compressed) are split into chunks of this size, stored apart from the
+# session's item. None disables it, leaving DynamoDB's 400 KB item limit.
+CHUNK_SIZE = getattr(settings, "DYNAMODB_SESSIONS_CHUNK_SIZE", 350000)
+# Dotted path of the ChunkStore class chunks go to, and the keyword arguments
+# it's built with. Defaults to items of the session table.
+CHUNK_STORE = getattr(settings, "DYNAMODB_SESSIONS_CHUNK_STORE", None)
+CHUNK_STORE_OPTIONS = getattr(settings, "DYNAMODB_SESSIONS_CHUNK_STORE_OPTIONS", {})
+
+# Keys not matching this pattern are rejected without a network call. Django
+# generates 32 lowercase alphanumeric characters. Set to None to disable.
+KEY_PATTERN = getattr(settings, "DYNAMODB_SESSIONS_KEY_PATTERN", r"[a-z0-9]{32}")
+# Remember up to this many keys recently confirmed absent, for this many
+# seconds, so repeated garbage cookies don't cost a read each. 0 disables it.
+NEGATIVE_CACHE_SIZE = getattr(settings, "DYNAMODB_SESSIONS_NEGATIVE_CACHE_SIZE", 0)
+NEGATIVE_CACHE_TTL = getattr(settings, "DYNAMODB_SESSIONS_NEGATIVE_CACHE_TTL", 60)
+
+# clear_expired() scans the table in this many parallel segments, consuming
+# at most this many capacity units per second (None for no limit).
+CLEAR_EXPIRED_SEGMENTS = getattr(settings, "DYNAMODB_SESSIONS_CLEAR_EXPIRED_SEGMENTS", 4)
+CLEAR_EXPIRED_MAX_CAPACITY = getattr(
+    settings, "DYNAMODB_SESSIONS_CLEAR_EXPIRED_MAX_CAPACITY", None
+)
+
+# create() only reserves a new key, and the next save() creates the session
+# with its data in a single conditional write, instead of writing it twice.
+LAZY_CREATE = getattr(settings, "DYNAMODB_SESSIONS_LAZY_CREATE", False)
+
+# Name of the global secondary index on the "user_id" attribute, written with
+# the authenticated user's ID (see revoke_user_sessions()). None doesn't write
+# the attribute.
+USER_INDEX = getattr(settings, "DYNAMODB_SESSIONS_USER_INDEX", None)
+
+# Number of BatchGetItem / BatchWriteItem requests the bulk methods
+# (load_many(), exists_many() and delete_many()) run concurrently.
+BATCH_CONCURRENCY = getattr(settings, "DYNAMODB_SESSIONS_BATCH_CONCURRENCY", 4)
+
+# Dotted path of the CircuitBreaker class guarding DynamoDB calls (e.g.
+# "dynamodb_sessions.circuit_breaker.CircuitBreaker"), and the keyword
+# arguments it's built with. None disables it.
+CIRCUIT_BREAKER = getattr(settings, "DYNAMODB_SESSIONS_CIRCUIT_BREAKER", None)
+CIRCUIT_BREAKER_OPTIONS = getattr(
+    settings, "DYNAMODB_SESSIONS_CIRCUIT_BREAKER_OPTIONS", {}
+)
+# What happens when DynamoDB is unavailable (or the circuit is open): "raise"
+# the error, serve an empty read-only "anonymous" session, or with the
+# cached_dynamodb backend, serve the "cache" and queue writes behind.
+CIRCUIT_BREAKER_FALLBACK = getattr(
+    settings, "DYNAMODB_SESSIONS_CIRCUIT_BREAKER_FALLBACK", "raise"
+)
+
+# Dotted path of the Metrics class the store reports to, and the keyword
+# arguments it's built with. None discards metrics.
+METRICS = getattr(settings, "DYNAMODB_SESSIONS_METRICS", None)
+METRICS_OPTIONS = getattr(settings, "DYNAMODB_SESSIONS_METRICS_OPTIONS", {})
+
 # defensive programming if config has been defined
 # make sure it's the correct format.
 if BOTO_CORE_CONFIG:
     assert isinstance(BOTO_CORE_CONFIG, Config)
 
+if READ_CONSISTENCY not in ("strong", "eventual", "adaptive"):
+    raise ImproperlyConfigured(
+        "Unknown DYNAMODB_SESSIONS_READ_CONSISTENCY: %r" % READ_CONSISTENCY
+    )
+if ENDPOINTS and not 0 <= HOME_ENDPOINT < len(ENDPOINTS):
+    raise ImproperlyConfigured(
+        "DYNAMODB_SESSIONS_HOME_ENDPOINT must be an index of "
+        "DYNAMODB_SESSIONS_ENDPOINTS: %r" % HOME_ENDPOINT
+    )
+if CIRCUIT_BREAKER_FALLBACK not in ("raise", "anonymous", "cache"):
+    raise ImproperlyConfigured(
+        "Unknown DYNAMODB_SESSIONS_CIRCUIT_BREAKER_FALLBACK: %r"
+        % CIRCUIT_BREAKER_FALLBACK
+    )
 
-# We'll find some better way to do this.
-_DYNAMODB_CONN = None
-_DYNAMODB_TABLE = None
 
 logger = logging.getLogger(__name__)
 
@@ -58,33 +229,166 @@ if USE_LOCAL_DYNAMODB_SERVER:
     )
     dynamo_kwargs["endpoint_url"] = os.environ[local_dynamodb_server]
 
+# One connection manager per endpoint. The home endpoint's are the ones used
+# outside of session reads (table management, clearsessions).
+connection_managers = [
+    ConnectionManager(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=TCP_KEEPALIVE,
+        **dict(dynamo_kwargs, **endpoint),
+    )
+    for endpoint in ENDPOINTS or [{}]
+]
+async_connection_managers = [
+    AsyncConnectionManager(
+        max_pool_connections=MAX_POOL_CONNECTIONS, **dict(dynamo_kwargs, **endpoint)
+    )
+    for endpoint in ENDPOINTS or [{}]
+]
+connection_manager = connection_managers[HOME_ENDPOINT]
+async_connection_manager = async_connection_managers[HOME_ENDPOINT]
+
 
 def dynamodb_connection_factory(low_level=False):
     """
     Since SessionStore is called for every single page view, we'd be
     establishing new connections so frequently that performance would be
-    hugely impacted. We'll lazy-load this here on a per-worker basis. Since
-    boto3.resource.('dynamodb')objects are state-less (aside from security
-    tokens), we're not too concerned about thread safety issues.
+    hugely impacted. Connections are reused per worker: the low-level client
+    is shared by every thread, while resources (which aren't thread-safe)
+    are kept per thread. Both are rebuilt after a fork.
     """
 
     if low_level:
-        return boto3.client(**dynamo_kwargs)
+        return connection_manager.client()
+    return connection_manager.resource()
 
-    global _DYNAMODB_CONN
 
-    if not _DYNAMODB_CONN:
-        logger.debug("Creating a DynamoDB connection.")
-        _DYNAMODB_CONN = boto3.resource(**dynamo_kwargs)
-    return _DYNAMODB_CONN
+def dynamodb_table():
+    return connection_manager.table(TABLE_NAME)
 
 
-def dynamodb_table():
-    global _DYNAMODB_TABLE
+def prewarm(connections=None):
+    """
+    Prewarms the DynamoDB connections of every endpoint. Errors are logged:
+    the first requests will try again.
+    """
+    if ENGINE == "memory":
+        return
+    if connections is None:
+        connections = PREWARM_CONNECTIONS
+    start_time = time.time()
+    try:
+        for manager in connection_managers:
+            manager.prewarm(connections, resource=ENGINE == "resource")
+    except Exception:
+        logger.warning("Could not prewarm DynamoDB connections.", exc_info=True)
+        return
+    logger.debug("Prewarmed DynamoDB connections in %.3fs.", time.time() - start_time)
+
+
+async def aclose():
+    """
+    Closes the async DynamoDB clients of the running event loop. Await it
+    before the loop ends, e.g. in an ASGI lifespan shutdown handler or at the
+    end of the coroutine run by ``asyncio.run()``: nothing else closes them.
+    """
+    for manager in async_connection_managers:
+        await manager.close()
 
-    if not _DYNAMODB_TABLE:
-        _DYNAMODB_TABLE = dynamodb_connection_factory().Table(TABLE_NAME)
-    return _DYNAMODB_TABLE
+
+session_metrics = import_string(METRICS)(**METRICS_OPTIONS) if METRICS else Metrics()
+
+session_circuit_breaker = (
+    import_string(CIRCUIT_BREAKER)(**CIRCUIT_BREAKER_OPTIONS)
+    if CIRCUIT_BREAKER
+    else None
+)
+
+session_engines = [
+    ENGINES[ENGINE](
+        TABLE_NAME,
+        HASH_ATTRIB_NAME,
+        connections,
+        async_connections,
+        return_consumed_capacity=METRICS is not None,
+    )
+    for connections, async_connections in zip(
+        connection_managers, async_connection_managers
+    )
+]
+session_engine = (
+    RoutingEngine(
+        session_engines,
+        home=HOME_ENDPOINT,
+        hedge_percentile=HEDGE_PERCENTILE,
+        max_workers=MAX_POOL_CONNECTIONS,
+    )
+    if ENDPOINTS
+    else session_engines[0]
+)
+if TABLE_ROTATION:
+    session_engine = RotatingEngine(
+        session_engine, TABLE_ROTATION, settings.SESSION_COOKIE_AGE
+    )
+
+session_codec = Codec(
+    COMPRESSION,
+    COMPRESSION_LEVEL,
+    COMPRESSION_THRESHOLD,
+    load_dictionaries(ZSTD_DICTIONARIES),
+)
+
+session_chunk_store = (
+    import_string(CHUNK_STORE)(**CHUNK_STORE_OPTIONS)
+    if CHUNK_STORE
+    else TableChunkStore(session_engine)
+)
+
+key_pattern = re.compile(KEY_PATTERN) if KEY_PATTERN else None
+missing_keys = (
+    LRUCache(NEGATIVE_CACHE_SIZE, NEGATIVE_CACHE_TTL) if NEGATIVE_CACHE_SIZE else None
+)
+# Versions of the sessions this process wrote recently, by key.
+recent_writes = (
+    LRUCache(RECENT_WRITES_SIZE, CONSISTENCY_WINDOW)
+    if READ_CONSISTENCY == "adaptive"
+    else None
+)
+# Recorded for deleted sessions: any item read back is stale.
+DELETED_VERSION = float("inf")
+
+_version_lock = threading.Lock()
+_last_version = 0
+
+
+def next_version():
+    """
+    Returns the version of a new write: the current time, in microseconds,
+    made strictly increasing within the process.
+    """
+    global _last_version
+    with _version_lock:
+        _last_version = max(_last_version + 1, time.time_ns() // 1000)
+        return _last_version
+
+
+# A pending write: attributes (or document paths) to set and remove on the
+# session's item, and the condition (if any) it's subject to. ``kind`` is
+# "full" for a write of the whole session, "delta" for a write of the
+# entries changed since the session was loaded, and "ttl" for a TTL refresh.
+# ``chunks`` holds the chunks of an oversized payload, to be stored before the
+# item itself, and ``condition_values`` the values the condition refers to.
+SessionUpdate = namedtuple(
+    "SessionUpdate",
+    "session_key kind set_values remove condition digest ttl chunks "
+    "condition_values",
+    defaults=(None, None),
+)
+
+# Attributes holding the session data in each layout.
+LAYOUT_ATTRIBUTES = {"blob": "data", "attributes": "values", "index": "data"}
+# Hash key of the user index; anonymous sessions don't have it.
+USER_ID_ATTRIBUTE = "user_id"
 
 
 class SessionStore(SessionBase):
@@ -94,67 +398,357 @@ class SessionStore(SessionBase):
 
     def __init__(self, session_key=None):
         super(SessionStore, self).__init__(session_key)
+        # (session_key, payload digest, ttl) of what's known to be stored.
+        self._stored = None
+        # (session_key, chunk keys) of the stored payload.
+        self._stored_chunks = None
+        # Minimum version of the session expected to be read, as echoed by
+        # the version cookie, and the version of the last write made.
+        self.expected_version = None
+        self.written_version = None
+        # Whether the key was reserved by a lazy create() and isn't stored.
+        self._key_reserved = False
+        # Whether the session couldn't be loaded, and is served empty.
+        self._degraded = False
         logger.debug("SessionStore __init__ called with session_key: %s", session_key)
 
     def encode(self, session_dict):
         """
-        Returns the given session dictionary serialized and encoded as a string.
+        Returns the given session dictionary serialized and compressed, as
+        bytes prefixed with the codec header.
         :param session_dict:
         :return:
         """
-        return base64.b64encode(zlib.compress(self.serializer().dumps(session_dict)))
+        return self._compress(self.serializer().dumps(session_dict))
 
     def decode(self, session_data):
-        return self.serializer().loads(zlib.decompress(base64.b64decode(session_data)))
+        return self._loads(self._decompress(session_data))
+
+    def _loads(self, serialized):
+        """
+        Deserializes a whole session, or only its index if it was written
+        with the ``index`` layout.
+        """
+        if is_index(serialized):
+            return LazySessionDict(unpack_index(serialized), self.serializer())
+        return self.serializer().loads(serialized)
+
+    def _serialize_values(self, session_dict):
+        """
+        :returns: The serialized form of each top-level session value. The
+            values of a lazily decoded session which weren't accessed are
+            passed through.
+        """
+        if isinstance(session_dict, LazySessionDict):
+            return session_dict.serialized_items()
+        serializer = self.serializer()
+        return {name: serializer.dumps(value) for name, value in session_dict.items()}
+
+    def _compress(self, serialized):
+        data = self.codec.compress(serialized)
+        self.metrics.observe(PAYLOAD_BYTES, len(serialized), stage="serialized")
+        self.metrics.observe(PAYLOAD_BYTES, len(data), stage="compressed")
+        return data
+
+    def _decompress(self, session_data):
+        return self.codec.decompress(session_data)
+
+    @staticmethod
+    def _may_exist(session_key):
+        """
+        Cheap checks ruling out keys that can't be stored, before any
+        network call.
+        """
+        if key_pattern is not None and not key_pattern.fullmatch(session_key):
+            return False
+        return missing_keys is None or session_key not in missing_keys
+
+    @staticmethod
+    def _remember_missing(session_key):
+        if missing_keys is not None:
+            missing_keys.set(session_key, True)
+
+    def _get_new_session_key(self):
+        """
+        Returns a new random key. Unlike the base implementation, this
+        doesn't read the table to check the key is free: creating a session
+        is a conditional write, which fails with ``CreateError`` on a clash.
+        With rotated tables, the key starts with the current bucket.
+        """
+        prefix = self.engine.key_prefix()
+        return prefix + get_random_string(32 - len(prefix), VALID_KEY_CHARS)
+
+    async def _aget_new_session_key(self):
+        return self._get_new_session_key()
+
+    @staticmethod
+    def _digest(serialized):
+        return hashlib.blake2b(serialized, digest_size=16).digest()
+
+    def _ttl_refresh_due(self, ttl, expiry_age):
+        """
+        Whether a TTL-only write is worth sending for an unchanged payload.
+        The stored TTL may lag behind by one refresh interval, but never by
+        more than a tenth of the session's lifetime.
+        """
+        stored_ttl = self._stored[2]
+        if stored_ttl is None:
+            return True
+        return ttl - stored_ttl >= min(TTL_REFRESH_INTERVAL, expiry_age // 10)
 
     @property
     def table(self):
-        return boto3.resource(**dynamo_kwargs).Table(TABLE_NAME)
+        return dynamodb_table()
+
+    @property
+    def engine(self):
+        return session_engine
+
+    @property
+    def codec(self):
+        return session_codec
+
+    @property
+    def chunk_store(self):
+        return session_chunk_store
+
+    @property
+    def metrics(self):
+        return session_metrics
+
+    def _rotated_out(self):
+        """
+        Whether the session belongs to a past bucket of rotated tables, only
+        read from until it's dropped.
+        """
+        return not self.engine.is_current(self.session_key)
+
+    @property
+    def circuit_breaker(self):
+        return session_circuit_breaker
+
+    def _guard(self):
+        breaker = self.circuit_breaker
+        return breaker.guard() if breaker is not None else nullcontext()
+
+    def _degrade(self, error):
+        """
+        Handles DynamoDB being unavailable to load the session. Unless the
+        fallback is to raise, the session is served empty, and never saved
+        so it can't overwrite the stored one; its key (and cookie) is kept.
+
+        :returns: Whether ``error`` was handled.
+        """
+        if CIRCUIT_BREAKER_FALLBACK == "raise" or not is_unavailable(error):
+            return False
+        logger.warning(
+            "DynamoDB is unavailable, session %s is served empty: %s",
+            self.session_key,
+            error,
+        )
+        self._degraded = True
+        return True
+
+    def _write_failed(self, update, error):
+        """
+        Handles DynamoDB being unavailable to write ``update``. Unless the
+        fallback is to raise, the write is dropped.
+
+        :returns: Whether ``error`` was handled.
+        """
+        if CIRCUIT_BREAKER_FALLBACK == "raise" or not is_unavailable(error):
+            return False
+        logger.warning(
+            "DynamoDB is unavailable, session %s was not saved: %s",
+            update.session_key,
+            error,
+        )
+        return True
 
     def load(self):
         """
         Loads session data from DynamoDB, runs it through the session
-        data de-coder (base64->dict), sets ``self.session``.
+        data de-coder (bytes->dict), sets ``self.session``.
 
         :rtype: dict
         :returns: The de-coded session data, as a dict.
         """
 
-        if self.session_key is not None:
+        if self.session_key is not None and self._may_exist(self.session_key):
             start_time = time.time()
-            response = self.table.get_item(
-                Key={"session_key": self.session_key}, ConsistentRead=ALWAYS_CONSISTENT
+            try:
+                with self._guard():
+                    item, response = self.engine.get_item(
+                        self.session_key, consistent_read=READ_CONSISTENCY == "strong"
+                    )
+                    if self._is_stale(self.session_key, item):
+                        item, response = self.engine.get_item(
+                            self.session_key, consistent_read=True
+                        )
+                    item = self._live(item)
+                    if item is not None and "chunks" in item:
+                        item = self._join_chunks(item, self._fetch_chunks(item))
+            except Exception as e:
+                if not self._degrade(e):
+                    raise
+                return {}
+            session_data = self._session_from_item(
+                item, response, time.time() - start_time
             )
-            duration = time.time() - start_time
-            retry_attempt = response["ResponseMetadata"]["RetryAttempts"]
-            request_id = response["ResponseMetadata"]["RequestId"]
-            if "Item" in response:
-                session_data_response = response["Item"]["data"].value
-                session_size = len(session_data_response)
-                self.session_bust_warning(session_size)
-                self.response_analyzing(
-                    session_size, duration, retry_attempt, "get_item", request_id
-                )
-                session_data = self.decode(session_data_response)
-                time_now = timezone.now()
-                time_ten_sec_ahead = time_now + timedelta(seconds=60)
-                expiry = session_data.get("_session_expiry", time_ten_sec_ahead)
-
-                try:
-                    if isinstance(expiry, str):
-                        expiry = parse(expiry)
-                    if time_now < expiry:
-                        return session_data
-                except TypeError:
-                    # If this happens, don't return a valid session.
-                    logger.error(
-                        "Error parsing expiry date for session_key: %s",
-                        self.session_key,
+            if session_data is not None:
+                return session_data
+
+        self._session_key = None
+        return {}
+
+    async def aload(self):
+        if self.session_key is not None and self._may_exist(self.session_key):
+            start_time = time.time()
+            try:
+                with self._guard():
+                    item, response = await self.engine.aget_item(
+                        self.session_key, consistent_read=READ_CONSISTENCY == "strong"
                     )
+                    if self._is_stale(self.session_key, item):
+                        item, response = await self.engine.aget_item(
+                            self.session_key, consistent_read=True
+                        )
+                    item = self._live(item)
+                    if item is not None and "chunks" in item:
+                        item = self._join_chunks(item, await self._afetch_chunks(item))
+            except Exception as e:
+                if not self._degrade(e):
+                    raise
+                return {}
+            session_data = self._session_from_item(
+                item, response, time.time() - start_time
+            )
+            if session_data is not None:
+                return session_data
 
         self._session_key = None
         return {}
 
+    def _is_stale(self, session_key, item):
+        """
+        Whether ``item``, read with an eventually consistent read, may miss
+        a recent write of the session.
+        """
+        if READ_CONSISTENCY != "adaptive":
+            return False
+        expected = recent_writes.get(session_key)
+        if self.expected_version is not None and session_key == self.session_key:
+            expected = max(expected or 0, self.expected_version)
+        if expected is None:
+            return False
+        if item is None:
+            return expected != DELETED_VERSION
+        return item.get("version", 0) < expected
+
+    @staticmethod
+    def _live(item):
+        """
+        Returns ``item``, or ``None`` if its TTL has passed, so expired
+        sessions are rejected before their payload (or its chunks) is
+        decoded. The TTL is an integer rounded down from the expiry, hence
+        the strict comparison on whole seconds.
+        """
+        if item is not None and item.get("ttl", math.inf) < int(time.time()):
+            return None
+        return item
+
+    def _fetch_chunks(self, item):
+        try:
+            return self.chunk_store.get(chunk_keys(self.session_key, item["chunks"]))
+        except ChunkError:
+            logger.warning("Session %s is incomplete.", self.session_key, exc_info=True)
+            return None
+
+    async def _afetch_chunks(self, item):
+        try:
+            return await self.chunk_store.aget(
+                chunk_keys(self.session_key, item["chunks"])
+            )
+        except ChunkError:
+            logger.warning("Session %s is incomplete.", self.session_key, exc_info=True)
+            return None
+
+    @staticmethod
+    def _join_chunks(item, chunks):
+        """
+        Returns ``item`` with the payload reassembled from ``chunks``, or
+        ``None`` if they couldn't be fetched.
+        """
+        if chunks is None:
+            return None
+        return dict(item, data=b"".join(chunks))
+
+    def _session_from_item(self, item, response, duration):
+        """
+        Decodes the session stored in ``item``.
+
+        :returns: The session data, or ``None`` if there's no valid session.
+        """
+        if item is None:
+            self._remember_missing(self.session_key)
+            return None
+
+        session_data, digest, session_size = self._decode_item(item)
+        self.session_bust_warning(session_size)
+        if response is not None:
+            self._analyze_response(response, duration, "get_item", session_size)
+        # Items written with a TTL were checked by _live().
+        if "ttl" not in item and not self._expiry_valid(session_data):
+            return None
+        self._stored = (self.session_key, digest, item.get("ttl"))
+        self._stored_chunks = (
+            self.session_key,
+            chunk_keys(self.session_key, item["chunks"]) if "chunks" in item else [],
+        )
+        return session_data
+
+    def _expiry_valid(self, session_data):
+        """
+        Checks the ``_session_expiry`` of an item written without a TTL.
+        """
+        expiry = session_data.get("_session_expiry")
+        if expiry is None:
+            return True
+        try:
+            if isinstance(expiry, str):
+                expiry = datetime.fromisoformat(expiry)
+            return timezone.now() < expiry
+        except (TypeError, ValueError):
+            # If this happens, don't return a valid session.
+            logger.error(
+                "Error parsing expiry date for session_key: %s",
+                self.session_key,
+            )
+            return False
+
+    def _decode_item(self, item):
+        """
+        Decodes the session stored in ``item``, in either layout.
+
+        :returns: ``(session_data, digest, size)``: the session data, the
+            digest of its serialized form (per entry with the ``attributes``
+            layout), and the size of the stored payload.
+        """
+        if "values" in item:
+            serialized, digest, size = {}, {}, 0
+            for name, value in item["values"].items():
+                serialized[name] = self._decompress(value)
+                digest[name] = self._digest(serialized[name])
+                size += len(value)
+            # Entries are only deserialized when accessed.
+            return LazySessionDict(serialized, self.serializer()), digest, size
+        serialized = self._decompress(item["data"])
+        return (
+            self._loads(serialized),
+            self._digest(serialized),
+            len(item["data"]),
+        )
+
     def exists(self, session_key):
         """
         Checks to see if a session currently exists in DynamoDB.
@@ -163,31 +757,76 @@ class SessionStore(SessionBase):
         :returns: ``True`` if a session with the given key exists in the DB,
             ``False`` if not.
         """
-        if session_key is None:
+        if session_key is None or not self._may_exist(session_key):
             return False
         start_time = time.time()
-        response = self.table.get_item(
-            Key={"session_key": session_key}, ConsistentRead=ALWAYS_CONSISTENT
+        # Only fetch the key (and version), not the whole session payload.
+        attributes = self._exists_attributes()
+        try:
+            with self._guard():
+                item, response = self.engine.get_item(
+                    session_key,
+                    consistent_read=READ_CONSISTENCY == "strong",
+                    attributes=attributes,
+                )
+                if self._is_stale(session_key, item):
+                    item, response = self.engine.get_item(
+                        session_key, consistent_read=True, attributes=attributes
+                    )
+        except Exception as e:
+            if not self._degrade(e):
+                raise
+            return False
+        return self._exists_from_item(
+            session_key, item, response, time.time() - start_time
         )
-        duration = time.time() - start_time
-        retry_attempt = response["ResponseMetadata"]["RetryAttempts"]
-        request_id = response["ResponseMetadata"]["RequestId"]
-        if "Item" in response:
-            # print(dir(response["Item"]["data"]))
-            session_size = len(response["Item"].get("data").value)
-            self.session_bust_warning(session_size)
-            self.response_analyzing(
-                session_size, duration, retry_attempt, "get_item", request_id
-            )
-            return True
-        else:
+
+    async def aexists(self, session_key):
+        if session_key is None or not self._may_exist(session_key):
+            return False
+        start_time = time.time()
+        attributes = self._exists_attributes()
+        try:
+            with self._guard():
+                item, response = await self.engine.aget_item(
+                    session_key,
+                    consistent_read=READ_CONSISTENCY == "strong",
+                    attributes=attributes,
+                )
+                if self._is_stale(session_key, item):
+                    item, response = await self.engine.aget_item(
+                        session_key, consistent_read=True, attributes=attributes
+                    )
+        except Exception as e:
+            if not self._degrade(e):
+                raise
             return False
+        return self._exists_from_item(
+            session_key, item, response, time.time() - start_time
+        )
+
+    @staticmethod
+    def _exists_attributes():
+        if READ_CONSISTENCY == "adaptive":
+            return (HASH_ATTRIB_NAME, "version")
+        return (HASH_ATTRIB_NAME,)
+
+    def _exists_from_item(self, session_key, item, response, duration):
+        self._analyze_response(response, duration, "get_item")
+        if item is None:
+            self._remember_missing(session_key)
+            return False
+        return True
 
     def create(self):
         """
         Creates a new entry in DynamoDB. This may or may not actually
-        have anything in it.
+        have anything in it. With ``LAZY_CREATE``, only reserves a new key:
+        the entry is created by the next ``save()``.
         """
+        if LAZY_CREATE:
+            self._reserve_key()
+            return
 
         while True:
             self._session_key = self._get_new_session_key()
@@ -200,6 +839,20 @@ class SessionStore(SessionBase):
             self.modified = True
             return
 
+    async def acreate(self):
+        if LAZY_CREATE:
+            self._reserve_key()
+            return
+
+        while True:
+            self._session_key = await self._aget_new_session_key()
+            try:
+                await self.asave(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
     def save(self, must_create=False):
         """
         Saves the current session data to the database.
@@ -211,48 +864,357 @@ class SessionStore(SessionBase):
             with the current session key already exists.
         """
 
+        if self._degraded:
+            return
         if self.session_key is None:
-            return self.create()
+            if not LAZY_CREATE:
+                return self.create()
+            self._reserve_key()
+        if self._key_reserved:
+            return self._save_reserved()
+        if not must_create and self._rotated_out():
+            return self._rotate_key()
 
-        update_kwargs = {
-            "Key": {"session_key": self.session_key},
-        }
+        update = self._build_update(must_create)
+        if update is not None:
+            self._write_update(update)
 
-        attribute_names = {"#data": "data", "#ttl": "ttl"}
-        session_data = self.encode(self._get_session(no_load=must_create))
-        attribute_values = {
-            ":data": session_data,
-            ":ttl": int(time.time() + self.get_expiry_age()),
-        }
-        set_updates = ["#data = :data", "#ttl = :ttl"]
+    async def asave(self, must_create=False):
+        if self._degraded:
+            return
+        if self.session_key is None:
+            if not LAZY_CREATE:
+                return await self.acreate()
+            self._reserve_key()
+        if self._key_reserved:
+            return await self._asave_reserved()
+        if not must_create and self._rotated_out():
+            return await self._arotate_key()
+
+        # Loads the session, if needed, without blocking the event loop;
+        # building the update then only works on the cached session.
+        await self._aget_session(no_load=must_create)
+        update = self._build_update(must_create)
+        if update is not None:
+            await self._awrite_update(update)
+
+    def _reserve_key(self):
+        self._session_key = self._get_new_session_key()
+        self._key_reserved = True
+        # There's nothing to load for a new key.
+        self._get_session(no_load=True)
+        self.modified = True
+
+    def _save_reserved(self):
+        """
+        Creates the session under its reserved key, or under a new one if
+        the key turns out to be taken.
+        """
+        while True:
+            try:
+                self._write_update(self._build_update(must_create=True))
+            except CreateError:
+                self._session_key = self._get_new_session_key()
+                continue
+            return
+
+    async def _asave_reserved(self):
+        while True:
+            try:
+                await self._awrite_update(self._build_update(must_create=True))
+            except CreateError:
+                self._session_key = self._get_new_session_key()
+                continue
+            return
+
+    def _rotate_key(self):
+        """
+        Moves the session to a new key of the current bucket. The browser
+        gets the new key as the session middleware sets the cookie after
+        saving.
+        """
+        old_key = self.session_key
+        self._get_session()
+        self._reserve_key()
+        self._save_reserved()
+        self.delete(old_key)
+
+    async def _arotate_key(self):
+        old_key = self.session_key
+        await self._aget_session()
+        self._reserve_key()
+        await self._asave_reserved()
+        await self.adelete(old_key)
+
+    def _build_update(self, must_create=False, delta=True):
+        """
+        Works out the write needed to save the current session.
+
+        :keyword bool delta: With the ``attributes`` layout, allow writing
+            only the entries that changed since the session was loaded.
+        :returns: A ``SessionUpdate``, or ``None`` when the stored session is
+            already up to date.
+        """
+        session_dict = self._get_session(no_load=must_create)
+        if STORAGE_LAYOUT == "attributes":
+            serialized = self._serialize_values(session_dict)
+            digest = {name: self._digest(value) for name, value in serialized.items()}
+        elif STORAGE_LAYOUT == "index":
+            serialized = pack_index(self._serialize_values(session_dict))
+            digest = self._digest(serialized)
+        else:
+            serialized = self.serializer().dumps(dict(session_dict))
+            digest = self._digest(serialized)
+        expiry_age = self.get_expiry_age()
+        ttl = int(time.time() + expiry_age)
+        stored = None
+        if (
+            not must_create
+            and self._stored is not None
+            and self._stored[0] == self.session_key
+        ):
+            stored = self._stored[1]
+
+        unchanged = SKIP_UNCHANGED_WRITES and stored == digest
+        if unchanged:
+            if not self._ttl_refresh_due(ttl, expiry_age):
+                return None
+            # Only refresh the TTL, and never resurrect a deleted session.
+            # Chunks have a TTL of their own: a chunked session is written
+            # again in full, so they don't expire before its item.
+            if not self._has_stored_chunks():
+                return SessionUpdate(
+                    self.session_key, "ttl", {"ttl": ttl}, (), EXISTS, digest, ttl
+                )
+
+        if delta and STORAGE_LAYOUT == "attributes" and isinstance(stored, dict):
+            set_values = {
+                ("values", name): self._compress(serialized[name])
+                for name in digest
+                if stored.get(name) != digest[name]
+            }
+            set_values["ttl"] = ttl
+            if READ_CONSISTENCY == "adaptive":
+                set_values["version"] = next_version()
+            remove = tuple(("values", name) for name in stored if name not in digest)
+            if USER_INDEX and stored.get(SESSION_KEY) != digest.get(SESSION_KEY):
+                remove = self._index_user(session_dict, set_values, remove)
+            # The entries can only be updated if the map still exists.
+            return SessionUpdate(
+                self.session_key, "delta", set_values, remove, EXISTS, digest, ttl
+            )
+
+        if STORAGE_LAYOUT == "attributes":
+            set_values = {
+                "values": {
+                    name: self._compress(value) for name, value in serialized.items()
+                }
+            }
+            # Drop the other layouts' attributes, if the item used to have them.
+            remove = ("data", "chunks")
+            chunks = None
+        else:
+            data = self._compress(serialized)
+            if CHUNK_SIZE and len(data) > CHUNK_SIZE:
+                manifest, chunks = self._split(data)
+                set_values = {"chunks": manifest}
+                remove = ("data", "values")
+            else:
+                set_values = {"data": data}
+                remove = ("values", "chunks")
+                chunks = None
+        set_values["ttl"] = ttl
+        if READ_CONSISTENCY == "adaptive":
+            set_values["version"] = next_version()
+        if USER_INDEX:
+            remove = self._index_user(session_dict, set_values, remove)
+        condition = EXISTS if unchanged else None
         if must_create:
-            # Set condition to ensure session with same key doesnt exist
-            update_kwargs["ConditionExpression"] = DynamoConditionAttr(
-                "session_key"
-            ).not_exists()
-            attribute_values[":created"] = int(time.time())
-            set_updates.append("created = :created")
-
-        update_kwargs["UpdateExpression"] = "SET " + ",".join(set_updates)
-        update_kwargs["ExpressionAttributeValues"] = attribute_values
-        update_kwargs["ExpressionAttributeNames"] = attribute_names
+            # Ensure a session with the same key doesn't exist.
+            set_values["created"] = int(time.time())
+            condition = NOT_EXISTS
+        return SessionUpdate(
+            self.session_key, "full", set_values, remove, condition, digest, ttl, chunks
+        )
+
+    def _has_stored_chunks(self):
+        return (
+            self._stored_chunks is not None
+            and self._stored_chunks[0] == self.session_key
+            and bool(self._stored_chunks[1])
+        )
+
+    @staticmethod
+    def _index_user(session_dict, set_values, remove):
+        """
+        Sets the indexed user ID of an authenticated session in
+        ``set_values``. Anonymous sessions have it removed, keeping them out
+        of the index.
+
+        :returns: The attributes to remove.
+        """
+        user_id = session_dict.get(SESSION_KEY)
+        if user_id is None:
+            return tuple(remove) + (USER_ID_ATTRIBUTE,)
+        set_values[USER_ID_ATTRIBUTE] = str(user_id)
+        return remove
+
+    def _split(self, data):
+        """
+        Splits an oversized payload into chunks.
+
+        :returns: ``(manifest, chunks)``: the manifest stored in the
+            session's item, and a dict of the chunks by key.
+        """
+        manifest = {
+            "id": get_random_string(8, VALID_KEY_CHARS),
+            "count": math.ceil(len(data) / CHUNK_SIZE),
+        }
+        keys = chunk_keys(self.session_key, manifest)
+        return manifest, {
+            key: data[index * CHUNK_SIZE : (index + 1) * CHUNK_SIZE]
+            for index, key in enumerate(keys)
+        }
+
+    def _write_update(self, update):
         try:
-            session_size = len(session_data)
-            start_time = time.time()
-            response = self.table.update_item(**update_kwargs)
-            duration = time.time() - start_time
-            retry_attempt = response["ResponseMetadata"]["RetryAttempts"]
-            request_id = response["ResponseMetadata"]["RequestId"]
-            self.session_bust_warning(session_size)
-            self.response_analyzing(
-                session_size, duration, retry_attempt, "update_item", request_id
+            with self._guard():
+                self._send_update(update)
+        except Exception as e:
+            if not self._write_failed(update, e):
+                raise
+
+    async def _awrite_update(self, update):
+        try:
+            with self._guard():
+                await self._asend_update(update)
+        except Exception as e:
+            if not self._write_failed(update, e):
+                raise
+
+    def _send_update(self, update):
+        start_time = time.time()
+        if update.chunks:
+            self.chunk_store.put(update.chunks, update.ttl)
+        try:
+            response = self.engine.update_item(
+                update.session_key,
+                update.set_values,
+                remove=update.remove,
+                condition=update.condition,
+                condition_values=update.condition_values,
             )
+        except ClientError as e:
+            if update.chunks:
+                self._delete_chunks(list(update.chunks))
+            if self._update_failed(update, e):
+                self._send_update(self._build_update())
+            return
+        stale_chunks = self._stale_chunks(update)
+        self._update_done(update, response, time.time() - start_time)
+        if stale_chunks:
+            self._delete_chunks(stale_chunks)
 
+    async def _asend_update(self, update):
+        start_time = time.time()
+        if update.chunks:
+            await self.chunk_store.aput(update.chunks, update.ttl)
+        try:
+            response = await self.engine.aupdate_item(
+                update.session_key,
+                update.set_values,
+                remove=update.remove,
+                condition=update.condition,
+                condition_values=update.condition_values,
+            )
         except ClientError as e:
-            error_code = e.response["Error"]["Code"]
-            if error_code == "ConditionalCheckFailedException":
-                raise CreateError
-            raise
+            if update.chunks:
+                await self._adelete_chunks(list(update.chunks))
+            if self._update_failed(update, e):
+                await self._asend_update(self._build_update())
+            return
+        stale_chunks = self._stale_chunks(update)
+        self._update_done(update, response, time.time() - start_time)
+        if stale_chunks:
+            await self._adelete_chunks(stale_chunks)
+
+    def _stale_chunks(self, update):
+        """
+        Returns the keys of the chunks ``update`` makes obsolete. Chunks of
+        versions this store didn't load are left for the TTL to remove.
+        """
+        if (
+            update.kind != "full"
+            or self._stored_chunks is None
+            or self._stored_chunks[0] != update.session_key
+        ):
+            return []
+        return list(self._stored_chunks[1])
+
+    def _delete_chunks(self, keys):
+        try:
+            self.chunk_store.delete(keys)
+        except Exception:
+            logger.warning("Could not delete session chunks.", exc_info=True)
+
+    async def _adelete_chunks(self, keys):
+        try:
+            await self.chunk_store.adelete(keys)
+        except Exception:
+            logger.warning("Could not delete session chunks.", exc_info=True)
+
+    def _update_done(self, update, response, duration):
+        session_size = self._update_size(update)
+        self.session_bust_warning(session_size)
+        self._analyze_response(response, duration, "update_item", session_size)
+        self._update_written(update)
+
+    @staticmethod
+    def _update_size(update):
+        size = 0
+        for name, value in update.set_values.items():
+            if name == "values":
+                size += sum(len(v) for v in value.values())
+            elif isinstance(value, bytes):
+                size += len(value)
+        if update.chunks:
+            size += sum(len(chunk) for chunk in update.chunks.values())
+        return size
+
+    def _update_failed(self, update, error):
+        """
+        Handles a failed update.
+
+        :returns: ``True`` if the session should be written again in full.
+        :raises: ``CreateError`` when the session to create already exists.
+        """
+        error_code = error.response["Error"]["Code"]
+        if error_code == "ConditionalCheckFailedException":
+            if update.condition == EXISTS:
+                # Deleted in another context: nothing left to refresh, but a
+                # delta is rewritten in full, as a blob save would be.
+                self._stored = None
+                self._stored_chunks = None
+                return update.kind == "delta"
+            raise CreateError
+        raise error
+
+    def _update_written(self, update):
+        """
+        Records that ``update`` reached (or is guaranteed to reach) the
+        table.
+        """
+        self._stored = (update.session_key, update.digest, update.ttl)
+        if update.session_key == self.session_key:
+            self._key_reserved = False
+        if update.kind == "full":
+            self._stored_chunks = (update.session_key, list(update.chunks or ()))
+        if missing_keys is not None:
+            missing_keys.pop(update.session_key)
+        version = update.set_values.get("version")
+        if version is not None and recent_writes is not None:
+            recent_writes.set(update.session_key, version)
+            self.written_version = version
 
     def delete(self, session_key=None):
         """
@@ -266,12 +1228,261 @@ class SessionStore(SessionBase):
             if self.session_key is None:
                 return
             session_key = self.session_key
-        self.table.delete_item(Key={"session_key": session_key})
+        start_time = time.time()
+        # Deletes (log outs) are never dropped: errors are raised.
+        with self._guard():
+            item, response = self.engine.delete_item(
+                session_key, return_old=bool(CHUNK_SIZE)
+            )
+        self._analyze_response(response, time.time() - start_time, "delete_item")
+        self._item_deleted(session_key)
+        if item is not None and "chunks" in item:
+            self._delete_chunks(chunk_keys(session_key, item["chunks"]))
+
+    async def adelete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        start_time = time.time()
+        with self._guard():
+            item, response = await self.engine.adelete_item(
+                session_key, return_old=bool(CHUNK_SIZE)
+            )
+        self._analyze_response(response, time.time() - start_time, "delete_item")
+        self._item_deleted(session_key)
+        if item is not None and "chunks" in item:
+            await self._adelete_chunks(chunk_keys(session_key, item["chunks"]))
+
+    def _item_deleted(self, session_key):
+        if recent_writes is not None:
+            recent_writes.set(session_key, DELETED_VERSION)
+        if self._stored is not None and self._stored[0] == session_key:
+            self._stored = None
+            self._stored_chunks = None
+
+    @classmethod
+    def load_many(cls, session_keys):
+        """
+        Loads many sessions with concurrent ``BatchGetItem`` requests.
+
+        :returns: A generator of ``(session_key, session_data)`` pairs, for
+            the sessions that exist and haven't expired.
+        """
+        store = cls()
+        for session_key, item in store._get_many(session_keys):
+            session_data = store._load_many_item(session_key, item)
+            if session_data is not None:
+                yield session_key, session_data
+
+    @classmethod
+    async def aload_many(cls, session_keys):
+        store = cls()
+        async for session_key, item in store._aget_many(session_keys):
+            session_data = await store._aload_many_item(session_key, item)
+            if session_data is not None:
+                yield session_key, session_data
+
+    def _load_many_item(self, session_key, item):
+        session = type(self)(session_key)
+        item = self._live(item)
+        if item is not None and "chunks" in item:
+            item = session._join_chunks(item, session._fetch_chunks(item))
+        return session._session_from_item(item, None, None)
+
+    async def _aload_many_item(self, session_key, item):
+        session = type(self)(session_key)
+        item = self._live(item)
+        if item is not None and "chunks" in item:
+            item = session._join_chunks(item, await session._afetch_chunks(item))
+        return session._session_from_item(item, None, None)
+
+    @classmethod
+    def exists_many(cls, session_keys):
+        """
+        Checks whether many sessions exist, with concurrent ``BatchGetItem``
+        requests.
+
+        :returns: A generator of ``(session_key, exists)`` pairs, one per
+            distinct key. Expired sessions DynamoDB hasn't deleted yet don't
+            exist, as in ``load_many()``.
+        """
+        store = cls()
+        for session_key, item in store._get_many(
+            session_keys, attributes=(HASH_ATTRIB_NAME, "ttl")
+        ):
+            yield session_key, store._live(item) is not None
+
+    @classmethod
+    async def aexists_many(cls, session_keys):
+        store = cls()
+        async for session_key, item in store._aget_many(
+            session_keys, attributes=(HASH_ATTRIB_NAME, "ttl")
+        ):
+            yield session_key, store._live(item) is not None
+
+    @classmethod
+    def delete_many(cls, session_keys):
+        """
+        Deletes many sessions with concurrent ``BatchWriteItem`` requests.
+        The chunks of chunked sessions are left for their TTL to remove.
+
+        :returns: The keys still undeleted after the retries.
+        """
+        store = cls()
+        session_keys, _ = store._split_keys(session_keys)
+        failed = []
+        for unprocessed in store._map_batches(
+            lambda batch: store.engine.batch_write(delete_keys=batch),
+            batches(session_keys, BATCH_WRITE_SIZE),
+        ):
+            failed.extend(unprocessed)
+        store._many_deleted(session_keys, failed)
+        return failed
+
+    @classmethod
+    async def adelete_many(cls, session_keys):
+        store = cls()
+        session_keys, _ = store._split_keys(session_keys)
+        failed = []
+        async for unprocessed in store._amap_batches(
+            lambda batch: store.engine.abatch_write(delete_keys=batch),
+            batches(session_keys, BATCH_WRITE_SIZE),
+        ):
+            failed.extend(unprocessed)
+        store._many_deleted(session_keys, failed)
+        return failed
+
+    @classmethod
+    def revoke_user_sessions(cls, user_id):
+        """
+        Deletes every session of a user, found with one ``Query`` of the
+        user index. Sessions written in the last second or so may not be
+        indexed yet.
+
+        :returns: ``(revoked, failed)``: the keys of the deleted sessions,
+            and of those still undeleted after the retries.
+        :raises: ``ImproperlyConfigured`` if there's no user index.
+        """
+        store = cls()
+        session_keys = store.engine.query_keys(
+            store._user_index(), USER_ID_ATTRIBUTE, str(user_id)
+        )
+        return _revoked(session_keys, cls.delete_many(session_keys))
+
+    @classmethod
+    async def arevoke_user_sessions(cls, user_id):
+        store = cls()
+        session_keys = await store.engine.aquery_keys(
+            store._user_index(), USER_ID_ATTRIBUTE, str(user_id)
+        )
+        return _revoked(session_keys, await cls.adelete_many(session_keys))
+
+    @staticmethod
+    def _user_index():
+        if not USER_INDEX:
+            raise ImproperlyConfigured(
+                "Set DYNAMODB_SESSIONS_USER_INDEX to revoke a user's sessions."
+            )
+        return USER_INDEX
+
+    def _many_deleted(self, session_keys, failed):
+        failed = set(failed)
+        for session_key in session_keys:
+            if session_key not in failed:
+                self._item_deleted(session_key)
+
+    def _split_keys(self, session_keys):
+        """
+        :returns: ``(keys, rejected)``: the distinct keys worth looking up,
+            and those that can't be stored.
+        """
+        keys, rejected = [], []
+        for session_key in dict.fromkeys(session_keys):
+            if session_key:
+                (keys if self._may_exist(session_key) else rejected).append(
+                    session_key
+                )
+        return keys, rejected
+
+    def _get_many(self, session_keys, attributes=None):
+        """
+        Fetches the items of many sessions, ``BATCH_CONCURRENCY`` batches at
+        a time.
+
+        :returns: A generator of ``(session_key, item)`` pairs, ``item``
+            being ``None`` for missing sessions. Bulk reads are consistent,
+            unless the read consistency is ``eventual``.
+        """
+        session_keys, rejected = self._split_keys(session_keys)
+        for session_key in rejected:
+            yield session_key, None
+        consistent_read = READ_CONSISTENCY != "eventual"
+        for batch, items in self._map_batches(
+            lambda batch: (
+                batch,
+                self.engine.batch_get(batch, consistent_read, attributes),
+            ),
+            batches(session_keys, BATCH_GET_SIZE),
+        ):
+            yield from self._batch_items(batch, items)
+
+    async def _aget_many(self, session_keys, attributes=None):
+        session_keys, rejected = self._split_keys(session_keys)
+        for session_key in rejected:
+            yield session_key, None
+        consistent_read = READ_CONSISTENCY != "eventual"
+
+        async def get(batch):
+            return batch, await self.engine.abatch_get(
+                batch, consistent_read, attributes
+            )
+
+        async for batch, items in self._amap_batches(
+            get, batches(session_keys, BATCH_GET_SIZE)
+        ):
+            for pair in self._batch_items(batch, items):
+                yield pair
+
+    def _batch_items(self, batch, items):
+        for session_key in batch:
+            item = items.get(session_key)
+            if item is None:
+                self._remember_missing(session_key)
+            yield session_key, item
+
+    @staticmethod
+    def _map_batches(function, groups):
+        """
+        Calls ``function`` on every batch of ``groups`` from a pool of
+        ``BATCH_CONCURRENCY`` threads, yielding the results in order.
+        """
+        if len(groups) <= 1 or BATCH_CONCURRENCY <= 1:
+            yield from map(function, groups)
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(BATCH_CONCURRENCY, len(groups))
+        ) as executor:
+            yield from executor.map(function, groups)
+
+    @staticmethod
+    async def _amap_batches(function, groups):
+        # Awaits ``function`` on ``BATCH_CONCURRENCY`` batches at a time.
+        for wave in batches(groups, max(1, BATCH_CONCURRENCY)):
+            for result in await asyncio.gather(*map(function, wave)):
+                yield result
 
     @classmethod
     def clear_expired(cls):
-        # Todo figure out a way of filtering with timezone
-        pass
+        """
+        Deletes the sessions whose TTL has passed but which DynamoDB hasn't
+        removed yet. See ``ExpiredSessionCleaner``.
+        """
+        ExpiredSessionCleaner(
+            session_engine,
+            segments=CLEAR_EXPIRED_SEGMENTS,
+            max_capacity=CLEAR_EXPIRED_MAX_CAPACITY,
+        ).run()
 
     def session_bust_warning(self, size):
         """
@@ -283,9 +1494,32 @@ class SessionStore(SessionBase):
         :return:
         """
         if size / 1000 >= DYNAMO_SESSION_DATA_SIZE_WARNING_LIMIT:
-            logger.debug(
-                "session_size_warning", session_id=self.session_key, size=size / 1000.0
+            logger.warning(
+                "session_size_warning - session_id: %s, size: %s KB",
+                self.session_key,
+                size / 1000.0,
+            )
+
+    def _analyze_response(self, response, duration, operation_name, size=0):
+        metadata = response["ResponseMetadata"]
+        metrics = self.metrics
+        metrics.observe(REQUEST_SECONDS, duration, operation=operation_name)
+        if metadata["RetryAttempts"]:
+            metrics.increment(
+                RETRIES, metadata["RetryAttempts"], operation=operation_name
+            )
+        consumed = response.get("ConsumedCapacity")
+        if consumed:
+            metrics.increment(
+                CONSUMED_CAPACITY, consumed["CapacityUnits"], operation=operation_name
             )
+        self.response_analyzing(
+            size,
+            duration,
+            metadata["RetryAttempts"],
+            operation_name,
+            metadata["RequestId"],
+        )
 
     def response_analyzing(
         self, size, duration, retry_attempt, operation_name, request_id
@@ -298,3 +1532,8 @@ class SessionStore(SessionBase):
                 operation_name,
                 request_id,
             )
+
+
+def _revoked(session_keys, failed):
+    failed_keys = set(failed)
+    return [key for key in session_keys if key not in failed_keys], failed
@@ -0,0 +1,302 @@
+"""
+Benchmarks of the session store operations.
+
+Each scenario (backend, engine, codec, payload size, concurrency and mode)
+runs every operation on a pool of sessions prepared beforehand, and reports
+its throughput and latency percentiles. Results are plain JSON-serializable
+dicts, so runs made on different commits can be compared.
+"""
+
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from itertools import product
+
+import django
+
+from dynamodb_sessions.codec import Codec
+from dynamodb_sessions.engines import ENGINES
+
+OPERATIONS = ("create", "save", "load", "exists", "cycle_key", "delete")
+BACKENDS = {
+    "dynamodb": "dynamodb_sessions.backends.dynamodb",
+    "cached_dynamodb": "dynamodb_sessions.backends.cached_dynamodb",
+}
+MODES = ("threads", "async")
+
+Scenario = namedtuple("Scenario", "backend engine codec payload_size concurrency mode")
+
+WORDS = (
+    "cart checkout item price quantity shipping address user token preference "
+    "locale currency basket offer discount delivery wishlist history page"
+).split()
+
+
+def make_payload(size, seed=0):
+    """
+    Returns a session dict of roughly ``size`` bytes once JSON-serialized,
+    shaped like real sessions (an authenticated user and a list of records),
+    and identical for a given seed.
+    """
+    rng = random.Random(seed)
+    payload = {
+        "_auth_user_id": str(rng.randrange(10**6)),
+        "_auth_user_backend": "django.contrib.auth.backends.ModelBackend",
+        "_auth_user_hash": "%064x" % rng.getrandbits(256),
+        "items": [],
+    }
+    length = len(json.dumps(payload))
+    while length < size:
+        record = {
+            "id": rng.randrange(10**9),
+            "name": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(2, 8))),
+            "quantity": rng.randrange(1, 10),
+            "price": "%d.%02d" % (rng.randrange(1000), rng.randrange(100)),
+        }
+        payload["items"].append(record)
+        length += len(json.dumps(record)) + 2
+    return payload
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(len(sorted_values) * fraction)))
+    return sorted_values[index]
+
+
+def store_class(backend, engine=None, codec="zlib"):
+    """
+    Returns a ``SessionStore`` subclass of ``backend`` using the ``codec``
+    compression and, unless ``engine`` is ``None`` (the configured engine),
+    a dedicated engine of that kind.
+    """
+    # Settings and connections all live in the dynamodb backend.
+    base = import_module(BACKENDS["dynamodb"])
+    attributes = {
+        "codec": Codec(codec, base.COMPRESSION_LEVEL, base.COMPRESSION_THRESHOLD)
+    }
+    if engine is not None:
+        attributes["engine"] = ENGINES[engine](
+            base.TABLE_NAME,
+            base.HASH_ATTRIB_NAME,
+            base.connection_manager,
+            base.async_connection_manager,
+        )
+    store = import_module(BACKENDS[backend]).SessionStore
+    return type("BenchmarkSessionStore", (store,), attributes)
+
+
+class Benchmark:
+    """
+    Runs scenarios of session operations.
+
+    :param int iterations: Number of times each operation runs per scenario.
+    :param int seed: Seed of the generated payloads.
+    """
+
+    def __init__(self, iterations=200, seed=0):
+        self.iterations = iterations
+        self.seed = seed
+
+    def _prepare(self, store, payload):
+        keys = []
+        for _ in range(self.iterations):
+            session = store()
+            session.update(payload)
+            session.create()
+            keys.append(session.session_key)
+        return keys
+
+    # Each operation is split into an untimed setup, returning the state the
+    # timed call works on, and the timed call itself.
+
+    @staticmethod
+    def _setup(store, operation, payload, keys, index):
+        if operation == "create":
+            session = store()
+            session.update(payload)
+            return session
+        if operation in ("save", "cycle_key"):
+            # Setting a value loads the session.
+            session = store(keys[index])
+            session["counter"] = index
+            return session
+        if operation == "load":
+            return store(keys[index])
+        return store()
+
+    @staticmethod
+    def _call(operation, session, keys, index):
+        if operation == "create":
+            session.create()
+        elif operation == "save":
+            session.save()
+        elif operation == "load":
+            session.load()
+        elif operation == "exists":
+            session.exists(keys[index])
+        elif operation == "cycle_key":
+            session.cycle_key()
+            keys[index] = session.session_key
+        else:
+            session.delete(keys[index])
+
+    @staticmethod
+    async def _acall(operation, session, keys, index):
+        if operation == "create":
+            await session.acreate()
+        elif operation == "save":
+            await session.asave()
+        elif operation == "load":
+            await session.aload()
+        elif operation == "exists":
+            await session.aexists(keys[index])
+        elif operation == "cycle_key":
+            await session.acycle_key()
+            keys[index] = session.session_key
+        else:
+            await session.adelete(keys[index])
+
+    def _run_threads(self, operation, sessions, keys, concurrency):
+        def worker(offset):
+            latencies = []
+            for index in range(offset, len(sessions), concurrency):
+                start = time.perf_counter()
+                self._call(operation, sessions[index], keys, index)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return [
+                latency
+                for latencies in executor.map(worker, range(concurrency))
+                for latency in latencies
+            ]
+
+    def _run_async(self, operation, sessions, keys, concurrency):
+        async def worker(offset):
+            latencies = []
+            for index in range(offset, len(sessions), concurrency):
+                start = time.perf_counter()
+                await self._acall(operation, sessions[index], keys, index)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        async def main():
+            results = await asyncio.gather(*map(worker, range(concurrency)))
+            # Release the event loop's clients before the loop closes.
+            await import_module(BACKENDS["dynamodb"]).aclose()
+            return results
+
+        return [latency for latencies in asyncio.run(main()) for latency in latencies]
+
+    def run_scenario(self, scenario):
+        """
+        :returns: One result dict per operation.
+        """
+        store = store_class(scenario.backend, scenario.engine, scenario.codec)
+        payload = make_payload(scenario.payload_size, self.seed)
+        keys = self._prepare(store, payload)
+        run = self._run_async if scenario.mode == "async" else self._run_threads
+        results = []
+        for operation in OPERATIONS:
+            sessions = [
+                self._setup(store, operation, payload, keys, index)
+                for index in range(len(keys))
+            ]
+            start = time.perf_counter()
+            latencies = sorted(run(operation, sessions, keys, scenario.concurrency))
+            seconds = time.perf_counter() - start
+            results.append(
+                dict(
+                    scenario._asdict(),
+                    operation=operation,
+                    ops=len(latencies),
+                    seconds=seconds,
+                    throughput=len(latencies) / seconds if seconds else 0.0,
+                    mean_ms=1000 * sum(latencies) / len(latencies),
+                    p50_ms=1000 * percentile(latencies, 0.50),
+                    p95_ms=1000 * percentile(latencies, 0.95),
+                    p99_ms=1000 * percentile(latencies, 0.99),
+                )
+            )
+            if operation == "create":
+                # Sessions created by the benchmark itself aren't reused.
+                for session in sessions:
+                    session.delete()
+        return results
+
+    def run(self, scenarios):
+        """
+        :returns: The results of every scenario, with metadata identifying
+            the run.
+        """
+        results = []
+        for scenario in scenarios:
+            results.extend(self.run_scenario(scenario))
+        return {"meta": self.metadata(), "results": results}
+
+    def metadata(self):
+        return {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "iterations": self.iterations,
+            "seed": self.seed,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+
+
+def scenarios(backends, engines, codecs, payload_sizes, concurrencies, modes):
+    """
+    Returns every combination of the given options.
+    """
+    return [
+        Scenario(*combination)
+        for combination in product(
+            backends, engines, codecs, payload_sizes, concurrencies, modes
+        )
+    ]
+
+
+def git_commit():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """
+    Matches the results of two runs.
+
+    :returns: ``(result, baseline_result)`` pairs, for every result of
+        ``current`` the baseline has a counterpart for.
+    """
+
+    def key(result):
+        return tuple(result[field] for field in Scenario._fields + ("operation",))
+
+    previous = {key(result): result for result in baseline["results"]}
+    return [
+        (result, previous[key(result)])
+        for result in current["results"]
+        if key(result) in previous
+    ]
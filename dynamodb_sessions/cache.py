@@ -0,0 +1,311 @@
+"""
+Django cache backend storing entries in a DynamoDB table.
+
+It shares the session backend's connections, engine and codec. Each entry is
+an item keyed by the table's hash attribute, with its value in ``value``:
+integers as DynamoDB numbers, so ``incr()`` is an atomic ``ADD``, anything
+else pickled and compressed like session payloads. Expiring entries have a
+``ttl`` attribute, like sessions: DynamoDB deletes them eventually, and
+reads ignore them as soon as they've expired. ``get_many()``,
+``set_many()`` and ``delete_many()`` use batch calls rather than a call per
+key.
+
+Use a dedicated table (see the ``create_cache_table`` command): ``clear()``
+deletes every item of it.
+"""
+
+import pickle
+import time
+
+from botocore.exceptions import ClientError
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache, InvalidCacheKey
+
+from dynamodb_sessions.backends.dynamodb import (
+    HOME_ENDPOINT,
+    session_codec,
+    session_engines,
+)
+from dynamodb_sessions.engines import (
+    BATCH_GET_SIZE,
+    BATCH_WRITE_SIZE,
+    LIVE,
+    NOT_LIVE,
+    batches,
+)
+
+# DynamoDB's limits on the size of a hash key, and on the digits of numbers.
+MAX_KEY_BYTES = 2048
+MAX_NUMBER = 10**38
+
+
+class DynamoDBCache(BaseCache):
+    """
+    ``LOCATION`` is the name of the table. The ``OPTIONS`` may set
+    ``CONSISTENT_READ`` (defaults to ``True``).
+    """
+
+    def __init__(self, table_name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.consistent_read = options.get("CONSISTENT_READ", True)
+        # Cache writes go to the home endpoint, with the session engine.
+        self.engine = session_engines[HOME_ENDPOINT].for_table(table_name)
+        self.codec = session_codec
+
+    def validate_key(self, key):
+        if len(key.encode()) > MAX_KEY_BYTES:
+            raise InvalidCacheKey(
+                "Cache key is longer than %d bytes: %r" % (MAX_KEY_BYTES, key)
+            )
+
+    @staticmethod
+    def _now():
+        return int(time.time())
+
+    def _ttl(self, timeout):
+        expiry = self.get_backend_timeout(timeout)
+        return None if expiry is None else int(expiry)
+
+    def _live(self, item):
+        return item is not None and item.get("ttl", self._now()) >= self._now()
+
+    def _encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            if -MAX_NUMBER < value < MAX_NUMBER:
+                return value
+        return self.codec.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def _decode(self, item):
+        value = item["value"]
+        if isinstance(value, bytes):
+            return pickle.loads(self.codec.decompress(value))
+        return value
+
+    def _set_values(self, value, timeout):
+        """
+        :returns: ``(set_values, remove)`` of an update storing ``value``.
+        """
+        set_values = {"value": self._encode(value)}
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return set_values, ("ttl",)
+        set_values["ttl"] = ttl
+        return set_values, ()
+
+    def _item(self, key, value, timeout):
+        item = {self.engine.hash_key: key, "value": self._encode(value)}
+        ttl = self._ttl(timeout)
+        if ttl is not None:
+            item["ttl"] = ttl
+        return item
+
+    def _keys(self, keys, version):
+        return {self.make_and_validate_key(key, version=version): key for key in keys}
+
+    @staticmethod
+    def _failed_condition(error):
+        return error.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        item, _ = self.engine.get_item(key, consistent_read=self.consistent_read)
+        return self._decode(item) if self._live(item) else default
+
+    async def aget(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        item, _ = await self.engine.aget_item(key, consistent_read=self.consistent_read)
+        return self._decode(item) if self._live(item) else default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        set_values, remove = self._set_values(value, timeout)
+        self.engine.update_item(key, set_values, remove)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        set_values, remove = self._set_values(value, timeout)
+        await self.engine.aupdate_item(key, set_values, remove)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Sets ``value`` with a conditional write, unless a live entry exists.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        set_values, remove = self._set_values(value, timeout)
+        try:
+            self.engine.update_item(
+                key, set_values, remove, NOT_LIVE, {":now": self._now()}
+            )
+        except ClientError as e:
+            if not self._failed_condition(e):
+                raise
+            return False
+        return True
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        set_values, remove = self._set_values(value, timeout)
+        try:
+            await self.engine.aupdate_item(
+                key, set_values, remove, NOT_LIVE, {":now": self._now()}
+            )
+        except ClientError as e:
+            if not self._failed_condition(e):
+                raise
+            return False
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        set_values, remove = self._touch_values(timeout)
+        try:
+            self.engine.update_item(
+                key, set_values, remove, LIVE, {":now": self._now()}
+            )
+        except ClientError as e:
+            if not self._failed_condition(e):
+                raise
+            return False
+        return True
+
+    async def atouch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        set_values, remove = self._touch_values(timeout)
+        try:
+            await self.engine.aupdate_item(
+                key, set_values, remove, LIVE, {":now": self._now()}
+            )
+        except ClientError as e:
+            if not self._failed_condition(e):
+                raise
+            return False
+        return True
+
+    def _touch_values(self, timeout):
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return {}, ("ttl",)
+        return {"ttl": ttl}, ()
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        old_item, _ = self.engine.delete_item(key, return_old=True)
+        return self._live(old_item)
+
+    async def adelete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        old_item, _ = await self.engine.adelete_item(key, return_old=True)
+        return self._live(old_item)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        item, _ = self.engine.get_item(
+            key,
+            consistent_read=self.consistent_read,
+            attributes=(self.engine.hash_key, "ttl"),
+        )
+        return self._live(item)
+
+    async def ahas_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        item, _ = await self.engine.aget_item(
+            key,
+            consistent_read=self.consistent_read,
+            attributes=(self.engine.hash_key, "ttl"),
+        )
+        return self._live(item)
+
+    def incr(self, key, delta=1, version=None):
+        """
+        Adds ``delta`` to an integer with an atomic ``ADD``.
+
+        :raises: ``ValueError`` if there's no live integer under ``key``.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        try:
+            value, _ = self.engine.increment(key, "value", delta, self._now())
+        except ClientError as e:
+            if not self._failed_condition(e):
+                raise
+            raise ValueError("Key '%s' not found." % key) from None
+        return value
+
+    async def aincr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        try:
+            value, _ = await self.engine.aincrement(key, "value", delta, self._now())
+        except ClientError as e:
+            if not self._failed_condition(e):
+                raise
+            raise ValueError("Key '%s' not found." % key) from None
+        return value
+
+    def get_many(self, keys, version=None):
+        """
+        Fetches the entries with a ``BatchGetItem`` per ``BATCH_GET_SIZE``
+        keys.
+        """
+        keys = self._keys(keys, version)
+        items = {}
+        for batch in batches(list(keys), BATCH_GET_SIZE):
+            items.update(self.engine.batch_get(batch, self.consistent_read))
+        return self._found(keys, items)
+
+    async def aget_many(self, keys, version=None):
+        keys = self._keys(keys, version)
+        items = {}
+        for batch in batches(list(keys), BATCH_GET_SIZE):
+            items.update(await self.engine.abatch_get(batch, self.consistent_read))
+        return self._found(keys, items)
+
+    def _found(self, keys, items):
+        return {
+            keys[key]: self._decode(item)
+            for key, item in items.items()
+            if self._live(item)
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Puts the entries with a ``BatchWriteItem`` per ``BATCH_WRITE_SIZE``
+        keys.
+
+        :returns: The keys which couldn't be set.
+        """
+        keys = self._keys(data, version)
+        failed = []
+        for batch in batches(list(keys), BATCH_WRITE_SIZE):
+            put_items = [self._item(key, data[keys[key]], timeout) for key in batch]
+            failed.extend(self.engine.batch_write(put_items))
+        return [keys[key] for key in failed]
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        keys = self._keys(data, version)
+        failed = []
+        for batch in batches(list(keys), BATCH_WRITE_SIZE):
+            put_items = [self._item(key, data[keys[key]], timeout) for key in batch]
+            failed.extend(await self.engine.abatch_write(put_items))
+        return [keys[key] for key in failed]
+
+    def delete_many(self, keys, version=None):
+        for batch in batches(list(self._keys(keys, version)), BATCH_WRITE_SIZE):
+            self.engine.batch_write(delete_keys=batch)
+
+    async def adelete_many(self, keys, version=None):
+        for batch in batches(list(self._keys(keys, version)), BATCH_WRITE_SIZE):
+            await self.engine.abatch_write(delete_keys=batch)
+
+    def clear(self):
+        """
+        Deletes every item of the table.
+        """
+        start_key = None
+        while True:
+            items, start_key, _ = self.engine.scan_page(
+                attributes=(self.engine.hash_key,), start_key=start_key
+            )
+            keys = [item[self.engine.hash_key] for item in items]
+            for batch in batches(keys, BATCH_WRITE_SIZE):
+                self.engine.batch_write(delete_keys=batch)
+            if start_key is None:
+                return
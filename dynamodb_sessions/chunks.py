@@ -0,0 +1,180 @@
+"""
+Storage of the payloads of sessions too large for a single item.
+
+Oversized payloads are split into chunks stored apart from the session's
+item, which only keeps a manifest of them. Chunk keys embed a random ID that
+changes with every write, so a reader never mixes the chunks of two
+versions of a session.
+"""
+
+import logging
+import os
+
+from dynamodb_sessions.engines import BATCH_GET_SIZE, BATCH_WRITE_SIZE, batches
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkError(Exception):
+    """
+    Raised when chunks can't be written or read back in full.
+    """
+
+
+def chunk_keys(session_key, manifest):
+    """
+    Returns the keys of the chunks listed in ``manifest``, in order.
+    """
+    return [
+        "%s#%s#%d" % (session_key, manifest["id"], index)
+        for index in range(manifest["count"])
+    ]
+
+
+class ChunkStore:
+    """
+    Interface of the chunk stores.
+
+    The ``a``-prefixed methods default to the blocking ones, which is fine
+    for stores that don't touch the network.
+    """
+
+    def put(self, chunks, ttl):
+        """
+        Stores ``chunks``, a dict of chunk data by key, until ``ttl``.
+
+        :raises: ``ChunkError`` if some chunks weren't stored.
+        """
+        raise NotImplementedError
+
+    def get(self, keys):
+        """
+        :returns: The data of the chunks stored under ``keys``, in order.
+        :raises: ``ChunkError`` if a chunk is missing.
+        """
+        raise NotImplementedError
+
+    def delete(self, keys):
+        raise NotImplementedError
+
+    async def aput(self, chunks, ttl):
+        self.put(chunks, ttl)
+
+    async def aget(self, keys):
+        return self.get(keys)
+
+    async def adelete(self, keys):
+        self.delete(keys)
+
+
+class TableChunkStore(ChunkStore):
+    """
+    Stores chunks as items of the session table itself, with the same
+    ``ttl`` as the session so DynamoDB removes leftovers on its own. Chunk
+    keys contain ``#``, which never appears in session keys.
+
+    :param engine: Engine of the session table.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _items(self, chunks, ttl):
+        return [
+            {self.engine.hash_key: key, "chunk": data, "ttl": ttl}
+            for key, data in chunks.items()
+        ]
+
+    def _check_written(self, unprocessed):
+        if unprocessed:
+            raise ChunkError(
+                "%d session chunks could not be written." % len(unprocessed)
+            )
+
+    def _data(self, keys, items):
+        try:
+            return [items[key]["chunk"] for key in keys]
+        except KeyError as e:
+            raise ChunkError("Missing session chunk: %s" % e.args[0])
+
+    def _check_deleted(self, unprocessed):
+        if unprocessed:
+            logger.warning(
+                "%d session chunks could not be deleted, they'll expire.",
+                len(unprocessed),
+            )
+
+    @property
+    def _attributes(self):
+        return (self.engine.hash_key, "chunk")
+
+    def put(self, chunks, ttl):
+        for group in batches(self._items(chunks, ttl), BATCH_WRITE_SIZE):
+            self._check_written(self.engine.batch_write(put_items=group))
+
+    def get(self, keys):
+        items = {}
+        for group in batches(keys, BATCH_GET_SIZE):
+            items.update(self.engine.batch_get(group, attributes=self._attributes))
+        return self._data(keys, items)
+
+    def delete(self, keys):
+        for group in batches(keys, BATCH_WRITE_SIZE):
+            self._check_deleted(self.engine.batch_write(delete_keys=group))
+
+    async def aput(self, chunks, ttl):
+        for group in batches(self._items(chunks, ttl), BATCH_WRITE_SIZE):
+            self._check_written(await self.engine.abatch_write(put_items=group))
+
+    async def aget(self, keys):
+        items = {}
+        for group in batches(keys, BATCH_GET_SIZE):
+            items.update(
+                await self.engine.abatch_get(group, attributes=self._attributes)
+            )
+        return self._data(keys, items)
+
+    async def adelete(self, keys):
+        for group in batches(keys, BATCH_WRITE_SIZE):
+            self._check_deleted(await self.engine.abatch_write(delete_keys=group))
+
+
+class FileSystemChunkStore(ChunkStore):
+    """
+    Stores chunks as files in a local directory. Meant for tests and
+    development: files are only removed when their session is rewritten or
+    deleted, never when it expires.
+
+    :param str path: Directory the chunks are stored in.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.path, key)
+
+    def put(self, chunks, ttl):
+        for key, data in chunks.items():
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+
+    def get(self, keys):
+        chunks = []
+        for key in keys:
+            try:
+                with open(self._path(key), "rb") as f:
+                    chunks.append(f.read())
+            except FileNotFoundError:
+                raise ChunkError("Missing session chunk: %s" % key)
+        return chunks
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
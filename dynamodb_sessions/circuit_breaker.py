@@ -0,0 +1,172 @@
+"""
+Per-process circuit breaker around DynamoDB calls.
+
+The breaker watches the outcome of the last calls. When too many of them
+fail (throttling, server errors, timeouts) or are too slow, it opens and
+calls fail fast with ``CircuitOpenError`` instead of waiting for DynamoDB.
+After a while, it lets a few probe calls through (half-open): if they
+succeed it closes again, otherwise it stays open for another period.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Error codes meaning DynamoDB is overloaded or unavailable, rather than
+# rejecting the request itself.
+UNAVAILABLE_CODES = frozenset(
+    (
+        "ProvisionedThroughputExceededException",
+        "RequestLimitExceeded",
+        "ThrottlingException",
+        "InternalServerError",
+        "ServiceUnavailable",
+    )
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling DynamoDB while the circuit is open.
+    """
+
+
+def is_unavailable(error):
+    """
+    Whether ``error`` means DynamoDB is unavailable: a transport error
+    (timeouts, refused connections), throttling or a server error.
+    """
+    if isinstance(error, CircuitOpenError):
+        return True
+    if isinstance(error, ClientError):
+        if error.response.get("Error", {}).get("Code") in UNAVAILABLE_CODES:
+            return True
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return status is not None and status >= 500
+    return isinstance(error, BotoCoreError)
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    :param float failure_ratio: Share of failed (or slow) calls among the
+        last ``window_size`` ones that opens the circuit.
+    :param int window_size: Number of recent calls considered.
+    :param int minimum_calls: Calls needed in the window before it can open.
+    :param float slow_call_seconds: Calls slower than this count as
+        failures. ``None`` ignores latency.
+    :param float open_seconds: How long the circuit stays open before
+        probing.
+    :param int probe_calls: Number of successful probes closing the
+        circuit, and of probes allowed at once.
+    """
+
+    def __init__(
+        self,
+        failure_ratio=0.5,
+        window_size=50,
+        minimum_calls=10,
+        slow_call_seconds=None,
+        open_seconds=10,
+        probe_calls=3,
+        clock=time.monotonic,
+    ):
+        self.failure_ratio = failure_ratio
+        self.minimum_calls = minimum_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.probe_calls = probe_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._check_half_open()
+            return self._state
+
+    def _check_half_open(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = self._probe_successes = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def allow(self):
+        """
+        Whether a call may go through. In the half-open state, a ``True``
+        reserves one of the probes, which ``record()`` must release.
+        """
+        with self._lock:
+            self._check_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.probe_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, failed, duration=0.0):
+        """
+        Records the outcome of a call ``allow()`` let through.
+        """
+        if self.slow_call_seconds is not None and duration > self.slow_call_seconds:
+            failed = True
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probe_calls:
+                        self._state = CLOSED
+                return
+            if self._state == OPEN:
+                # A call started before the circuit opened.
+                return
+            self._outcomes.append(failed)
+            if (
+                len(self._outcomes) >= self.minimum_calls
+                and sum(self._outcomes) >= self.failure_ratio * len(self._outcomes)
+            ):
+                self._open()
+
+    @contextmanager
+    def guard(self):
+        """
+        Context manager wrapping calls to DynamoDB (blocking or awaited).
+
+        :raises: ``CircuitOpenError`` if the circuit is open.
+        """
+        if not self.allow():
+            raise CircuitOpenError("DynamoDB is unavailable, the circuit is open.")
+        start_time = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            # Also releases the probe of a cancelled call.
+            self.record(is_unavailable(e), time.monotonic() - start_time)
+            raise
+        self.record(False, time.monotonic() - start_time)
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._outcomes.clear()
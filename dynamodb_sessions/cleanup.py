@@ -0,0 +1,159 @@
+"""
+Removal of expired sessions with a parallel, resumable, throttled scan.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dynamodb_sessions.engines import BATCH_WRITE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Checkpoint marker for segments scanned to the end.
+DONE = "done"
+
+
+class RateLimiter:
+    """
+    Keeps the capacity units consumed by all threads under ``rate`` per
+    second, by making callers wait once they're ahead of the budget.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._consumed = 0.0
+
+    def consume(self, units):
+        if not self.rate:
+            return
+        with self._lock:
+            self._consumed += units
+            ahead = self._consumed / self.rate - (time.monotonic() - self._started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class Checkpoint:
+    """
+    Progress of every scan segment, persisted as JSON in ``path`` after each
+    page so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path, total_segments):
+        self.path = path
+        self.total_segments = total_segments
+        self._lock = threading.Lock()
+        self.positions = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("total_segments") == total_segments:
+                self.positions = {int(k): v for k, v in state["positions"].items()}
+            else:
+                logger.warning(
+                    "Ignoring checkpoint %s made with %s segments.",
+                    path,
+                    state.get("total_segments"),
+                )
+
+    def get(self, segment):
+        return self.positions.get(segment)
+
+    def update(self, segment, position):
+        with self._lock:
+            self.positions[segment] = position
+            if not self.path:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(
+                    {"total_segments": self.total_segments, "positions": self.positions},
+                    f,
+                )
+            os.replace(tmp_path, self.path)
+
+    def finish(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ExpiredSessionCleaner:
+    """
+    Deletes sessions whose ``ttl`` has passed, without waiting for
+    DynamoDB's own TTL deletion (which can lag by up to 48 hours).
+
+    The table is scanned in ``segments`` parallel segments, filtering on
+    ``ttl`` server-side and only fetching keys. Expired keys are deleted in
+    ``BatchWriteItem`` chunks.
+
+    :param engine: Engine of the session table.
+    :param int segments: Number of scan segments (and worker threads).
+    :param float max_capacity: Capacity units per second the run may consume
+        (scans and deletes together), or ``None`` for no limit. Deletes are
+        counted as one write unit each.
+    :param str checkpoint: Path of a file recording progress, so that an
+        interrupted run can be resumed.
+    :param int page_size: Maximum number of items evaluated per scan page.
+    """
+
+    def __init__(
+        self, engine, segments=4, max_capacity=None, checkpoint=None, page_size=1000
+    ):
+        self.engine = engine
+        self.segments = segments
+        self.limiter = RateLimiter(max_capacity)
+        self.checkpoint = Checkpoint(checkpoint, segments)
+        self.page_size = page_size
+
+    def run(self, expired_before=None):
+        """
+        :param int expired_before: Timestamp sessions must have expired by,
+            defaulting to now.
+        :returns: The number of sessions deleted.
+        """
+        if expired_before is None:
+            expired_before = int(time.time())
+        with ThreadPoolExecutor(max_workers=self.segments) as executor:
+            deleted = sum(
+                executor.map(
+                    lambda segment: self.clean_segment(segment, expired_before),
+                    range(self.segments),
+                )
+            )
+        self.checkpoint.finish()
+        return deleted
+
+    def clean_segment(self, segment, expired_before):
+        start_key = self.checkpoint.get(segment)
+        if start_key == DONE:
+            return 0
+        deleted = 0
+        while True:
+            items, start_key, consumed = self.engine.scan_page(
+                segment,
+                self.segments,
+                expired_before=expired_before,
+                attributes=(self.engine.hash_key,),
+                start_key=start_key,
+                limit=self.page_size,
+            )
+            self.limiter.consume(consumed)
+            keys = [item[self.engine.hash_key] for item in items]
+            for index in range(0, len(keys), BATCH_WRITE_SIZE):
+                chunk = keys[index : index + BATCH_WRITE_SIZE]
+                unprocessed = self.engine.batch_write(delete_keys=chunk)
+                if unprocessed:
+                    logger.warning(
+                        "%d expired sessions could not be deleted.", len(unprocessed)
+                    )
+                deleted += len(chunk) - len(unprocessed)
+                self.limiter.consume(len(chunk))
+            self.checkpoint.update(segment, start_key or DONE)
+            if not start_key:
+                return deleted
@@ -0,0 +1,187 @@
+"""
+Compression codecs for stored session payloads.
+
+Stored payloads start with a one-byte header identifying how the rest of the
+payload is compressed. Payloads written before the header existed are
+base64-encoded zlib streams: their first byte is always a base64 character,
+which never collides with a header value, so they keep decoding
+transparently.
+
+Payloads compressed with a trained zstd dictionary carry the 4-byte
+dictionary ID right after the header, so several dictionaries can be live at
+the same time while rotating them.
+"""
+
+import base64
+import struct
+import threading
+import zlib
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Header values. Anything from LEGACY_MIN_BYTE upwards is a legacy payload.
+RAW = 0x01
+ZLIB = 0x02
+LZ4 = 0x03
+ZSTD = 0x04
+ZSTD_DICT = 0x05
+LEGACY_MIN_BYTE = 0x20
+
+DICTIONARY_ID = struct.Struct(">I")
+
+COMPRESSION_HEADERS = {
+    "none": RAW,
+    "zlib": ZLIB,
+    "lz4": LZ4,
+    "zstd": ZSTD,
+}
+
+
+def load_dictionaries(paths):
+    """
+    Reads trained zstd dictionaries from ``paths``.
+    """
+    dictionaries = []
+    for path in paths:
+        with open(path, "rb") as f:
+            dictionaries.append(f.read())
+    return dictionaries
+
+
+class Codec:
+    """
+    Compresses serialized session payloads and prefixes them with their
+    header.
+
+    :param str compression: One of ``none``, ``zlib``, ``lz4`` or ``zstd``.
+    :param int level: Compression level, ``None`` for the library default.
+    :param int threshold: Payloads smaller than this many bytes are stored
+        uncompressed, since compressing them rarely makes them smaller.
+    :param list dictionaries: Raw trained zstd dictionaries. All of them can
+        be decoded; with ``zstd`` compression the first one is used to
+        compress new payloads.
+    """
+
+    def __init__(self, compression="zlib", level=None, threshold=0, dictionaries=()):
+        if compression not in COMPRESSION_HEADERS:
+            raise ImproperlyConfigured(
+                "Unknown session compression %r, use one of: %s"
+                % (compression, ", ".join(COMPRESSION_HEADERS))
+            )
+        self.compression = compression
+        self.level = level
+        self.threshold = threshold
+        self.header = COMPRESSION_HEADERS[compression]
+        self._local = threading.local()
+        # Fail early rather than on the first request.
+        self._require(self.header)
+        self.dictionaries = {}
+        self.dictionary_id = None
+        if dictionaries:
+            self._require(ZSTD_DICT)
+            for data in dictionaries:
+                dictionary = zstandard.ZstdCompressionDict(data)
+                self.dictionaries[dictionary.dict_id()] = dictionary
+                if self.dictionary_id is None:
+                    self.dictionary_id = dictionary.dict_id()
+            if compression == "zstd":
+                self.header = ZSTD_DICT
+
+    def _require(self, header):
+        if header == LZ4 and lz4 is None:
+            raise ImproperlyConfigured("lz4 session compression requires lz4.")
+        if header in (ZSTD, ZSTD_DICT) and zstandard is None:
+            raise ImproperlyConfigured(
+                "zstd session compression requires zstandard."
+            )
+
+    def _zstd_compressor(self, dictionary_id=None):
+        # zstandard (de)compressors must not be shared between threads.
+        compressors = getattr(self._local, "compressors", None)
+        if compressors is None:
+            compressors = self._local.compressors = {}
+        compressor = compressors.get(dictionary_id)
+        if compressor is None:
+            kwargs = {} if self.level is None else {"level": self.level}
+            if dictionary_id is not None:
+                # The ID is already in our own header.
+                kwargs["dict_data"] = self.dictionaries[dictionary_id]
+                kwargs["write_dict_id"] = False
+            compressor = compressors[dictionary_id] = zstandard.ZstdCompressor(
+                **kwargs
+            )
+        return compressor
+
+    def _zstd_decompressor(self, dictionary_id=None):
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dictionary_id)
+        if decompressor is None:
+            kwargs = {}
+            if dictionary_id is not None:
+                try:
+                    kwargs["dict_data"] = self.dictionaries[dictionary_id]
+                except KeyError:
+                    raise ValueError(
+                        "Unknown session compression dictionary: %d" % dictionary_id
+                    )
+            decompressor = decompressors[dictionary_id] = zstandard.ZstdDecompressor(
+                **kwargs
+            )
+        return decompressor
+
+    def compress(self, payload):
+        """
+        Returns ``payload`` compressed and prefixed with its header.
+        """
+        header = self.header
+        if header != RAW and len(payload) >= self.threshold:
+            if header == ZLIB:
+                body = zlib.compress(payload, -1 if self.level is None else self.level)
+            elif header == LZ4:
+                kwargs = {} if self.level is None else {"compression_level": self.level}
+                body = lz4.frame.compress(payload, **kwargs)
+            elif header == ZSTD_DICT:
+                body = DICTIONARY_ID.pack(self.dictionary_id) + self._zstd_compressor(
+                    self.dictionary_id
+                ).compress(payload)
+            else:
+                body = self._zstd_compressor().compress(payload)
+            if len(body) < len(payload):
+                return bytes((header,)) + body
+        return bytes((RAW,)) + payload
+
+    def decompress(self, data):
+        """
+        Returns the serialized payload stored in ``data``.
+        """
+        header = data[0]
+        if header >= LEGACY_MIN_BYTE:
+            return zlib.decompress(base64.b64decode(data))
+        body = memoryview(data)[1:]
+        if header == RAW:
+            return bytes(body)
+        if header == ZLIB:
+            return zlib.decompress(body)
+        self._require(header)
+        if header == LZ4:
+            return lz4.frame.decompress(body)
+        if header == ZSTD:
+            return self._zstd_decompressor().decompress(body)
+        if header == ZSTD_DICT:
+            (dictionary_id,) = DICTIONARY_ID.unpack_from(body)
+            return self._zstd_decompressor(dictionary_id).decompress(
+                body[DICTIONARY_ID.size :]
+            )
+        raise ValueError("Unknown session payload header: 0x%02x" % header)
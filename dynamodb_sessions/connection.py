@@ -0,0 +1,203 @@
+"""
+Per-process, fork-aware DynamoDB connection management.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from django.core.exceptions import ImproperlyConfigured
+
+# aiobotocore (and aiohttp, which takes longer to import than boto3) is only
+# imported by the first async call, so sync workers never load it.
+AIOBOTOCORE_INSTALLED = importlib.util.find_spec("aiobotocore") is not None
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """
+    Hands out reusable boto3 clients, resources and tables.
+
+    Low-level clients are thread-safe, so a single one (and its HTTP
+    connection pool) is shared by every thread of the process. Resources are
+    not, so each thread gets its own, wrapping a second process-wide client
+    which carries the resource layer's (de)serialization handlers: threads
+    don't load the models, resolve credentials or open connections again.
+    Everything is thrown away and rebuilt lazily when a fork is detected, so
+    pre-forking servers never share sockets between a parent and its
+    children.
+    """
+
+    def __init__(self, max_pool_connections=10, tcp_keepalive=True, **client_kwargs):
+        pool_config = Config(
+            max_pool_connections=max_pool_connections, tcp_keepalive=tcp_keepalive
+        )
+        user_config = client_kwargs.pop("config", None)
+        # Options explicitly set in BOTO_CORE_CONFIG win over the pool defaults.
+        client_kwargs["config"] = (
+            pool_config.merge(user_config) if user_config else pool_config
+        )
+        self.client_kwargs = client_kwargs
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._client = None
+        self._shared_resource = None
+        self._local = threading.local()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    logger.debug("Fork detected, rebuilding DynamoDB connections.")
+                    self._reset()
+
+    def client(self):
+        """
+        Returns the process-wide low-level DynamoDB client.
+        """
+        self._check_fork()
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    logger.debug("Creating a DynamoDB client.")
+                    self._client = boto3.session.Session().client(**self.client_kwargs)
+                client = self._client
+        return client
+
+    def _get_shared_resource(self):
+        """
+        Returns the process-wide resource the threads' resources are copied
+        from, sharing its client.
+        """
+        resource = self._shared_resource
+        if resource is None:
+            with self._lock:
+                if self._shared_resource is None:
+                    logger.debug("Creating the shared DynamoDB resource.")
+                    self._shared_resource = boto3.session.Session().resource(
+                        **self.client_kwargs
+                    )
+                resource = self._shared_resource
+        return resource
+
+    def resource(self):
+        """
+        Returns the DynamoDB service resource owned by the calling thread.
+        """
+        self._check_fork()
+        resource = getattr(self._local, "resource", None)
+        if resource is None:
+            shared_resource = self._get_shared_resource()
+            resource = type(shared_resource)(client=shared_resource.meta.client)
+            self._local.resource = resource
+            self._local.tables = {}
+        return resource
+
+    def table(self, table_name):
+        """
+        Returns the ``Table`` resource for ``table_name`` owned by the calling
+        thread.
+        """
+        resource = self.resource()
+        tables = self._local.tables
+        table = tables.get(table_name)
+        if table is None:
+            table = tables[table_name] = resource.Table(table_name)
+        return table
+
+    def prewarm(self, connections=1, resource=False):
+        """
+        Does ahead of time what the first DynamoDB call of a worker would
+        otherwise do within a request: creating the client loads the service
+        model and resolves credentials, then ``connections`` concurrent
+        requests open that many keep-alive connections (at most
+        ``max_pool_connections``).
+
+        :keyword bool resource: Also prewarm the client shared by the
+            threads' resources, which has its own connections.
+        """
+        clients = [self.client()]
+        if resource:
+            clients.append(self._get_shared_resource().meta.client)
+        for client in clients:
+            count = min(connections, client.meta.config.max_pool_connections)
+            barrier = threading.Barrier(count)
+
+            def connect(_):
+                # Wait for every request to start, so each needs a connection.
+                barrier.wait()
+                try:
+                    # Costs no capacity, and needs no table (or permission:
+                    # an error response leaves the connection open too).
+                    client.describe_endpoints()
+                except (BotoCoreError, ClientError) as e:
+                    logger.debug("Prewarming DynamoDB connection: %s", e)
+
+            with ThreadPoolExecutor(max_workers=count) as executor:
+                list(executor.map(connect, range(count)))
+
+
+class AsyncConnectionManager:
+    """
+    Hands out aiobotocore clients, with their own pooled connections.
+
+    An async client is bound to the event loop it was created in, so one
+    client is kept per running loop. Its connections stay open until
+    ``close()`` is awaited in that loop, which whoever runs the loop must do
+    before it ends (see ``aclose()`` in the backend). Requires
+    ``aiobotocore``.
+    """
+
+    def __init__(self, max_pool_connections=10, **client_kwargs):
+        config = Config(max_pool_connections=max_pool_connections)
+        user_config = client_kwargs.pop("config", None)
+        # Options explicitly set in BOTO_CORE_CONFIG win over the defaults.
+        self.config = config.merge(user_config) if user_config else config
+        self.client_kwargs = client_kwargs
+        self._clients = weakref.WeakKeyDictionary()
+        self._locks = weakref.WeakKeyDictionary()
+
+    async def client(self):
+        """
+        Returns the async DynamoDB client of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is not None:
+            return client
+        if not AIOBOTOCORE_INSTALLED:
+            raise ImproperlyConfigured("Async session access requires aiobotocore.")
+        from aiobotocore.config import AioConfig
+        from aiobotocore.session import get_session as get_aio_session
+
+        lock = self._locks.setdefault(loop, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(loop)
+            if client is None:
+                logger.debug("Creating an async DynamoDB client.")
+                context = get_aio_session().create_client(
+                    config=AioConfig().merge(self.config), **self.client_kwargs
+                )
+                client = await context.__aenter__()
+                self._clients[loop] = client
+        return client
+
+    async def close(self):
+        """
+        Closes the client of the running event loop, if any.
+        """
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
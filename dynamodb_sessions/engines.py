@@ -0,0 +1,914 @@
+"""
+Engines translating session store operations into DynamoDB calls.
+
+The session store works with plain Python items (``str``, ``bytes``,
+``int``, ``bool``, ``None``, ``dict`` and ``list`` values). Each engine takes
+care of converting them to and from the wire format.
+"""
+
+import asyncio
+import copy
+import functools
+import math
+import random
+import threading
+import time
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+# Condition templates. ``#key`` always refers to the table's hash attribute.
+NOT_EXISTS = "attribute_not_exists(#key)"
+EXISTS = "attribute_exists(#key)"
+# Conditions on the item's TTL, given the current timestamp as ``:now``:
+# expired items DynamoDB hasn't deleted yet count as missing.
+NOT_LIVE = "attribute_not_exists(#key) OR #ttl < :now"
+LIVE = "attribute_exists(#key) AND (attribute_not_exists(#ttl) OR #ttl >= :now)"
+# Condition of increments: the attribute is a number of a live item.
+LIVE_NUMBER = (
+    "attribute_type(#n0, :number) AND (attribute_not_exists(#ttl) OR #ttl >= :now)"
+)
+# Conditions of writes built from a given version of the item, as
+# ``:version``, or from an item without one.
+VERSION_IS = "attribute_exists(#key) AND #version = :version"
+NO_VERSION = "attribute_exists(#key) AND attribute_not_exists(#version)"
+
+# BatchWriteItem accepts at most 25 requests per call, BatchGetItem 100 keys.
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+BATCH_MAX_ATTEMPTS = 8
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 5.0
+
+
+def backoff_delay(attempt):
+    """
+    Exponential backoff with full jitter, in seconds.
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def batches(sequence, size):
+    """
+    Splits ``sequence`` into lists of at most ``size`` elements.
+    """
+    return [sequence[index : index + size] for index in range(0, len(sequence), size)]
+
+
+@functools.lru_cache(maxsize=512)
+def compile_update(set_names=(), remove_names=()):
+    """
+    Builds the ``UpdateExpression`` and ``ExpressionAttributeNames`` for an
+    update setting ``set_names`` and removing ``remove_names``.
+
+    Names may be attribute names or tuples describing a document path.
+    Results are cached, so the same template (and the same names dict) is
+    reused by every save with the same shape. Callers must not mutate it.
+
+    :returns: ``(update_expression, attribute_names)``
+    """
+    names = {}
+
+    def placeholder(path):
+        if isinstance(path, str):
+            path = (path,)
+        parts = []
+        for part in path:
+            name = "#n%d" % len(names)
+            names[name] = part
+            parts.append(name)
+        return ".".join(parts)
+
+    clauses = []
+    if set_names:
+        clauses.append(
+            "SET "
+            + ", ".join(
+                "%s = :v%d" % (placeholder(path), index)
+                for index, path in enumerate(set_names)
+            )
+        )
+    if remove_names:
+        clauses.append("REMOVE " + ", ".join(placeholder(p) for p in remove_names))
+    return " ".join(clauses), names
+
+
+@functools.lru_cache(maxsize=64)
+def compile_projection(attributes):
+    """
+    Builds the ``ProjectionExpression`` and ``ExpressionAttributeNames``
+    fetching only ``attributes``. Most of them (``data``, ``ttl``) are
+    reserved words, so they're always referred to through placeholders.
+
+    :returns: ``(projection_expression, attribute_names)``
+    """
+    names = {"#p%d" % index: name for index, name in enumerate(attributes)}
+    return ", ".join(names), names
+
+
+def serialize(value):
+    """
+    Converts a plain Python value into a DynamoDB attribute value.
+    """
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, (bytes, bytearray)):
+        return {"B": bytes(value)}
+    # bool is a subclass of int, so check it first.
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, Decimal)):
+        return {"N": str(value)}
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, dict):
+        return {"M": {k: serialize(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"L": [serialize(v) for v in value]}
+    raise TypeError("Unsupported DynamoDB value type: %r" % type(value))
+
+
+def deserialize(attribute):
+    """
+    Converts a DynamoDB attribute value into a plain Python value.
+    """
+    ((type_, value),) = attribute.items()
+    if type_ in ("S", "B", "BOOL"):
+        return value
+    if type_ == "N":
+        return int(value) if value.lstrip("-").isdigit() else Decimal(value)
+    if type_ == "NULL":
+        return None
+    if type_ == "M":
+        return {k: deserialize(v) for k, v in value.items()}
+    if type_ == "L":
+        return [deserialize(v) for v in value]
+    raise TypeError("Unsupported DynamoDB attribute type: %s" % type_)
+
+
+def normalize(value):
+    """
+    Converts values produced by the boto3 resource layer into plain values.
+    """
+    if isinstance(value, Binary):
+        return value.value
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else value
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return value
+
+
+class Engine:
+    """
+    Base class of the engines.
+
+    Builds the low-level client requests, which are used for batch
+    operations and async calls by every engine.
+
+    :param str table_name: Table sessions are stored in.
+    :param str hash_key: Name of the table's hash attribute.
+    :param connections: ``ConnectionManager`` handing out sync connections.
+    :param async_connections: ``AsyncConnectionManager`` handing out async
+        clients, required by the ``a``-prefixed methods.
+    :param bool return_consumed_capacity: Ask DynamoDB to report the capacity
+        consumed by single-item calls, in their responses'
+        ``ConsumedCapacity``.
+    """
+
+    def __init__(
+        self,
+        table_name,
+        hash_key,
+        connections,
+        async_connections=None,
+        return_consumed_capacity=False,
+    ):
+        self.table_name = table_name
+        self.hash_key = hash_key
+        self.connections = connections
+        self.async_connections = async_connections
+        self.return_consumed_capacity = return_consumed_capacity
+
+    def for_table(self, table_name):
+        """
+        :returns: An engine of the same kind, sharing this one's connections,
+            working on ``table_name``.
+        """
+        engine = copy.copy(self)
+        engine.table_name = table_name
+        return engine
+
+    # A single table has no key prefix, and all its keys are current. See
+    # RotatingEngine.
+
+    def key_prefix(self):
+        return ""
+
+    def is_current(self, key):
+        return True
+
+    def _key(self, key):
+        return {self.hash_key: {"S": key}}
+
+    def _update_template(self, set_names, remove_names, condition):
+        expression, names = compile_update(set_names, remove_names)
+        if condition is not None:
+            names = dict(names, **{"#key": self.hash_key})
+            if "#ttl" in condition:
+                names["#ttl"] = "ttl"
+            if "#version" in condition:
+                names["#version"] = "version"
+        return expression, names
+
+    def _increment_template(self, attribute):
+        return "ADD #n0 :v0", {"#n0": attribute, "#ttl": "ttl"}
+
+    def _capacity(self, kwargs):
+        if self.return_consumed_capacity:
+            kwargs["ReturnConsumedCapacity"] = "TOTAL"
+        return kwargs
+
+    @staticmethod
+    def _projection(kwargs, attributes):
+        if attributes:
+            expression, names = compile_projection(tuple(attributes))
+            kwargs["ProjectionExpression"] = expression
+            kwargs["ExpressionAttributeNames"] = names
+
+    def _get_item_request(self, key, consistent_read, attributes):
+        kwargs = {
+            "TableName": self.table_name,
+            "Key": self._key(key),
+            "ConsistentRead": consistent_read,
+        }
+        self._projection(kwargs, attributes)
+        return self._capacity(kwargs)
+
+    @staticmethod
+    def _item_from(response, field="Item"):
+        item = response.get(field)
+        if item is not None:
+            item = {name: deserialize(value) for name, value in item.items()}
+        return item
+
+    def _update_item_request(
+        self, key, set_values, remove, condition, condition_values
+    ):
+        set_values = set_values or {}
+        expression, names = self._update_template(
+            tuple(set_values), tuple(remove), condition
+        )
+        kwargs = {
+            "TableName": self.table_name,
+            "Key": self._key(key),
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": names,
+        }
+        if set_values:
+            kwargs["ExpressionAttributeValues"] = {
+                ":v%d" % index: serialize(value)
+                for index, value in enumerate(set_values.values())
+            }
+        if condition is not None:
+            kwargs["ConditionExpression"] = condition
+        if condition_values:
+            kwargs.setdefault("ExpressionAttributeValues", {}).update(
+                (name, serialize(value)) for name, value in condition_values.items()
+            )
+        return self._capacity(kwargs)
+
+    def _increment_request(self, key, attribute, delta, now):
+        expression, names = self._increment_template(attribute)
+        kwargs = {
+            "TableName": self.table_name,
+            "Key": self._key(key),
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {
+                ":v0": serialize(delta),
+                ":number": serialize("N"),
+                ":now": serialize(int(now)),
+            },
+            "ConditionExpression": LIVE_NUMBER,
+            "ReturnValues": "UPDATED_NEW",
+        }
+        return self._capacity(kwargs)
+
+    def _delete_item_request(self, key, return_old):
+        kwargs = {"TableName": self.table_name, "Key": self._key(key)}
+        if return_old:
+            kwargs["ReturnValues"] = "ALL_OLD"
+        return self._capacity(kwargs)
+
+    def get_item(self, key, consistent_read=True, attributes=None):
+        """
+        :returns: ``(item, response)``. ``item`` is ``None`` when there's no
+            item stored under ``key``.
+        """
+        raise NotImplementedError
+
+    def update_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        """
+        Sets ``set_values`` and removes the ``remove`` attributes on the item
+        stored under ``key``, provided ``condition`` holds.
+
+        :param dict condition_values: Values of the placeholders of
+            ``condition``, such as ``:now``.
+        :returns: The response.
+        """
+        raise NotImplementedError
+
+    def increment(self, key, attribute, delta, now):
+        """
+        Atomically adds ``delta`` to the number ``attribute`` of the item
+        stored under ``key``, provided it's still live at the ``now``
+        timestamp.
+
+        :returns: ``(value, response)``, ``value`` being the new number.
+        :raises: ``ClientError`` (``ConditionalCheckFailedException``) if
+            there's no such live number.
+        """
+        raise NotImplementedError
+
+    def delete_item(self, key, return_old=False):
+        """
+        :keyword bool return_old: Return the deleted item. DynamoDB doesn't
+            charge read capacity for it.
+        :returns: ``(old_item, response)``. ``old_item`` is ``None`` unless
+            ``return_old`` is set and an item was deleted.
+        """
+        raise NotImplementedError
+
+    # Async calls always go through the low-level client.
+
+    async def aget_item(self, key, consistent_read=True, attributes=None):
+        client = await self.async_connections.client()
+        response = await client.get_item(
+            **self._get_item_request(key, consistent_read, attributes)
+        )
+        return self._item_from(response), response
+
+    async def aupdate_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        client = await self.async_connections.client()
+        return await client.update_item(
+            **self._update_item_request(
+                key, set_values, remove, condition, condition_values
+            )
+        )
+
+    async def aincrement(self, key, attribute, delta, now):
+        client = await self.async_connections.client()
+        response = await client.update_item(
+            **self._increment_request(key, attribute, delta, now)
+        )
+        return self._item_from(response, "Attributes")[attribute], response
+
+    async def adelete_item(self, key, return_old=False):
+        client = await self.async_connections.client()
+        response = await client.delete_item(
+            **self._delete_item_request(key, return_old)
+        )
+        return self._item_from(response, "Attributes"), response
+
+    # Batch operations always go through the low-level client.
+
+    def batch_write(self, put_items=(), delete_keys=(), max_attempts=BATCH_MAX_ATTEMPTS):
+        """
+        Puts ``put_items`` and deletes the items stored under
+        ``delete_keys`` (at most ``BATCH_WRITE_SIZE`` requests in all) with a
+        ``BatchWriteItem``, retrying unprocessed requests with backoff.
+
+        :returns: The keys whose request was still unprocessed after
+            ``max_attempts``.
+        """
+        requests = self._batch_write_requests(put_items, delete_keys)
+        client = self.connections.client()
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(backoff_delay(attempt))
+            response = client.batch_write_item(
+                RequestItems={self.table_name: requests}
+            )
+            requests = response.get("UnprocessedItems", {}).get(self.table_name)
+            if not requests:
+                return []
+        return [self._request_key(request) for request in requests]
+
+    async def abatch_write(
+        self, put_items=(), delete_keys=(), max_attempts=BATCH_MAX_ATTEMPTS
+    ):
+        requests = self._batch_write_requests(put_items, delete_keys)
+        client = await self.async_connections.client()
+        for attempt in range(max_attempts):
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt))
+            response = await client.batch_write_item(
+                RequestItems={self.table_name: requests}
+            )
+            requests = response.get("UnprocessedItems", {}).get(self.table_name)
+            if not requests:
+                return []
+        return [self._request_key(request) for request in requests]
+
+    def _batch_write_requests(self, put_items, delete_keys):
+        requests = [
+            {"PutRequest": {"Item": {k: serialize(v) for k, v in item.items()}}}
+            for item in put_items
+        ]
+        requests.extend({"DeleteRequest": {"Key": self._key(k)}} for k in delete_keys)
+        return requests
+
+    def batch_get(
+        self,
+        keys,
+        consistent_read=True,
+        attributes=None,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+    ):
+        """
+        Fetches the items stored under ``keys`` (at most ``BATCH_GET_SIZE``)
+        with a ``BatchGetItem``, retrying unprocessed keys with backoff.
+
+        :param attributes: Attributes to fetch. They must include the hash
+            attribute.
+        :returns: A dict of the items found, by key. Keys still unprocessed
+            after ``max_attempts`` are missing from it too.
+        """
+        request = self._batch_get_request(keys, consistent_read, attributes)
+        client = self.connections.client()
+        items = {}
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(backoff_delay(attempt))
+            response = client.batch_get_item(RequestItems={self.table_name: request})
+            request = self._batch_get_collect(response, items)
+            if not request:
+                break
+        return items
+
+    async def abatch_get(
+        self,
+        keys,
+        consistent_read=True,
+        attributes=None,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+    ):
+        request = self._batch_get_request(keys, consistent_read, attributes)
+        client = await self.async_connections.client()
+        items = {}
+        for attempt in range(max_attempts):
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt))
+            response = await client.batch_get_item(
+                RequestItems={self.table_name: request}
+            )
+            request = self._batch_get_collect(response, items)
+            if not request:
+                break
+        return items
+
+    def _batch_get_request(self, keys, consistent_read, attributes):
+        request = {
+            "Keys": [self._key(key) for key in keys],
+            "ConsistentRead": consistent_read,
+        }
+        self._projection(request, attributes)
+        return request
+
+    def _batch_get_collect(self, response, items):
+        # Adds the items found to ``items`` and returns what's left to fetch.
+        for item in response["Responses"].get(self.table_name, ()):
+            item = {name: deserialize(value) for name, value in item.items()}
+            items[item[self.hash_key]] = item
+        return response.get("UnprocessedKeys", {}).get(self.table_name)
+
+    def scan_page(
+        self,
+        segment=0,
+        total_segments=1,
+        expired_before=None,
+        attributes=None,
+        start_key=None,
+        limit=None,
+    ):
+        """
+        Scans one page of one segment of the table.
+
+        :param int expired_before: Only return items whose ``ttl`` is before
+            this timestamp. The filter is applied server-side.
+        :param start_key: The ``LastEvaluatedKey`` of the previous page.
+        :returns: ``(items, last_evaluated_key, consumed_capacity_units)``.
+            ``last_evaluated_key`` is ``None`` on the segment's last page.
+        """
+        kwargs = {"TableName": self.table_name, "ReturnConsumedCapacity": "TOTAL"}
+        if total_segments > 1:
+            kwargs["Segment"] = segment
+            kwargs["TotalSegments"] = total_segments
+        self._projection(kwargs, attributes)
+        if expired_before is not None:
+            kwargs["FilterExpression"] = "#ttl < :now"
+            kwargs["ExpressionAttributeNames"] = dict(
+                kwargs.get("ExpressionAttributeNames", {}), **{"#ttl": "ttl"}
+            )
+            kwargs["ExpressionAttributeValues"] = {":now": serialize(int(expired_before))}
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        if limit:
+            kwargs["Limit"] = limit
+        response = self.connections.client().scan(**kwargs)
+        items = [
+            {name: deserialize(value) for name, value in item.items()}
+            for item in response["Items"]
+        ]
+        consumed = response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        return items, response.get("LastEvaluatedKey"), consumed
+
+    def query_keys(self, index_name, attribute, value):
+        """
+        Queries the ``index_name`` global secondary index, whose hash key is
+        ``attribute``, for the items where it's ``value``. Index reads are
+        eventually consistent.
+
+        :returns: The keys of the items found.
+        """
+        kwargs = self._query_request(index_name, attribute, value)
+        client = self.connections.client()
+        keys = []
+        while True:
+            response = client.query(**kwargs)
+            keys.extend(self._query_keys(response))
+            if not response.get("LastEvaluatedKey"):
+                return keys
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def aquery_keys(self, index_name, attribute, value):
+        kwargs = self._query_request(index_name, attribute, value)
+        client = await self.async_connections.client()
+        keys = []
+        while True:
+            response = await client.query(**kwargs)
+            keys.extend(self._query_keys(response))
+            if not response.get("LastEvaluatedKey"):
+                return keys
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _query_request(self, index_name, attribute, value):
+        return {
+            "TableName": self.table_name,
+            "IndexName": index_name,
+            "KeyConditionExpression": "#attribute = :value",
+            "ProjectionExpression": "#key",
+            "ExpressionAttributeNames": {"#attribute": attribute, "#key": self.hash_key},
+            "ExpressionAttributeValues": {":value": serialize(value)},
+        }
+
+    def _query_keys(self, response):
+        return [deserialize(item[self.hash_key]) for item in response["Items"]]
+
+    def _request_key(self, request):
+        if "PutRequest" in request:
+            return deserialize(request["PutRequest"]["Item"][self.hash_key])
+        return deserialize(request["DeleteRequest"]["Key"][self.hash_key])
+
+
+class ResourceEngine(Engine):
+    """
+    Talks to DynamoDB through the boto3 ``Table`` resource.
+    """
+
+    def get_item(self, key, consistent_read=True, attributes=None):
+        kwargs = {"Key": {self.hash_key: key}, "ConsistentRead": consistent_read}
+        self._projection(kwargs, attributes)
+        response = self.connections.table(self.table_name).get_item(
+            **self._capacity(kwargs)
+        )
+        item = response.get("Item")
+        return (None if item is None else normalize(item)), response
+
+    def update_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        set_values = set_values or {}
+        expression, names = self._update_template(
+            tuple(set_values), tuple(remove), condition
+        )
+        kwargs = {
+            "Key": {self.hash_key: key},
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": names,
+        }
+        if set_values:
+            kwargs["ExpressionAttributeValues"] = {
+                ":v%d" % index: value for index, value in enumerate(set_values.values())
+            }
+        if condition is not None:
+            kwargs["ConditionExpression"] = condition
+        if condition_values:
+            kwargs.setdefault("ExpressionAttributeValues", {}).update(condition_values)
+        return self.connections.table(self.table_name).update_item(
+            **self._capacity(kwargs)
+        )
+
+    def increment(self, key, attribute, delta, now):
+        expression, names = self._increment_template(attribute)
+        response = self.connections.table(self.table_name).update_item(
+            **self._capacity(
+                {
+                    "Key": {self.hash_key: key},
+                    "UpdateExpression": expression,
+                    "ExpressionAttributeNames": names,
+                    "ExpressionAttributeValues": {
+                        ":v0": delta,
+                        ":number": "N",
+                        ":now": int(now),
+                    },
+                    "ConditionExpression": LIVE_NUMBER,
+                    "ReturnValues": "UPDATED_NEW",
+                }
+            )
+        )
+        return normalize(response["Attributes"][attribute]), response
+
+    def delete_item(self, key, return_old=False):
+        kwargs = {"Key": {self.hash_key: key}}
+        if return_old:
+            kwargs["ReturnValues"] = "ALL_OLD"
+        response = self.connections.table(self.table_name).delete_item(
+            **self._capacity(kwargs)
+        )
+        item = response.get("Attributes")
+        return (None if item is None else normalize(item)), response
+
+
+class ClientEngine(Engine):
+    """
+    Talks to DynamoDB through the low-level client with hand-built attribute
+    maps, skipping the resource layer's TypeSerializer/TypeDeserializer and
+    the ``Binary`` wrapper allocations.
+    """
+
+    def get_item(self, key, consistent_read=True, attributes=None):
+        response = self.connections.client().get_item(
+            **self._get_item_request(key, consistent_read, attributes)
+        )
+        return self._item_from(response), response
+
+    def update_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        return self.connections.client().update_item(
+            **self._update_item_request(
+                key, set_values, remove, condition, condition_values
+            )
+        )
+
+    def increment(self, key, attribute, delta, now):
+        response = self.connections.client().update_item(
+            **self._increment_request(key, attribute, delta, now)
+        )
+        return self._item_from(response, "Attributes")[attribute], response
+
+    def delete_item(self, key, return_old=False):
+        response = self.connections.client().delete_item(
+            **self._delete_item_request(key, return_old)
+        )
+        return self._item_from(response, "Attributes"), response
+
+
+class InMemoryEngine(Engine):
+    """
+    Keeps items in a dict of the process instead of a DynamoDB table, for
+    benchmarks and tests. Conditions, document paths and batch/scan calls
+    behave like DynamoDB's; capacity and TTL deletion aren't emulated.
+    Connection managers are accepted for compatibility, and ignored.
+
+    :keyword float latency: Seconds single-item calls wait, to stand in for
+        a remote endpoint.
+    """
+
+    def __init__(
+        self, table_name, hash_key, connections=None, *args, latency=0.0, **kwargs
+    ):
+        super().__init__(table_name, hash_key, connections, *args, **kwargs)
+        self.items = {}
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def for_table(self, table_name):
+        engine = super().for_table(table_name)
+        engine.items = {}
+        engine._lock = threading.Lock()
+        return engine
+
+    @staticmethod
+    def _response(**fields):
+        fields["ResponseMetadata"] = {"RequestId": "memory", "RetryAttempts": 0}
+        return fields
+
+    @staticmethod
+    def _error(code, operation_name):
+        return ClientError({"Error": {"Code": code, "Message": code}}, operation_name)
+
+    @staticmethod
+    def _project(item, attributes):
+        if attributes:
+            item = {name: value for name, value in item.items() if name in attributes}
+        return copy.deepcopy(item)
+
+    def _parent(self, item, path):
+        if isinstance(path, str):
+            return item, path
+        for name in path[:-1]:
+            item = item.get(name)
+            if not isinstance(item, dict):
+                raise self._error("ValidationException", "UpdateItem")
+        return item, path[-1]
+
+    def get_item(self, key, consistent_read=True, attributes=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._get_item(key, attributes)
+
+    def _get_item(self, key, attributes):
+        with self._lock:
+            item = self.items.get(key)
+            if item is not None:
+                item = self._project(item, attributes)
+        return item, self._response()
+
+    @staticmethod
+    def _holds(condition, item, condition_values):
+        if condition is None:
+            return True
+        if condition in (EXISTS, NOT_EXISTS):
+            return (item is None) is (condition == NOT_EXISTS)
+        if condition in (VERSION_IS, NO_VERSION):
+            version = (condition_values or {}).get(":version")
+            return item is not None and item.get("version") == version
+        now = condition_values[":now"]
+        live = item is not None and item.get("ttl", math.inf) >= now
+        return live is (condition == LIVE)
+
+    def update_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._update_item(key, set_values, remove, condition, condition_values)
+
+    def _update_item(self, key, set_values, remove, condition, condition_values):
+        with self._lock:
+            item = self.items.get(key)
+            if not self._holds(condition, item, condition_values):
+                raise self._error("ConditionalCheckFailedException", "UpdateItem")
+            item = {self.hash_key: key} if item is None else copy.deepcopy(item)
+            for path, value in (set_values or {}).items():
+                parent, name = self._parent(item, path)
+                parent[name] = copy.deepcopy(value)
+            for path in remove:
+                try:
+                    parent, name = self._parent(item, path)
+                except ClientError:
+                    continue
+                parent.pop(name, None)
+            self.items[key] = item
+        return self._response()
+
+    def increment(self, key, attribute, delta, now):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._increment(key, attribute, delta, now)
+
+    def _increment(self, key, attribute, delta, now):
+        with self._lock:
+            item = self.items.get(key)
+            if (
+                not self._holds(LIVE, item, {":now": int(now)})
+                or isinstance(item.get(attribute), bool)
+                or not isinstance(item.get(attribute), (int, Decimal))
+            ):
+                raise self._error("ConditionalCheckFailedException", "UpdateItem")
+            item[attribute] += delta
+            value = item[attribute]
+        return value, self._response(Attributes={attribute: value})
+
+    def delete_item(self, key, return_old=False):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._delete_item(key, return_old)
+
+    def _delete_item(self, key, return_old):
+        with self._lock:
+            item = self.items.pop(key, None)
+        return (item if return_old else None), self._response()
+
+    async def aget_item(self, key, consistent_read=True, attributes=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._get_item(key, attributes)
+
+    async def aupdate_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._update_item(key, set_values, remove, condition, condition_values)
+
+    async def aincrement(self, key, attribute, delta, now):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._increment(key, attribute, delta, now)
+
+    async def adelete_item(self, key, return_old=False):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._delete_item(key, return_old)
+
+    def batch_write(self, put_items=(), delete_keys=(), max_attempts=BATCH_MAX_ATTEMPTS):
+        with self._lock:
+            for item in put_items:
+                self.items[item[self.hash_key]] = copy.deepcopy(item)
+            for key in delete_keys:
+                self.items.pop(key, None)
+        return []
+
+    async def abatch_write(
+        self, put_items=(), delete_keys=(), max_attempts=BATCH_MAX_ATTEMPTS
+    ):
+        return self.batch_write(put_items, delete_keys, max_attempts)
+
+    def batch_get(
+        self,
+        keys,
+        consistent_read=True,
+        attributes=None,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+    ):
+        with self._lock:
+            return {
+                key: self._project(self.items[key], attributes)
+                for key in keys
+                if key in self.items
+            }
+
+    async def abatch_get(
+        self,
+        keys,
+        consistent_read=True,
+        attributes=None,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+    ):
+        return self.batch_get(keys, consistent_read, attributes, max_attempts)
+
+    def scan_page(
+        self,
+        segment=0,
+        total_segments=1,
+        expired_before=None,
+        attributes=None,
+        start_key=None,
+        limit=None,
+    ):
+        with self._lock:
+            keys = sorted(
+                key
+                for key in self.items
+                if zlib.crc32(key.encode()) % total_segments == segment
+            )
+            if start_key:
+                start = deserialize(start_key[self.hash_key])
+                keys = [key for key in keys if key > start]
+            last_key = None
+            if limit and len(keys) > limit:
+                keys = keys[:limit]
+                last_key = self._key(keys[-1])
+            items = [
+                self._project(self.items[key], attributes)
+                for key in keys
+                if expired_before is None
+                or self.items[key].get("ttl", expired_before) < expired_before
+            ]
+        return items, last_key, 0
+
+    def query_keys(self, index_name, attribute, value):
+        with self._lock:
+            return [key for key, item in self.items.items() if item.get(attribute) == value]
+
+    async def aquery_keys(self, index_name, attribute, value):
+        return self.query_keys(index_name, attribute, value)
+
+
+ENGINES = {
+    "resource": ResourceEngine,
+    "client": ClientEngine,
+    "memory": InMemoryEngine,
+}
@@ -0,0 +1,135 @@
+"""
+Lazy decoding of session payloads.
+
+With the ``index`` storage layout, the stored payload is an index of the
+session's top-level values, each serialized on its own. ``LazySessionDict``
+only deserializes the values that are actually accessed: a request reading
+``_auth_user_id`` doesn't pay for a large cart or wizard state, and values it
+never touched are written back as they were read, without being serialized
+again.
+"""
+
+import struct
+from collections.abc import MutableMapping
+
+# Serializers output JSON or pickle data, neither of which can start with a
+# NUL byte, so index payloads are told apart from whole serialized sessions.
+INDEX_MAGIC = b"\x00dsi"
+# Lengths of an entry's name and serialized value.
+ENTRY_HEADER = struct.Struct(">HI")
+
+
+def is_index(serialized):
+    return serialized[: len(INDEX_MAGIC)] == INDEX_MAGIC
+
+
+def pack_index(entries):
+    """
+    Builds an index payload out of serialized values. Entries are sorted by
+    name, so the same session always gives the same payload.
+
+    :param dict entries: The serialized value (bytes) of each name.
+    :rtype: bytes
+    """
+    parts = [INDEX_MAGIC]
+    for name in sorted(entries):
+        encoded_name = name.encode()
+        value = entries[name]
+        parts.append(ENTRY_HEADER.pack(len(encoded_name), len(value)))
+        parts.append(encoded_name)
+        parts.append(value)
+    return b"".join(parts)
+
+
+def unpack_index(serialized):
+    """
+    Splits an index payload, without deserializing its values.
+
+    :returns: The serialized value (bytes) of each name.
+    :raises: ``ValueError`` if the payload is truncated.
+    """
+    entries = {}
+    offset = len(INDEX_MAGIC)
+    while offset < len(serialized):
+        try:
+            name_length, value_length = ENTRY_HEADER.unpack_from(serialized, offset)
+        except struct.error as e:
+            raise ValueError("Truncated session index.") from e
+        offset += ENTRY_HEADER.size
+        end = offset + name_length + value_length
+        if end > len(serialized):
+            raise ValueError("Truncated session index.")
+        name = serialized[offset : offset + name_length].decode()
+        entries[name] = serialized[offset + name_length : end]
+        offset = end
+    return entries
+
+
+class LazySessionDict(MutableMapping):
+    """
+    Session data deserializing each top-level value on first access.
+
+    :param dict serialized: The serialized value (bytes) of each name.
+    :param serializer: Serializer instance the values were dumped with.
+    :param dict values: Values already deserialized (or set).
+    """
+
+    def __init__(self, serialized, serializer, values=None):
+        self._serialized = dict(serialized)
+        self._serializer = serializer
+        self._values = dict(values or {})
+
+    def __getitem__(self, key):
+        if key in self._serialized:
+            self._values[key] = self._serializer.loads(self._serialized.pop(key))
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._serialized.pop(key, None)
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if key in self._serialized:
+            del self._serialized[key]
+        else:
+            del self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values or key in self._serialized
+
+    def __iter__(self):
+        yield from list(self._values)
+        yield from list(self._serialized)
+
+    def __len__(self):
+        return len(self._values) + len(self._serialized)
+
+    def __repr__(self):
+        return "<%s: %d decoded, %d pending>" % (
+            type(self).__name__,
+            len(self._values),
+            len(self._serialized),
+        )
+
+    def __reduce__(self):
+        # Cached copies stay lazy.
+        return type(self), (self._serialized, self._serializer, self._values)
+
+    @property
+    def pending(self):
+        """
+        Names of the values which haven't been deserialized.
+        """
+        return set(self._serialized)
+
+    def serialized_items(self):
+        """
+        :returns: The serialized value of each name. Values which were never
+            accessed are passed through as read; the others, which may have
+            been modified in place, are serialized again.
+        """
+        entries = {
+            name: self._serializer.dumps(value) for name, value in self._values.items()
+        }
+        entries.update(self._serialized)
+        return entries
@@ -0,0 +1,137 @@
+import json
+
+from django.core.management import BaseCommand
+
+from dynamodb_sessions.benchmark import (
+    BACKENDS,
+    MODES,
+    Benchmark,
+    compare,
+    scenarios,
+)
+from dynamodb_sessions.codec import COMPRESSION_HEADERS
+from dynamodb_sessions.engines import ENGINES
+
+
+class Command(BaseCommand):
+    help = "measures the throughput and latency of session store operations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            default=list(BACKENDS),
+            choices=list(BACKENDS),
+            help="Session backends to benchmark",
+        )
+        parser.add_argument(
+            "--engines",
+            nargs="+",
+            default=[None],
+            choices=sorted(ENGINES),
+            help="Engines to benchmark; 'memory' needs no table. "
+            "Defaults to the configured engine",
+        )
+        parser.add_argument(
+            "--codecs",
+            nargs="+",
+            default=["zlib"],
+            choices=list(COMPRESSION_HEADERS),
+            help="Payload compressions to benchmark",
+        )
+        parser.add_argument(
+            "--payload-sizes",
+            nargs="+",
+            default=[256, 4096, 65536],
+            type=int,
+            help="Approximate serialized session sizes, in bytes",
+        )
+        parser.add_argument(
+            "--concurrency",
+            nargs="+",
+            default=[1, 8],
+            type=int,
+            help="Numbers of concurrent threads or tasks",
+        )
+        parser.add_argument(
+            "--modes",
+            nargs="+",
+            default=["threads"],
+            choices=MODES,
+            help="Run the sync API from threads, or the async API from tasks",
+        )
+        parser.add_argument(
+            "--iterations",
+            "-n",
+            default=200,
+            type=int,
+            help="Number of times each operation runs per scenario",
+        )
+        parser.add_argument(
+            "--seed", default=0, type=int, help="Seed of the generated payloads"
+        )
+        parser.add_argument(
+            "--output", "-o", default=None, help="File to write the JSON results to"
+        )
+        parser.add_argument(
+            "--compare",
+            default=None,
+            help="JSON results of a previous run to compare against",
+        )
+
+    def handle(self, *args, **options):
+        benchmark = Benchmark(iterations=options["iterations"], seed=options["seed"])
+        report = benchmark.run(
+            scenarios(
+                options["backends"],
+                options["engines"],
+                options["codecs"],
+                options["payload_sizes"],
+                options["concurrency"],
+                options["modes"],
+            )
+        )
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            self.stdout.write("%-60s %12s %12s" % ("scenario", "throughput", "p99"))
+            for result, previous in compare(baseline, report):
+                self.stdout.write(
+                    "%-60s %+11.1f%% %+11.1f%%"
+                    % (
+                        self._label(result),
+                        _change(previous["throughput"], result["throughput"]),
+                        _change(previous["p99_ms"], result["p99_ms"]),
+                    )
+                )
+        else:
+            self.stdout.write(
+                "%-60s %10s %9s %9s %9s"
+                % ("scenario", "ops/s", "p50 ms", "p95 ms", "p99 ms")
+            )
+            for result in report["results"]:
+                self.stdout.write(
+                    "%-60s %10.1f %9.3f %9.3f %9.3f"
+                    % (
+                        self._label(result),
+                        result["throughput"],
+                        result["p50_ms"],
+                        result["p95_ms"],
+                        result["p99_ms"],
+                    )
+                )
+
+    @staticmethod
+    def _label(result):
+        return (
+            "{backend}/{engine}/{codec}/{payload_size}B/{mode}x{concurrency} "
+            "{operation}".format(**result)
+        )
+
+
+def _change(previous, current):
+    return 100.0 * (current - previous) / previous if previous else 0.0
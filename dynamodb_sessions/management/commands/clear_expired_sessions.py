@@ -0,0 +1,55 @@
+import time
+
+from django.core.management import BaseCommand
+
+from dynamodb_sessions.backends.dynamodb import (
+    CLEAR_EXPIRED_MAX_CAPACITY,
+    CLEAR_EXPIRED_SEGMENTS,
+    session_engine,
+)
+from dynamodb_sessions.cleanup import ExpiredSessionCleaner
+
+
+class Command(BaseCommand):
+    help = "deletes expired sessions DynamoDB's TTL hasn't removed yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--segments",
+            "-s",
+            default=CLEAR_EXPIRED_SEGMENTS,
+            type=int,
+            dest="segments",
+            help="Number of parallel scan segments",
+        )
+        parser.add_argument(
+            "--max-capacity",
+            "-c",
+            default=CLEAR_EXPIRED_MAX_CAPACITY,
+            type=float,
+            dest="max_capacity",
+            help="Capacity units per second the cleanup may consume",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            dest="checkpoint",
+            help="File recording progress; rerun with it to resume",
+        )
+        parser.add_argument(
+            "--grace",
+            default=0,
+            type=int,
+            dest="grace",
+            help="Only delete sessions expired for at least this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        cleaner = ExpiredSessionCleaner(
+            session_engine,
+            segments=options["segments"],
+            max_capacity=options["max_capacity"],
+            checkpoint=options["checkpoint"],
+        )
+        deleted = cleaner.run(expired_before=int(time.time()) - options["grace"])
+        self.stdout.write("{0} expired sessions deleted".format(deleted))
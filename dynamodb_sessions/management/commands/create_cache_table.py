@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from dynamodb_sessions.backends.dynamodb import dynamodb_connection_factory
+from dynamodb_sessions.cache import DynamoDBCache
+from dynamodb_sessions.management.commands import create_session_table
+
+
+class Command(create_session_table.Command):
+    help = "creates the tables of the DynamoDBCache caches if they do not exist"
+
+    def handle(self, *args, **options):
+        connection = dynamodb_connection_factory(low_level=True)
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if isinstance(cache, DynamoDBCache):
+                self.create_table(
+                    connection, cache.engine.table_name, options, user_index=None
+                )
@@ -8,8 +8,12 @@ from django.core.management import BaseCommand, CommandError, call_command
 from dynamodb_sessions.backends.dynamodb import (
     READ_CAPACITY_UNITS,
     TABLE_NAME,
+    TABLE_ROTATION,
+    USER_ID_ATTRIBUTE,
+    USER_INDEX,
     WRITE_CAPACITY_UNITS,
     dynamodb_connection_factory,
+    session_engine,
 )
 
 
@@ -50,9 +54,24 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         connection = dynamodb_connection_factory(low_level=True)
+        self.create_table(connection, TABLE_NAME, options)
+        if TABLE_ROTATION:
+            # The current bucket's table, and the next one's ahead of time:
+            # run the command again at least once per bucket. They're
+            # dropped once expired, so never protected from deletion.
+            bucket = session_engine.bucket()
+            for table_name in (
+                session_engine.table_name(bucket),
+                session_engine.table_name(bucket + 1),
+            ):
+                self.create_table(
+                    connection, table_name, dict(options, no_protection=True)
+                )
+
+    def create_table(self, connection, table_name, options, user_index=USER_INDEX):
         # check session table exists
         try:
-            connection.describe_table(TableName=TABLE_NAME)
+            connection.describe_table(TableName=table_name)
             if not options.get("ignore_logs"):
                 self.stdout.write("session table already exist\n")
             return
@@ -63,7 +82,7 @@ class Command(BaseCommand):
                 raise e
 
         table_args = dict(
-            TableName=TABLE_NAME,
+            TableName=table_name,
             AttributeDefinitions=[
                 {"AttributeName": "session_key", "AttributeType": "S"}
             ],
@@ -72,23 +91,42 @@ class Command(BaseCommand):
             DeletionProtectionEnabled=not options.get("no_protection"),
         )
 
+        if user_index:
+            # Sparse index of authenticated sessions, by user ID.
+            table_args["AttributeDefinitions"].append(
+                {"AttributeName": USER_ID_ATTRIBUTE, "AttributeType": "S"}
+            )
+            table_args["GlobalSecondaryIndexes"] = [
+                {
+                    "IndexName": user_index,
+                    "KeySchema": [
+                        {"AttributeName": USER_ID_ATTRIBUTE, "KeyType": "HASH"}
+                    ],
+                    "Projection": {"ProjectionType": "KEYS_ONLY"},
+                }
+            ]
+
         if options.get("no_pay_per_request"):
             table_args["BillingMode"] = "PROVISIONED"
             table_args["ProvisionedThroughput"] = {
                 "ReadCapacityUnits": READ_CAPACITY_UNITS,
                 "WriteCapacityUnits": WRITE_CAPACITY_UNITS,
             }
+            for index in table_args.get("GlobalSecondaryIndexes", ()):
+                index["ProvisionedThroughput"] = table_args["ProvisionedThroughput"]
 
-        if not settings.USE_LOCAL_DYNAMODB_SERVER:
-            # Enable TTL on the specified attribute
+        connection.create_table(**table_args)
+        connection.get_waiter("table_exists").wait(TableName=table_name)
+
+        if not getattr(settings, "USE_LOCAL_DYNAMODB_SERVER", False):
+            # Enable TTL on the specified attribute, once the table exists.
             connection.update_time_to_live(
-                TableName=TABLE_NAME,
+                TableName=table_name,
                 TimeToLiveSpecification={
                     "Enabled": True,
-                    "AttributeName": settings.DYNAMODB_TTL_ATTR,
+                    "AttributeName": getattr(
+                        settings, "DYNAMODB_TTL_ATTR", options.get("ttl_field", "ttl")
+                    ),
                 },
             )
-
-        connection.create_table(**table_args)
-        connection.get_waiter("table_exists").wait(TableName=TABLE_NAME)
-        logger.info(f"Table {TABLE_NAME} created successfully.")
+        logger.info(f"Table {table_name} created successfully.")
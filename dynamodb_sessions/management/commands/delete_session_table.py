@@ -1,9 +1,14 @@
 from ast import Del
 
 from botocore.exceptions import ClientError
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
-from dynamodb_sessions.backends.dynamodb import TABLE_NAME, dynamodb_connection_factory
+from dynamodb_sessions.backends.dynamodb import (
+    TABLE_NAME,
+    TABLE_ROTATION,
+    dynamodb_connection_factory,
+    session_engine,
+)
 
 
 class Command(BaseCommand):
@@ -27,11 +32,55 @@ class Command(BaseCommand):
             dest="force",
             help="Remove deletion protection and delete table",
         )
+        parser.add_argument(
+            "--expired",
+            default=False,
+            action="store_true",
+            dest="expired",
+            help="Only delete the rotated tables whose sessions have all expired",
+        )
 
     def handle(self, *args, **options):
         connection = dynamodb_connection_factory(low_level=True)
+        if options.get("expired"):
+            if not TABLE_ROTATION:
+                raise CommandError("DYNAMODB_SESSIONS_TABLE_ROTATION isn't set.")
+            table_names = self.rotated_tables(
+                connection, before=session_engine.oldest_bucket()
+            )
+            # Expired tables are meant to be dropped: lift the deletion
+            # protection of those created with it.
+            options = dict(options, force=True)
+        else:
+            table_names = [TABLE_NAME] + self.rotated_tables(connection)
+        failed = []
+        for table_name in table_names:
+            try:
+                self.delete_table(connection, table_name, options)
+            except CommandError as e:
+                self.stderr.write(str(e))
+                failed.append(table_name)
+        if failed:
+            raise CommandError("Couldn't delete: {0}".format(", ".join(failed)))
+
+    def rotated_tables(self, connection, before=None):
+        """
+        :returns: The names of the rotated session tables, of the buckets
+            older than ``before`` if given.
+        """
+        if not TABLE_ROTATION:
+            return []
+        table_names = []
+        for page in connection.get_paginator("list_tables").paginate():
+            for table_name in page["TableNames"]:
+                bucket = session_engine.bucket_of_table(table_name)
+                if bucket is not None and (before is None or bucket < before):
+                    table_names.append(table_name)
+        return table_names
+
+    def delete_table(self, connection, table_name, options):
         # check table exists
-        if not connection.describe_table(TableName=TABLE_NAME):
+        if not connection.describe_table(TableName=table_name):
             if not options.get("ignore_logs"):
                 self.stdout.write("session table does not exist\n")
             return
@@ -39,15 +88,16 @@ class Command(BaseCommand):
         try:
             if options.get("force"):
                 connection.update_table(
-                    TableName=TABLE_NAME, DeletionProtectionEnabled=False
+                    TableName=table_name, DeletionProtectionEnabled=False
                 )
 
-            connection.delete_table(TableName=TABLE_NAME)
+            connection.delete_table(TableName=table_name)
         except ClientError as e:
             if e.response["Error"]["Code"] == "ValidationException":
-                if not options.get("ignore_logs"):
-                    self.stdout.write("Deletion protection is active\n")
-                    exit(-1)
+                raise CommandError(
+                    "Deletion protection is active on {0}".format(table_name)
+                ) from e
+            raise CommandError("Couldn't delete {0}: {1}".format(table_name, e)) from e
 
         if not options.get("ignore_logs"):
-            self.stdout.write("{0} dynamodb table deleted".format(TABLE_NAME))
+            self.stdout.write("{0} dynamodb table deleted".format(table_name))
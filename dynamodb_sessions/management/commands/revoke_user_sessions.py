@@ -0,0 +1,33 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from dynamodb_sessions.backends.dynamodb import SessionStore
+
+
+class Command(BaseCommand):
+    help = "deletes every session of the given users (logs them out everywhere)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_ids", nargs="+", help="IDs of the users")
+
+    def handle(self, *args, **options):
+        # The configured store also invalidates its cache, if it has one.
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not issubclass(store, SessionStore):
+            store = SessionStore
+        failed_users = []
+        for user_id in options["user_ids"]:
+            revoked, failed = store.revoke_user_sessions(user_id)
+            self.stdout.write(
+                "{0} sessions of user {1} revoked".format(len(revoked), user_id)
+            )
+            if failed:
+                failed_users.append(user_id)
+        if failed_users:
+            raise CommandError(
+                "Some sessions of users {0} could not be deleted, try again.".format(
+                    ", ".join(failed_users)
+                )
+            )
@@ -0,0 +1,85 @@
+import random
+
+from django.core.management import BaseCommand, CommandError
+
+from dynamodb_sessions.backends.dynamodb import (
+    TABLE_NAME,
+    dynamodb_connection_factory,
+    session_codec,
+)
+from dynamodb_sessions.codec import zstandard
+
+
+class Command(BaseCommand):
+    help = "trains a zstd compression dictionary from stored sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path the dictionary is written to")
+        parser.add_argument(
+            "--samples",
+            "-s",
+            default=2000,
+            type=int,
+            dest="samples",
+            help="Number of sessions to sample",
+        )
+        parser.add_argument(
+            "--size",
+            default=16 * 1024,
+            type=int,
+            dest="size",
+            help="Dictionary size in bytes",
+        )
+        parser.add_argument(
+            "--segments",
+            default=16,
+            type=int,
+            dest="segments",
+            help="Scan segments; sampling starts in a random one",
+        )
+
+    def handle(self, *args, **options):
+        if zstandard is None:
+            raise CommandError("Training a dictionary requires zstandard.")
+
+        samples = self.sample(options["samples"], options["segments"])
+        if not samples:
+            raise CommandError("No sessions to sample in {0}".format(TABLE_NAME))
+
+        try:
+            dictionary = zstandard.train_dictionary(options["size"], samples)
+        except zstandard.ZstdError as e:
+            raise CommandError("Could not train dictionary: {0}".format(e))
+
+        with open(options["output"], "wb") as f:
+            f.write(dictionary.as_bytes())
+        self.stdout.write(
+            "dictionary {0} trained from {1} sessions written to {2}".format(
+                dictionary.dict_id(), len(samples), options["output"]
+            )
+        )
+
+    def sample(self, count, segments):
+        """
+        Returns the serialized payloads of up to ``count`` sessions, walking
+        the scan segments from a random one so repeated trainings don't
+        always see the same sessions.
+        """
+        paginator = dynamodb_connection_factory(low_level=True).get_paginator("scan")
+        first = random.randrange(segments)
+        samples = []
+        for offset in range(segments):
+            pages = paginator.paginate(
+                TableName=TABLE_NAME,
+                Segment=(first + offset) % segments,
+                TotalSegments=segments,
+                ProjectionExpression="#data",
+                ExpressionAttributeNames={"#data": "data"},
+            )
+            for page in pages:
+                for item in page["Items"]:
+                    if "data" in item:
+                        samples.append(session_codec.decompress(item["data"]["B"]))
+                    if len(samples) >= count:
+                        return samples
+        return samples
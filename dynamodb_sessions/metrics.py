@@ -0,0 +1,152 @@
+"""
+Metrics hooks recording what the session store costs.
+
+The session store reports through a ``Metrics`` instance, chosen with the
+``DYNAMODB_SESSIONS_METRICS`` setting. The base class discards everything;
+``InMemoryMetrics`` aggregates counters and histograms in the process, and
+renders them in the Prometheus text format.
+"""
+
+import bisect
+import threading
+
+# Histogram of DynamoDB call durations, in seconds, by ``operation``.
+REQUEST_SECONDS = "dynamodb_sessions_request_seconds"
+# Counter of botocore retries, by ``operation``.
+RETRIES = "dynamodb_sessions_retries_total"
+# Counter of capacity units consumed, by ``operation``.
+CONSUMED_CAPACITY = "dynamodb_sessions_consumed_capacity_units_total"
+# Histogram of payload sizes, in bytes, by ``stage`` (``serialized`` or
+# ``compressed``).
+PAYLOAD_BYTES = "dynamodb_sessions_payload_bytes"
+# Counter of cache lookups of the ``cached_dynamodb`` backend, by ``cache``
+# (``local`` or ``shared``) and ``result`` (``hit`` or ``miss``).
+CACHE_REQUESTS = "dynamodb_sessions_cache_requests_total"
+
+LATENCY_BUCKETS = (0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = tuple(2**exponent for exponent in range(6, 23, 2))
+
+BUCKETS = {
+    REQUEST_SECONDS: LATENCY_BUCKETS,
+    PAYLOAD_BYTES: SIZE_BUCKETS,
+}
+
+
+class Metrics:
+    """
+    Interface of the metrics hooks. Every method is a no-op, so subclasses
+    only implement what they forward.
+    """
+
+    def increment(self, name, value=1, **labels):
+        """
+        Adds ``value`` to the counter ``name``.
+        """
+
+    def observe(self, name, value, **labels):
+        """
+        Records ``value`` in the histogram ``name``.
+        """
+
+
+class InMemoryMetrics(Metrics):
+    """
+    Thread-safe, per-process counters and histograms.
+
+    :param dict buckets: Upper bounds of the histogram buckets, by metric
+        name, overriding ``BUCKETS``. Values above the last bound only count
+        towards ``+Inf``.
+    """
+
+    def __init__(self, buckets=None):
+        self.buckets = dict(BUCKETS, **(buckets or {}))
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        bounds = self.buckets.get(name, LATENCY_BUCKETS)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (the last one is +Inf), sum and count.
+                histogram = self._histograms[key] = [[0] * (len(bounds) + 1), 0, 0]
+            histogram[0][bisect.bisect_left(bounds, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def counter(self, name, **labels):
+        """
+        Returns the value of a counter.
+        """
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        """
+        Returns a histogram as ``(buckets, sum, count)``, ``buckets`` being
+        ``(upper_bound, cumulative_count)`` pairs ending with ``+Inf``.
+        """
+        bounds = self.buckets.get(name, LATENCY_BUCKETS)
+        with self._lock:
+            histogram = self._histograms.get(self._key(name, labels))
+            if histogram is None:
+                counts, total, count = [0] * (len(bounds) + 1), 0, 0
+            else:
+                counts, total, count = list(histogram[0]), histogram[1], histogram[2]
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip(bounds + (float("inf"),), counts):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        return buckets, total, count
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms)
+        lines = []
+        for (name, labels), value in counters:
+            _type_line(lines, name, "counter")
+            lines.append("%s%s %s" % (name, _format_labels(labels), value))
+        for name, labels in histograms:
+            _type_line(lines, name, "histogram")
+            buckets, total, count = self.histogram(name, **dict(labels))
+            for bound, cumulative in buckets:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    "%s_bucket%s %d"
+                    % (name, _format_labels(labels + (("le", le),)), cumulative)
+                )
+            lines.append("%s_sum%s %s" % (name, _format_labels(labels), total))
+            lines.append("%s_count%s %d" % (name, _format_labels(labels), count))
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _type_line(lines, name, type_):
+    line = "# TYPE %s %s" % (name, type_)
+    if line not in lines:
+        lines.append(line)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, value) for name, value in labels)
@@ -0,0 +1,56 @@
+"""
+Middleware echoing session versions to the browser.
+
+With the ``adaptive`` read consistency, a process only remembers the writes
+it made itself. ``SessionMiddleware`` also sends the version of the last
+write in a short-lived signed cookie, so the next request reads the session
+consistently whichever process serves it.
+"""
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware as BaseMiddleware
+
+from dynamodb_sessions.backends.dynamodb import (
+    CONSISTENCY_WINDOW,
+    VERSION_COOKIE_NAME,
+)
+
+VERSION_COOKIE_SALT = "dynamodb_sessions.version"
+
+
+class SessionMiddleware(BaseMiddleware):
+    """
+    Replaces ``django.contrib.sessions.middleware.SessionMiddleware``.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        value = request.get_signed_cookie(
+            VERSION_COOKIE_NAME,
+            default=None,
+            salt=VERSION_COOKIE_SALT,
+            max_age=CONSISTENCY_WINDOW,
+        )
+        if value is not None and hasattr(request.session, "expected_version"):
+            try:
+                request.session.expected_version = int(value)
+            except ValueError:
+                pass
+
+    def process_response(self, request, response):
+        # The session is saved by the parent class.
+        response = super().process_response(request, response)
+        version = getattr(getattr(request, "session", None), "written_version", None)
+        if version is not None:
+            response.set_signed_cookie(
+                VERSION_COOKIE_NAME,
+                str(version),
+                salt=VERSION_COOKIE_SALT,
+                max_age=CONSISTENCY_WINDOW,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
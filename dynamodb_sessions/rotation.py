@@ -0,0 +1,248 @@
+"""
+Time-bucketed rotation of session tables.
+
+Time is divided in buckets of a fixed period (e.g. a week), each with its
+own table named after the session table, e.g. ``sessions-2911``. New session
+keys start with their bucket, in base 36, so every call goes straight to the
+right table. Sessions are only ever written to the current bucket's table:
+a session saved after its bucket ended moves to a new key. Once every
+session written during a bucket is past ``SESSION_COOKIE_AGE``, its whole
+table is dropped, with a single ``DeleteTable`` instead of an item deletion
+per session.
+
+Keys which don't belong to a live bucket, such as those of sessions created
+before the rotation was enabled, go to the session table itself.
+"""
+
+import threading
+import time
+
+from dynamodb_sessions.engines import BATCH_MAX_ATTEMPTS
+
+# Length of the bucket prefix of session keys. 5 base 36 digits are enough
+# for periods of a minute or more.
+BUCKET_PREFIX_LENGTH = 5
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def to_base36(number):
+    digits = []
+    while True:
+        number, digit = divmod(number, 36)
+        digits.append(DIGITS[digit])
+        if not number:
+            return "".join(reversed(digits))
+
+
+class RotatingEngine:
+    """
+    Engine routing calls to the table of each session key's bucket.
+
+    :param engine: Engine of the session table, holding the sessions that
+        don't belong to a live bucket. The buckets' engines are built from it.
+    :param int period: Length of the buckets, in seconds.
+    :param int max_age: Age, in seconds, past which every session has
+        expired (``SESSION_COOKIE_AGE``).
+    """
+
+    def __init__(self, engine, period, max_age, clock=time.time):
+        self.engine = engine
+        self.period = period
+        self.max_age = max_age
+        self._clock = clock
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Scans and everything else go to the session table.
+        if name == "engine":
+            raise AttributeError(name)
+        return getattr(self.engine, name)
+
+    def bucket(self, timestamp=None):
+        if timestamp is None:
+            timestamp = self._clock()
+        return int(timestamp // self.period)
+
+    def oldest_bucket(self):
+        """
+        :returns: The oldest bucket which may still hold unexpired sessions.
+        """
+        return self.bucket(self._clock() - self.max_age)
+
+    def live_buckets(self):
+        return range(self.oldest_bucket(), self.bucket() + 1)
+
+    def table_name(self, bucket):
+        return "%s-%d" % (self.engine.table_name, bucket)
+
+    def bucket_of_table(self, table_name):
+        """
+        :returns: The bucket of a rotated table, or ``None`` if
+            ``table_name`` isn't one.
+        """
+        prefix, _, bucket = table_name.rpartition("-")
+        if prefix != self.engine.table_name or not bucket.isdigit():
+            return None
+        return int(bucket)
+
+    def key_prefix(self):
+        """
+        :returns: The prefix of the keys of new sessions.
+        """
+        return to_base36(self.bucket()).rjust(BUCKET_PREFIX_LENGTH, "0")
+
+    @staticmethod
+    def key_bucket(key):
+        try:
+            return int(key[:BUCKET_PREFIX_LENGTH], 36)
+        except ValueError:
+            return None
+
+    def is_current(self, key):
+        """
+        Whether ``key`` belongs to the current bucket. Keys of the next one,
+        made by a server whose clock is ahead, are current too.
+        """
+        bucket = self.key_bucket(key)
+        current = self.bucket()
+        return bucket is not None and current <= bucket <= current + 1
+
+    def bucket_engine(self, bucket):
+        engine = self._engines.get(bucket)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(bucket)
+                if engine is None:
+                    engine = self.engine.for_table(self.table_name(bucket))
+                    # Engines of dropped tables aren't kept.
+                    oldest = self.oldest_bucket()
+                    self._engines = {
+                        live: live_engine
+                        for live, live_engine in self._engines.items()
+                        if live >= oldest
+                    }
+                    self._engines[bucket] = engine
+        return engine
+
+    def engine_for(self, key):
+        """
+        :returns: The engine of the table ``key`` is stored in. Chunk keys
+            start with their session's key, and are stored along with it.
+        """
+        bucket = self.key_bucket(key)
+        if bucket is None or not self.oldest_bucket() <= bucket <= self.bucket() + 1:
+            return self.engine
+        return self.bucket_engine(bucket)
+
+    def _by_engine(self, keys, key=lambda value: value):
+        groups = {}
+        for value in keys:
+            engine = self.engine_for(key(value))
+            groups.setdefault(id(engine), (engine, []))[1].append(value)
+        return groups.values()
+
+    def _write_groups(self, put_items, delete_keys):
+        groups = {}
+        for engine, items in self._by_engine(
+            put_items, key=lambda item: item[self.engine.hash_key]
+        ):
+            groups[id(engine)] = (engine, items, [])
+        for engine, keys in self._by_engine(delete_keys):
+            groups.setdefault(id(engine), (engine, [], []))[2].extend(keys)
+        return groups.values()
+
+    def _live_engines(self):
+        return [self.engine] + [
+            self.bucket_engine(bucket) for bucket in self.live_buckets()
+        ]
+
+    def get_item(self, key, consistent_read=True, attributes=None):
+        return self.engine_for(key).get_item(key, consistent_read, attributes)
+
+    def update_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        return self.engine_for(key).update_item(
+            key, set_values, remove, condition, condition_values
+        )
+
+    def increment(self, key, attribute, delta, now):
+        return self.engine_for(key).increment(key, attribute, delta, now)
+
+    def delete_item(self, key, return_old=False):
+        return self.engine_for(key).delete_item(key, return_old)
+
+    async def aget_item(self, key, consistent_read=True, attributes=None):
+        return await self.engine_for(key).aget_item(key, consistent_read, attributes)
+
+    async def aupdate_item(
+        self, key, set_values=None, remove=(), condition=None, condition_values=None
+    ):
+        return await self.engine_for(key).aupdate_item(
+            key, set_values, remove, condition, condition_values
+        )
+
+    async def aincrement(self, key, attribute, delta, now):
+        return await self.engine_for(key).aincrement(key, attribute, delta, now)
+
+    async def adelete_item(self, key, return_old=False):
+        return await self.engine_for(key).adelete_item(key, return_old)
+
+    def batch_write(self, put_items=(), delete_keys=(), max_attempts=BATCH_MAX_ATTEMPTS):
+        unprocessed = []
+        for engine, items, keys in self._write_groups(put_items, delete_keys):
+            unprocessed.extend(engine.batch_write(items, keys, max_attempts))
+        return unprocessed
+
+    async def abatch_write(
+        self, put_items=(), delete_keys=(), max_attempts=BATCH_MAX_ATTEMPTS
+    ):
+        unprocessed = []
+        for engine, items, keys in self._write_groups(put_items, delete_keys):
+            unprocessed.extend(await engine.abatch_write(items, keys, max_attempts))
+        return unprocessed
+
+    def batch_get(
+        self,
+        keys,
+        consistent_read=True,
+        attributes=None,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+    ):
+        items = {}
+        for engine, group in self._by_engine(keys):
+            items.update(
+                engine.batch_get(group, consistent_read, attributes, max_attempts)
+            )
+        return items
+
+    async def abatch_get(
+        self,
+        keys,
+        consistent_read=True,
+        attributes=None,
+        max_attempts=BATCH_MAX_ATTEMPTS,
+    ):
+        items = {}
+        for engine, group in self._by_engine(keys):
+            items.update(
+                await engine.abatch_get(
+                    group, consistent_read, attributes, max_attempts
+                )
+            )
+        return items
+
+    def query_keys(self, index_name, attribute, value):
+        return [
+            key
+            for engine in self._live_engines()
+            for key in engine.query_keys(index_name, attribute, value)
+        ]
+
+    async def aquery_keys(self, index_name, attribute, value):
+        keys = []
+        for engine in self._live_engines():
+            keys.extend(await engine.aquery_keys(index_name, attribute, value))
+        return keys
@@ -0,0 +1,217 @@
+"""
+Routing of session reads across the replicas of a global table.
+
+``RoutingEngine`` wraps one engine per endpoint (region). Writes, strongly
+consistent reads (only consistent in the region written to), batch calls,
+scans and queries go to the home endpoint. Eventually consistent reads go
+to the endpoint with the lowest measured latency and, when it hasn't
+answered within a percentile of its recent latencies, a hedged duplicate is
+sent to the next fastest endpoint: whichever answers first wins.
+"""
+
+import asyncio
+import copy
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Weight of a new measurement in an endpoint's average latency.
+SMOOTHING = 0.2
+# A failed call counts as this slow, in seconds, moving the endpoint last.
+FAILURE_LATENCY = 1.0
+# Hedge delay used until an endpoint has this many measurements.
+MIN_SAMPLES = 10
+DEFAULT_HEDGE_DELAY = 0.05
+
+
+class EndpointStats:
+    """
+    Thread-safe latency measurements of one endpoint.
+
+    :param int window_size: Number of recent latencies the percentiles are
+        computed from.
+    """
+
+    def __init__(self, window_size=100):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window_size)
+        # Unmeasured endpoints look fastest, so each one gets measured.
+        self.latency = 0.0
+
+    def record(self, seconds, failed=False):
+        if failed:
+            seconds = max(seconds, FAILURE_LATENCY)
+        with self._lock:
+            self._samples.append(seconds)
+            if len(self._samples) == 1:
+                self.latency = seconds
+            else:
+                self.latency += SMOOTHING * (seconds - self.latency)
+
+    def percentile(self, fraction, default=None):
+        """
+        :returns: The ``fraction`` percentile of the recent latencies, or
+            ``default`` until there are ``MIN_SAMPLES`` of them.
+        """
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return default
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class RoutingEngine:
+    """
+    Engine routing calls to the engines of several endpoints.
+
+    :param engines: Engines of every endpoint, e.g. ``ClientEngine``
+        instances built with connection managers of different regions.
+    :param int home: Index of the home endpoint in ``engines``.
+    :param float hedge_percentile: Percentile of the fastest endpoint's
+        latencies after which a hedged read is sent. ``None`` disables
+        hedging.
+    :param int max_workers: Threads running hedged blocking reads.
+    """
+
+    def __init__(self, engines, home=0, hedge_percentile=0.95, max_workers=10):
+        self.engines = list(engines)
+        self.home = self.engines[home]
+        self.stats = [EndpointStats() for _ in self.engines]
+        self.hedge_percentile = hedge_percentile
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+
+    def __getattr__(self, name):
+        # Everything but eventually consistent reads goes to the home
+        # endpoint: writes, batch calls, scans and queries.
+        if name == "home":
+            raise AttributeError(name)
+        return getattr(self.home, name)
+
+    def for_table(self, table_name):
+        """
+        :returns: A routing engine of the same endpoints, sharing their
+            latency measurements, working on ``table_name``.
+        """
+        engine = copy.copy(self)
+        engine.engines = [endpoint.for_table(table_name) for endpoint in self.engines]
+        engine.home = engine.engines[self.engines.index(self.home)]
+        return engine
+
+    def _ranked(self):
+        """
+        :returns: Indexes of the endpoints, fastest first.
+        """
+        return sorted(range(len(self.engines)), key=lambda i: self.stats[i].latency)
+
+    def _hedge_delay(self, index):
+        return self.stats[index].percentile(
+            self.hedge_percentile, DEFAULT_HEDGE_DELAY
+        )
+
+    def _pool(self):
+        # Threads don't survive a fork, the pool is rebuilt in the child.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="dynamodb-sessions-hedge",
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _measured(self, index, call, *args):
+        start_time = time.monotonic()
+        try:
+            result = call(*args)
+        except Exception:
+            self.stats[index].record(time.monotonic() - start_time, failed=True)
+            raise
+        self.stats[index].record(time.monotonic() - start_time)
+        return result
+
+    async def _ameasured(self, index, call, *args):
+        start_time = time.monotonic()
+        try:
+            result = await call(*args)
+        except asyncio.CancelledError:
+            # A hedged read that lost the race tells nothing.
+            raise
+        except Exception:
+            self.stats[index].record(time.monotonic() - start_time, failed=True)
+            raise
+        self.stats[index].record(time.monotonic() - start_time)
+        return result
+
+    def get_item(self, key, consistent_read=True, attributes=None):
+        if consistent_read:
+            return self.home.get_item(key, consistent_read, attributes)
+        ranked = self._ranked()
+        args = (key, consistent_read, attributes)
+        first = ranked[0]
+        if self.hedge_percentile is None or len(ranked) == 1:
+            return self._measured(first, self.engines[first].get_item, *args)
+
+        pool = self._pool()
+        primary = pool.submit(
+            self._measured, first, self.engines[first].get_item, *args
+        )
+        done, _ = wait([primary], timeout=self._hedge_delay(first))
+        if done and primary.exception() is None:
+            return primary.result()
+        # Too slow, or failed: the next fastest endpoint is asked too. The
+        # loser keeps running in the background, and is still measured.
+        second = ranked[1]
+        hedge = pool.submit(
+            self._measured, second, self.engines[second].get_item, *args
+        )
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+        raise primary.exception()
+
+    async def aget_item(self, key, consistent_read=True, attributes=None):
+        if consistent_read:
+            return await self.home.aget_item(key, consistent_read, attributes)
+        ranked = self._ranked()
+        args = (key, consistent_read, attributes)
+        first = ranked[0]
+        if self.hedge_percentile is None or len(ranked) == 1:
+            return await self._ameasured(first, self.engines[first].aget_item, *args)
+
+        primary = asyncio.ensure_future(
+            self._ameasured(first, self.engines[first].aget_item, *args)
+        )
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(
+                pending, timeout=self._hedge_delay(first)
+            )
+            if done and primary.exception() is None:
+                return primary.result()
+            second = ranked[1]
+            pending.add(
+                asyncio.ensure_future(
+                    self._ameasured(second, self.engines[second].aget_item, *args)
+                )
+            )
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            raise primary.exception()
+        finally:
+            # The loser is cancelled, rather than left running.
+            for task in pending:
+                task.cancel()
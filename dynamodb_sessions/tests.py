@@ -1,20 +1,88 @@
 # from django.contrib.sessions.tests import SessionTestsMixin
 import base64
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import zlib
 from datetime import timedelta
+from importlib import import_module
+from io import StringIO
 
 # from django.test.utils import override_script_prefix, patch_logger
 # from django.test.utils import override_script_prefix, patch_logger
-from unittest import skip
+from unittest import mock, skip, skipIf
 
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectTimeoutError
 from django.conf import settings
 from django.contrib.sessions.backends.base import UpdateError
 from django.core import management
-from django.test import TestCase, override_settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheKey
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.utils import timezone
-
-# from .backends.cached_dynamodb import SessionStore as CachedDynamoDBSession
-from .backends.dynamodb import TABLE_NAME, dynamodb_connection_factory
+from django.utils.crypto import get_random_string
+
+from .backends import cached_dynamodb, dynamodb
+from .backends.cached_dynamodb import SessionStore as CachedDynamoDBSession
+from .backends.dynamodb import (
+    HASH_ATTRIB_NAME,
+    TABLE_NAME,
+    VERSION_COOKIE_NAME,
+    connection_manager,
+    dynamodb_connection_factory,
+    session_engine,
+)
 from .backends.dynamodb import SessionStore as DynamoDBSession
+from .benchmark import OPERATIONS, Benchmark, compare, make_payload, percentile
+from .benchmark import scenarios as benchmark_scenarios
+from .chunks import chunk_keys
+from .circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    is_unavailable,
+)
+from .cleanup import DONE, ExpiredSessionCleaner
+from .codec import RAW, ZLIB, ZSTD_DICT, Codec, zstandard
+from .connection import (
+    AIOBOTOCORE_INSTALLED,
+    AsyncConnectionManager,
+    ConnectionManager,
+)
+from .engines import (
+    NO_VERSION,
+    NOT_EXISTS,
+    VERSION_IS,
+    ClientEngine,
+    InMemoryEngine,
+    compile_update,
+    deserialize,
+    serialize,
+)
+from .lazy import LazySessionDict, pack_index, unpack_index
+from .lru import LRUCache
+from .metrics import (
+    CACHE_REQUESTS,
+    CONSUMED_CAPACITY,
+    PAYLOAD_BYTES,
+    REQUEST_SECONDS,
+    InMemoryMetrics,
+    Metrics,
+)
+from .middleware import SessionMiddleware
+from .rotation import RotatingEngine, to_base36
+from .routing import RoutingEngine
+from .write_behind import DELETE, WriteBehindQueue
 
 
 #### Hack hack hack ########
@@ -387,17 +455,11 @@ class DynamoDBTestCase(SessionTestsMixin, TestCase):
             self._table = dynamodb_connection_factory().Table(TABLE_NAME)
         return self._table
 
-    @skip("until clear_expired method if implemented")
-    @override_settings(
-        SESSION_ENGINE="dynamodb_sessions.backends.dynamodb",
-        SESSION_COOKIE_AGE=0,
-    )
+    @override_settings(SESSION_ENGINE="dynamodb_sessions.backends.dynamodb")
     def test_clearsessions_command(self):
         """
         Test clearsessions command for clearing expired sessions.
         """
-        self.assertEqual(0, self.table(force_connection=True).item_count)
-
         # One object in the future
         self.session["foo"] = "bar"
         self.session.set_expiry(3600)
@@ -409,12 +471,175 @@ class DynamoDBTestCase(SessionTestsMixin, TestCase):
         other_session.set_expiry(-3600)
         other_session.save()
 
-        # Two sessions are in the database before clearsessions...
-        self.assertEqual(2, self.table(force_connection=True).item_count)
-        with override_settings(SESSION_ENGINE=self.session_engine):
-            management.call_command("clearsessions")
-        # ... and one is deleted.
-        self.assertEqual(1, self.table(force_connection=True).item_count)
+        management.call_command("clearsessions")
+        self.assertIs(self.session.exists(self.session.session_key), True)
+        self.assertIs(self.session.exists(other_session.session_key), False)
+
+    def test_clear_expired_resumes_from_checkpoint(self):
+        expired = self.backend()
+        expired.set_expiry(-3600)
+        expired.save()
+        with tempfile.TemporaryDirectory() as directory:
+            path = directory + "/checkpoint.json"
+            with open(path, "w") as f:
+                json.dump({"total_segments": 2, "positions": {"0": DONE}}, f)
+            cleaner = ExpiredSessionCleaner(session_engine, segments=2, checkpoint=path)
+            with mock.patch.object(
+                session_engine, "scan_page", wraps=session_engine.scan_page
+            ) as scan_page:
+                cleaner.run()
+            self.assertEqual({c[0][0] for c in scan_page.call_args_list}, {1})
+            self.assertFalse(os.path.exists(path))
+
+    def test_unchanged_session_is_not_rewritten(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session = self.backend(self.session.session_key)
+        self.assertEqual(session["foo"], "bar")
+        with mock.patch.object(
+            session.engine, "update_item", wraps=session.engine.update_item
+        ) as update_item:
+            session.save()
+            update_item.assert_not_called()
+            session["foo"] = "baz"
+            session.save()
+            update_item.assert_called_once()
+        self.assertEqual(self.backend(session.session_key)["foo"], "baz")
+
+    def test_unchanged_session_only_refreshes_ttl(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session = self.backend(self.session.session_key)
+        self.assertEqual(session["foo"], "bar")
+        # Pretend the stored TTL is old enough to be refreshed.
+        session._stored = session._stored[:2] + (0,)
+        with mock.patch.object(
+            session.engine, "update_item", wraps=session.engine.update_item
+        ) as update_item:
+            session.save()
+        self.assertEqual(list(update_item.call_args[0][1]), ["ttl"])
+
+    def test_exists_does_not_fetch_payload(self):
+        self.session["foo"] = "bar" * 100
+        self.session.save()
+        with mock.patch.object(
+            self.session.engine, "get_item", wraps=self.session.engine.get_item
+        ) as get_item:
+            self.assertIs(self.session.exists(self.session.session_key), True)
+        self.assertEqual(get_item.call_args[1]["attributes"], (HASH_ATTRIB_NAME,))
+
+    def test_malformed_keys_are_not_looked_up(self):
+        with mock.patch.object(self.session.engine, "get_item") as get_item:
+            self.assertIs(self.session.exists("not a session key"), False)
+            self.assertEqual(self.backend("x" * 40).load(), {})
+        get_item.assert_not_called()
+
+    @mock.patch.object(dynamodb, "missing_keys", LRUCache(10, 60))
+    def test_missing_keys_are_remembered(self):
+        session_key = self.session._get_new_session_key()
+        with mock.patch.object(
+            self.session.engine, "get_item", wraps=self.session.engine.get_item
+        ) as get_item:
+            self.assertIs(self.session.exists(session_key), False)
+            self.assertIs(self.session.exists(session_key), False)
+            self.assertEqual(self.backend(session_key).load(), {})
+        get_item.assert_called_once()
+
+    def test_expired_session_is_not_decoded(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        self.session.engine.update_item(session_key, {"ttl": int(time.time()) - 10})
+        with mock.patch.object(self.backend, "_decode_item") as decode_item:
+            self.assertEqual(self.backend(session_key).load(), {})
+            self.assertEqual(dict(self.backend.load_many([session_key])), {})
+        decode_item.assert_not_called()
+
+    def test_exists_many_ignores_expired(self):
+        self.session.save()
+        session_key = self.session.session_key
+        self.session.engine.update_item(session_key, {"ttl": int(time.time()) - 10})
+        self.assertEqual(
+            dict(self.backend.exists_many([session_key])), {session_key: False}
+        )
+
+    def test_expiry_in_seconds(self):
+        self.session["foo"] = "bar"
+        self.session.set_expiry(300)
+        self.session.save()
+        self.assertEqual(self.backend(self.session.session_key)["foo"], "bar")
+
+    @mock.patch.object(dynamodb, "BATCH_GET_SIZE", 10)
+    @mock.patch.object(dynamodb, "BATCH_WRITE_SIZE", 10)
+    def test_bulk_operations(self):
+        keys = []
+        for index in range(25):
+            session = self.backend()
+            session["index"] = index
+            session.save()
+            keys.append(session.session_key)
+        missing = self.session._get_new_session_key()
+
+        loaded = dict(self.backend.load_many(keys + [missing, "bogus"]))
+        self.assertEqual(
+            {key: data["index"] for key, data in loaded.items()},
+            {key: index for index, key in enumerate(keys)},
+        )
+        self.assertEqual(
+            dict(self.backend.exists_many([keys[0], missing, "bogus"])),
+            {keys[0]: True, missing: False, "bogus": False},
+        )
+
+        self.assertEqual(self.backend.delete_many(keys[:15]), [])
+        self.assertEqual(
+            dict(self.backend.exists_many(keys)),
+            {key: index >= 15 for index, key in enumerate(keys)},
+        )
+        self.backend.delete_many(keys)
+
+    @mock.patch.object(dynamodb, "READ_CONSISTENCY", "adaptive")
+    @mock.patch.object(dynamodb, "recent_writes", LRUCache(10, 5))
+    def test_adaptive_consistency(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        with mock.patch.object(
+            self.session.engine, "get_item", wraps=self.session.engine.get_item
+        ) as get_item:
+            # The item read is as recent as the last write: no second read.
+            self.assertEqual(self.backend(session_key)["foo"], "bar")
+            self.assertEqual(get_item.call_args[1]["consistent_read"], False)
+            get_item.reset_mock()
+
+            # Pretend another process wrote a newer version.
+            session = self.backend(session_key)
+            session.expected_version = dynamodb.next_version()
+            self.assertEqual(session["foo"], "bar")
+            self.assertEqual(
+                [c[1]["consistent_read"] for c in get_item.call_args_list],
+                [False, True],
+            )
+            get_item.reset_mock()
+
+            self.session.delete()
+            self.assertIs(self.session.exists(session_key), False)
+            get_item.assert_called_once()
+
+    def test_metrics(self):
+        metrics = InMemoryMetrics()
+        with mock.patch.object(self.backend, "metrics", metrics), mock.patch.object(
+            self.session.engine, "return_consumed_capacity", True
+        ):
+            self.session["foo"] = "bar" * 100
+            self.session.save()
+            self.backend(self.session.session_key).load()
+        for operation in ("update_item", "get_item"):
+            _, _, count = metrics.histogram(REQUEST_SECONDS, operation=operation)
+            self.assertGreaterEqual(count, 1)
+        self.assertGreater(metrics.counter(CONSUMED_CAPACITY, operation="get_item"), 0)
+        _, serialized, _ = metrics.histogram(PAYLOAD_BYTES, stage="serialized")
+        _, compressed, _ = metrics.histogram(PAYLOAD_BYTES, stage="compressed")
+        self.assertLess(compressed, serialized)
 
     def test_pickle_dump(self):
         import pickle as pypickle
@@ -425,11 +650,1537 @@ class DynamoDBTestCase(SessionTestsMixin, TestCase):
 
     #     cpickle.dumps(self.session, 2)
 
+    def test_version_conditions(self):
+        self.session.save()
+        engine, session_key = self.session.engine, self.session.session_key
+        engine.update_item(session_key, {"version": 1}, condition=NO_VERSION)
+        engine.update_item(
+            session_key,
+            {"version": 2},
+            condition=VERSION_IS,
+            condition_values={":version": 1},
+        )
+        for condition, values in ((VERSION_IS, {":version": 1}), (NO_VERSION, None)):
+            with self.assertRaises(ClientError):
+                engine.update_item(
+                    session_key,
+                    {"version": 3},
+                    condition=condition,
+                    condition_values=values,
+                )
+        self.assertEqual(engine.get_item(session_key)[0]["version"], 2)
+
+    def test_degraded_mode(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        backend_module = sys.modules[self.backend._send_update.__module__]
+        # The copy of the module the backend imported.
+        breaker_module = sys.modules[backend_module.is_unavailable.__module__]
+        breaker = breaker_module.CircuitBreaker(
+            window_size=2, minimum_calls=2, open_seconds=60
+        )
+        timeout = ConnectTimeoutError(endpoint_url="http://dynamodb")
+        with mock.patch.object(
+            self.backend, "circuit_breaker", breaker
+        ), mock.patch.object(
+            self.session.engine, "get_item", side_effect=timeout
+        ) as get_item:
+            with self.assertRaises(ConnectTimeoutError):
+                self.backend(session_key).load()
+
+            with mock.patch.object(
+                backend_module, "CIRCUIT_BREAKER_FALLBACK", "anonymous"
+            ):
+                session = self.backend(session_key)
+                self.assertIsNone(session.get("foo"))
+                # The cookie is kept, and the stored session isn't overwritten.
+                self.assertEqual(session.session_key, session_key)
+                session["foo"] = "baz"
+                session.save()
+                self.assertIs(session.exists(session_key), False)
+
+                self.assertEqual(breaker.state, OPEN)
+                self.assertEqual(self.backend(session_key).load(), {})
+            self.assertEqual(get_item.call_count, 2)
+        self.assertEqual(self.backend(session_key)["foo"], "bar")
+
+    def test_write_dropped_when_unavailable(self):
+        backend_module = sys.modules[self.backend._send_update.__module__]
+        throttled = ClientError(
+            {"Error": {"Code": "ThrottlingException"}}, "UpdateItem"
+        )
+        self.session["foo"] = "bar"
+        with mock.patch.object(
+            self.backend, "_send_update", side_effect=throttled
+        ):
+            with self.assertRaises(ClientError):
+                self.session.save()
+            with mock.patch.object(
+                backend_module, "CIRCUIT_BREAKER_FALLBACK", "anonymous"
+            ):
+                self.session.save()
+
+
+class CachedDynamoDBTestCase(SessionTestsMixin, TestCase):
+    backend = CachedDynamoDBSession
+
+    def test_session_save_does_not_resurrect_session_logged_out_in_other_context(self):
+        # todo fix this test
+        # skipping it its not currently needed in ussd
+        pass
+
+    def test_cache_metrics(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        cached_dynamodb.cache.delete(self.session.cache_key)
+        metrics = InMemoryMetrics()
+        with mock.patch.object(self.backend, "metrics", metrics), mock.patch.object(
+            cached_dynamodb, "local_cache", None
+        ):
+            self.backend(self.session.session_key).load()
+            self.backend(self.session.session_key).load()
+        for result in ("miss", "hit"):
+            self.assertEqual(
+                metrics.counter(CACHE_REQUESTS, cache="shared", result=result), 1
+            )
+
+    def test_bulk_operations(self):
+        keys = []
+        for index in range(3):
+            session = self.backend()
+            session["index"] = index
+            session.save()
+            keys.append(session.session_key)
+        # Only in DynamoDB.
+        cached_dynamodb.cache.delete(cached_dynamodb.KEY_PREFIX + keys[0])
+
+        loaded = dict(self.backend.load_many(keys))
+        self.assertEqual([loaded[key]["index"] for key in keys], [0, 1, 2])
+        self.assertEqual(self.backend.delete_many(keys), [])
+        self.assertEqual(
+            dict(self.backend.exists_many(keys)), dict.fromkeys(keys, False)
+        )
+        self.assertEqual(self.backend(keys[1]).load(), {})
+
+    def test_exists_many_ignores_expired(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        session_engine.update_item(session_key, {"ttl": int(time.time()) - 10})
+        # Only in DynamoDB.
+        cached_dynamodb.cache.delete(self.session.cache_key)
+        self.assertEqual(
+            dict(self.backend.exists_many([session_key])), {session_key: False}
+        )
+        self.assertEqual(dict(self.backend.load_many([session_key])), {})
+
+    def test_unchanged_cached_session_is_not_rewritten(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        for _ in range(3):
+            session = self.backend(self.session.session_key)
+            self.assertEqual(session["foo"], "bar")
+            with mock.patch.object(session.engine, "update_item") as update_item:
+                session.save()
+            update_item.assert_not_called()
+        session["foo"] = "baz"
+        session.save()
+        self.assertEqual(self.backend(session.session_key)["foo"], "baz")
+
+
+@mock.patch.object(cached_dynamodb, "local_cache", cached_dynamodb.LocalCache(10, 60))
+class LocalCachedDynamoDBTestCase(CachedDynamoDBTestCase):
+    def test_load_from_local_cache(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        with mock.patch.object(cached_dynamodb.cache, "get") as cache_get:
+            session = self.backend(self.session.session_key)
+            self.assertEqual(session["foo"], "bar")
+        cache_get.assert_not_called()
+
+    def test_local_cache_returns_copies(self):
+        self.session["items"] = [1]
+        self.session.save()
+        session = self.backend(self.session.session_key)
+        session["items"].append(2)
+        self.assertEqual(self.backend(self.session.session_key)["items"], [1])
+
+    def test_stale_load_does_not_overwrite_newer_data(self):
+        local_cache = cached_dynamodb.local_cache
+        self.session["foo"] = "old"
+        self.session.save()
+        session_key = self.session.session_key
+        # A load starts, then the session is saved before it completes.
+        version = local_cache.version()
+        self.session["foo"] = "new"
+        self.session.save()
+        local_cache.put(session_key, {"foo": "old"}, 60, version)
+        # Entries also carry the digest of the stored session.
+        self.assertEqual(
+            self.backend._cached_data(local_cache.get(session_key)), {"foo": "new"}
+        )
+
+    def test_delete_invalidates_local_cache(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        self.session.delete()
+        self.assertIsNone(cached_dynamodb.local_cache.get(session_key))
+        self.assertNotIn("foo", self.backend(session_key))
+
+    def test_stale_local_entry_does_not_overwrite_other_workers(self):
+        # Another worker, with a local cache of its own.
+        other_cache = cached_dynamodb.LocalCache(10, 60)
+        self.session["cart"] = ["book"]
+        self.session.save()
+        session_key = self.session.session_key
+        with mock.patch.object(cached_dynamodb, "local_cache", other_cache):
+            self.assertEqual(self.backend(session_key)["cart"], ["book"])
+        session = self.backend(session_key)
+        session["cart"].append("pen")
+        session.save()
+
+        with mock.patch.object(cached_dynamodb, "local_cache", other_cache):
+            session = self.backend(session_key)
+            self.assertEqual(session["cart"], ["book"])
+            session["n"] = 1
+            session.save()
+        expected = {"cart": ["book", "pen"], "n": 1}
+        self.assertEqual(dict(DynamoDBSession(session_key).items()), expected)
+        self.assertEqual(
+            self.backend._cached_data(cached_dynamodb.cache.get(session.cache_key)),
+            expected,
+        )
+
+        # Saves from this worker's own stale entry are merged as well.
+        session = self.backend(session_key)
+        self.assertNotIn("n", session)
+        session["cart"].remove("book")
+        session.save()
+        self.assertEqual(
+            dict(DynamoDBSession(session_key).items()), {"cart": ["pen"], "n": 1}
+        )
+
+    def test_stale_local_entry_of_deleted_session(self):
+        other_cache = cached_dynamodb.LocalCache(10, 60)
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        with mock.patch.object(cached_dynamodb, "local_cache", other_cache):
+            self.assertEqual(self.backend(session_key)["foo"], "bar")
+        self.session.delete()
+
+        with mock.patch.object(cached_dynamodb, "local_cache", other_cache):
+            session = self.backend(session_key)
+            session["foo"] = "baz"
+            with self.assertRaises(UpdateError):
+                session.save()
+        self.assertIs(DynamoDBSession().exists(session_key), False)
+
+
+# Patched in the module the cached backend's base class comes from.
+@mock.patch.object(
+    import_module("dynamodb_sessions.backends.dynamodb"), "STORAGE_LAYOUT", "attributes"
+)
+class AttributesLayoutCachedDynamoDBTestCase(CachedDynamoDBTestCase):
+    def test_concurrent_saves_of_different_keys(self):
+        self.session["a"], self.session["b"] = 1, 1
+        self.session.save()
+        first = self.backend(self.session.session_key)
+        second = self.backend(self.session.session_key)
+        first["a"] = 2
+        second["b"] = 2
+        first.save()
+        second.save()
+        session = self.backend(self.session.session_key)
+        self.assertEqual(dict(session.items()), {"a": 2, "b": 2})
+        # The merged session is cached once loaded.
+        self.assertEqual(
+            dict(session._cached_data(cached_dynamodb.cache.get(session.cache_key))),
+            {"a": 2, "b": 2},
+        )
+
+
+@mock.patch.object(dynamodb, "STORAGE_LAYOUT", "attributes")
+class AttributesLayoutDynamoDBTestCase(DynamoDBTestCase):
+    def test_only_changed_keys_are_written(self):
+        self.session["a"], self.session["b"] = "c", "d"
+        self.session.save()
+        session = self.backend(self.session.session_key)
+        session["a"] = "e"
+        del session["b"]
+        with mock.patch.object(
+            session.engine, "update_item", wraps=session.engine.update_item
+        ) as update_item:
+            session.save()
+        self.assertEqual(list(update_item.call_args[0][1]), [("values", "a"), "ttl"])
+        self.assertEqual(update_item.call_args[1]["remove"], (("values", "b"),))
+        self.assertEqual(dict(self.backend(session.session_key).items()), {"a": "e"})
+
+    def test_concurrent_saves_of_different_keys(self):
+        self.session["a"], self.session["b"] = 1, 1
+        self.session.save()
+        first = self.backend(self.session.session_key)
+        second = self.backend(self.session.session_key)
+        first["a"] = 2
+        second["b"] = 2
+        first.save()
+        second.save()
+        self.assertEqual(
+            dict(self.backend(self.session.session_key).items()), {"a": 2, "b": 2}
+        )
+
+    def test_blob_sessions_are_migrated(self):
+        with mock.patch.object(dynamodb, "STORAGE_LAYOUT", "blob"):
+            self.session["a"] = 1
+            self.session.save()
+        session = self.backend(self.session.session_key)
+        session["b"] = 2
+        session.save()
+        item, _ = session.engine.get_item(session.session_key)
+        self.assertNotIn("data", item)
+        self.assertEqual(dict(self.backend(session.session_key).items()), {"a": 1, "b": 2})
+
+    def test_entries_are_decoded_lazily(self):
+        self.session["a"], self.session["b"] = 1, 2
+        self.session.save()
+        session = self.backend(self.session.session_key)
+        self.assertEqual(session["a"], 1)
+        self.assertEqual(session._session.pending, {"b"})
+
+
+@mock.patch.object(dynamodb, "STORAGE_LAYOUT", "index")
+class IndexLayoutDynamoDBTestCase(DynamoDBTestCase):
+    def saved_session(self, **values):
+        self.session.update(values)
+        self.session.save()
+        return self.backend(self.session.session_key)
+
+    def test_only_accessed_values_are_decoded(self):
+        session = self.saved_session(a=1, cart=list(range(100)))
+        self.assertEqual(session["a"], 1)
+        self.assertEqual(session._session.pending, {"cart"})
+        self.assertIn("cart", session)
+        self.assertEqual(session._session.pending, {"cart"})
+
+    def test_untouched_values_are_not_serialized(self):
+        session = self.saved_session(a=1, cart=list(range(100)))
+        session["a"] = 2
+        lazy = session._session
+        with mock.patch.object(
+            lazy._serializer, "dumps", wraps=lazy._serializer.dumps
+        ) as dumps:
+            session.save()
+        dumps.assert_called_once_with(2)
+        self.assertEqual(
+            dict(self.backend(session.session_key).items()),
+            {"a": 2, "cart": list(range(100))},
+        )
+
+    def test_values_changed_in_place_are_saved(self):
+        session = self.saved_session(cart=[1])
+        session["cart"].append(2)
+        session.modified = True
+        session.save()
+        self.assertEqual(self.backend(session.session_key)["cart"], [1, 2])
+
+    def test_read_only_request_is_not_written(self):
+        session = self.saved_session(a=1, b=2)
+        session["a"]
+        with mock.patch.object(session.engine, "update_item") as update_item:
+            session.save()
+        update_item.assert_not_called()
+
+    def test_blob_sessions_are_read(self):
+        with mock.patch.object(dynamodb, "STORAGE_LAYOUT", "blob"):
+            self.session["a"] = 1
+            self.session.save()
+        session = self.backend(self.session.session_key)
+        self.assertEqual(session["a"], 1)
+        session["b"] = 2
+        session.save()
+        with mock.patch.object(dynamodb, "STORAGE_LAYOUT", "blob"):
+            session = self.backend(session.session_key)
+            self.assertEqual(dict(session.items()), {"a": 1, "b": 2})
+            session["c"] = 3
+            session.save()
+        self.assertEqual(
+            dict(self.backend(session.session_key).items()), {"a": 1, "b": 2, "c": 3}
+        )
+
+
+class LazySessionDictTestCase(SimpleTestCase):
+    def lazy(self, **values):
+        serializer = DynamoDBSession().serializer()
+        return LazySessionDict(
+            {name: serializer.dumps(value) for name, value in values.items()},
+            serializer,
+        )
+
+    def test_index_round_trip(self):
+        entries = {"b": b"2", "a": b"1", "\u00e9": b""}
+        serialized = pack_index(entries)
+        self.assertEqual(serialized, pack_index(dict(reversed(entries.items()))))
+        self.assertEqual(unpack_index(serialized), entries)
+        with self.assertRaises(ValueError):
+            unpack_index(serialized[:-1])
+
+    def test_mapping(self):
+        session = self.lazy(a=1, b=2, c=3)
+        session["d"] = 4
+        del session["b"]
+        self.assertEqual(len(session), 3)
+        self.assertEqual(session.pop("c"), 3)
+        self.assertEqual(session.get("e", 5), 5)
+        self.assertEqual(dict(session), {"a": 1, "d": 4})
+        self.assertEqual(session, {"a": 1, "d": 4})
+
+    def test_pickled_copies_stay_lazy(self):
+        session = self.lazy(a=1, b=2)
+        session["a"]
+        copy = pickle.loads(pickle.dumps(session))
+        self.assertEqual(copy.pending, {"b"})
+        self.assertEqual(dict(copy), {"a": 1, "b": 2})
+
+
+@mock.patch.object(dynamodb, "CHUNK_SIZE", 4000)
+class ChunkedDynamoDBTestCase(DynamoDBTestCase):
+    def stored_chunks(self, session_key=None):
+        session_key = session_key or self.session.session_key
+        item, _ = session_engine.get_item(session_key)
+        if item is None or "chunks" not in item:
+            return []
+        return chunk_keys(session_key, item["chunks"])
+
+    def assertChunksStored(self, keys, stored=True):
+        for key in keys:
+            try:
+                self.session.chunk_store.get([key])
+            except Exception:
+                found = False
+            else:
+                found = True
+            self.assertIs(found, stored, key)
+
+    def test_large_session_is_chunked(self):
+        self.session["big"] = get_random_string(20000)
+        self.session.save()
+        item, _ = session_engine.get_item(self.session.session_key)
+        self.assertNotIn("data", item)
+        self.assertGreater(item["chunks"]["count"], 1)
+        self.assertChunksStored(self.stored_chunks())
+        session = self.backend(self.session.session_key)
+        self.assertEqual(session["big"], self.session["big"])
+
+    def test_rewrite_deletes_stale_chunks(self):
+        self.session["big"] = get_random_string(20000)
+        self.session.save()
+        old_chunks = self.stored_chunks()
+        session = self.backend(self.session.session_key)
+        session["big"] = get_random_string(20000)
+        session.save()
+        self.assertChunksStored(old_chunks, stored=False)
+        self.assertChunksStored(self.stored_chunks())
+        session["big"] = "small"
+        session.save()
+        self.assertEqual(self.stored_chunks(), [])
+        self.assertEqual(self.backend(session.session_key)["big"], "small")
+
+    def test_delete_removes_chunks(self):
+        self.session["big"] = get_random_string(20000)
+        self.session.save()
+        chunks = self.stored_chunks()
+        self.backend().delete(self.session.session_key)
+        self.assertChunksStored(chunks, stored=False)
+
+    def test_missing_chunk(self):
+        self.session["big"] = get_random_string(20000)
+        self.session.save()
+        self.session.chunk_store.delete(self.stored_chunks()[-1:])
+        self.assertEqual(self.backend(self.session.session_key).load(), {})
+
+    def test_ttl_refresh_keeps_chunks(self):
+        self.session["big"] = get_random_string(20000)
+        self.session.save()
+        ttl = self.session._stored[2]
+        session = self.backend(self.session.session_key)
+        self.assertEqual(session["big"], self.session["big"])
+        # Refresh the TTL later on, then clear what expired in between.
+        session._stored = session._stored[:2] + (0,)
+        with mock.patch("time.time", return_value=time.time() + 1000):
+            session.save()
+        ExpiredSessionCleaner(session_engine).run(expired_before=ttl + 1)
+        self.assertEqual(self.backend(session.session_key)["big"], self.session["big"])
+
+
+@mock.patch.object(dynamodb, "LAZY_CREATE", True)
+class LazyCreateDynamoDBTestCase(DynamoDBTestCase):
+    def test_create_is_written_once(self):
+        session = self.backend()
+        with mock.patch.object(
+            session.engine, "update_item", wraps=session.engine.update_item
+        ) as update_item:
+            session.create()
+            update_item.assert_not_called()
+            session_key = session.session_key
+            session["foo"] = "bar"
+            session.save()
+        update_item.assert_called_once()
+        self.assertEqual(update_item.call_args[1]["condition"], NOT_EXISTS)
+        self.assertEqual(session.session_key, session_key)
+        self.assertEqual(self.backend(session_key)["foo"], "bar")
+
+    async def test_acreate_is_written_once(self):
+        session = self.backend()
+        with mock.patch.object(
+            session.engine, "aupdate_item", wraps=session.engine.aupdate_item
+        ) as aupdate_item:
+            await session.acreate()
+            aupdate_item.assert_not_called()
+            await session.aset("foo", "bar")
+            await session.asave()
+        aupdate_item.assert_called_once()
+        self.assertEqual(await self.backend(session.session_key).aget("foo"), "bar")
+
+    def test_reserved_key_collision(self):
+        taken = self.backend()
+        taken["foo"] = "taken"
+        taken.save()
+        fresh_key = taken._get_new_session_key()
+        session = self.backend()
+        with mock.patch.object(
+            session, "_get_new_session_key", side_effect=[taken.session_key, fresh_key]
+        ):
+            session["foo"] = "bar"
+            session.save()
+        self.assertEqual(session.session_key, fresh_key)
+        self.assertEqual(self.backend(taken.session_key)["foo"], "taken")
+        self.assertEqual(self.backend(fresh_key)["foo"], "bar")
+
+
+CHUNK_STORE = "dynamodb_sessions.chunks.FileSystemChunkStore"
+
+
+class FileSystemChunksDynamoDBTestCase(ChunkedDynamoDBTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(
+            dynamodb,
+            "session_chunk_store",
+            dynamodb.import_string(CHUNK_STORE)(path=directory.name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+class ClientEngineSession(DynamoDBSession):
+    engine = ClientEngine(TABLE_NAME, HASH_ATTRIB_NAME, connection_manager)
+
+
+class ClientEngineDynamoDBTestCase(DynamoDBTestCase):
+    backend = ClientEngineSession
+
+
+class InMemoryEngineSession(DynamoDBSession):
+    engine = InMemoryEngine(TABLE_NAME, HASH_ATTRIB_NAME)
+
+
+class InMemoryEngineDynamoDBTestCase(DynamoDBTestCase):
+    backend = InMemoryEngineSession
+
+    @skip("The in-memory engine doesn't report consumed capacity.")
+    def test_metrics(self):
+        pass
+
+    @skip("clearsessions uses the SESSION_ENGINE store, backed by DynamoDB.")
+    def test_clearsessions_command(self):
+        pass
+
+    @mock.patch.object(dynamodb, "USER_INDEX", "user_id-index")
+    def test_revoke_user_sessions(self):
+        keys = {}
+        for user_id in ("42", "42", "7", None):
+            session = self.backend()
+            if user_id is not None:
+                session["_auth_user_id"] = user_id
+            session.save()
+            keys.setdefault(user_id, []).append(session.session_key)
+        engine = self.backend.engine
+        self.assertNotIn("user_id", engine.items[keys[None][0]])
+
+        revoked, failed = self.backend.revoke_user_sessions(42)
+        self.assertEqual(sorted(revoked), sorted(keys["42"]))
+        self.assertEqual(failed, [])
+        self.assertEqual(
+            dict(self.backend.exists_many(keys["42"] + keys["7"])),
+            {keys["42"][0]: False, keys["42"][1]: False, keys["7"][0]: True},
+        )
+
+        # Logging out removes the session from the index.
+        session = self.backend(keys["7"][0])
+        del session["_auth_user_id"]
+        session.save()
+        self.assertEqual(self.backend.revoke_user_sessions(7), ([], []))
+
+    def test_revoke_user_sessions_needs_index(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.backend.revoke_user_sessions(42)
+
+
+def replicas(*latencies):
+    """
+    In-memory stand-ins for the replicas of a global table, sharing their
+    items.
+    """
+    engines = [
+        InMemoryEngine(TABLE_NAME, HASH_ATTRIB_NAME, latency=latency)
+        for latency in latencies
+    ]
+    for engine in engines[1:]:
+        engine.items = engines[0].items
+    return engines
+
+
+class RoutingEngineSession(DynamoDBSession):
+    engine = RoutingEngine(replicas(0, 0))
+
+
+class RoutingEngineDynamoDBTestCase(InMemoryEngineDynamoDBTestCase):
+    backend = RoutingEngineSession
 
-# class CachedDynamoDBTestCase(SessionTestsMixin, TestCase):
-#     backend = CachedDynamoDBSession
-#
-#     def test_session_save_does_not_resurrect_session_logged_out_in_other_context(self):
-#         # todo fix this test
-#         # skipping it its not currently needed in ussd
-#         pass
+
+WEEK = 7 * 24 * 3600
+
+
+class RotatingEngineSession(DynamoDBSession):
+    engine = RotatingEngine(
+        InMemoryEngine(TABLE_NAME, HASH_ATTRIB_NAME), WEEK, settings.SESSION_COOKIE_AGE
+    )
+
+
+class RotatingEngineDynamoDBTestCase(InMemoryEngineDynamoDBTestCase):
+    backend = RotatingEngineSession
+
+    def setUp(self):
+        self.now = time.time()
+        patcher = mock.patch.object(self.backend.engine, "_clock", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def table(self, session_key):
+        return self.backend.engine.engine_for(session_key).items
+
+    def test_revoke_user_sessions(self):
+        engine = self.backend.engine
+        items = engine.bucket_engine(engine.bucket()).items
+        with mock.patch.object(engine, "items", items):
+            super().test_revoke_user_sessions()
+
+    def test_rotation(self):
+        engine = self.backend.engine
+        bucket = engine.bucket()
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        self.assertTrue(session_key.startswith(to_base36(bucket).rjust(5, "0")))
+        self.assertIn(session_key, engine.bucket_engine(bucket).items)
+        self.assertNotIn(session_key, engine.engine.items)
+
+        # A week later, the session is still read from its table, and moves
+        # to the new one when saved.
+        self.now += WEEK
+        session = self.backend(session_key)
+        self.assertEqual(session["foo"], "bar")
+        session["foo"] = "baz"
+        session.save()
+        self.assertNotEqual(session.session_key, session_key)
+        self.assertIn(session.session_key, engine.bucket_engine(bucket + 1).items)
+        self.assertNotIn(session_key, engine.bucket_engine(bucket).items)
+        self.assertEqual(self.backend(session.session_key)["foo"], "baz")
+        self.assertIs(self.backend().exists(session_key), False)
+
+        # The old table holds no live session once the cookie age has passed.
+        self.assertIn(bucket, engine.live_buckets())
+        self.now += settings.SESSION_COOKIE_AGE
+        self.assertNotIn(bucket, engine.live_buckets())
+        self.assertIs(engine.engine_for(session_key), engine.engine)
+
+    def test_sessions_before_rotation(self):
+        session_key = "a" * 32
+        self.backend.engine.engine.items[session_key] = {
+            HASH_ATTRIB_NAME: session_key,
+            "data": self.session.encode({"foo": "bar"}),
+            "ttl": int(time.time()) + 60,
+        }
+        session = self.backend(session_key)
+        self.assertEqual(session["foo"], "bar")
+        session.save()
+        self.assertNotEqual(session.session_key, session_key)
+        self.assertNotIn(session_key, self.backend.engine.engine.items)
+
+
+@override_settings(USE_LOCAL_DYNAMODB_SERVER=True)
+class RotatedTablesCommandsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = time.time()
+        self.engine = RotatingEngine(
+            ClientEngine(TABLE_NAME, HASH_ATTRIB_NAME, connection_manager),
+            3600,
+            7200,
+            clock=lambda: self.now,
+        )
+        self.modules = [
+            import_module("dynamodb_sessions.management.commands." + name)
+            for name in ("create_session_table", "delete_session_table")
+        ]
+        for module in self.modules:
+            for name, value in (
+                ("TABLE_ROTATION", 3600),
+                ("session_engine", self.engine),
+            ):
+                patcher = mock.patch.object(module, name, value)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+    def rotated_tables(self):
+        names = connection_manager.client().list_tables()["TableNames"]
+        return sorted(
+            name for name in names if self.engine.bucket_of_table(name) is not None
+        )
+
+    def test_commands(self):
+        bucket = self.engine.bucket()
+        management.call_command("create_session_table", ignore_logs=True)
+        self.addCleanup(
+            management.call_command,
+            "delete_session_table",
+            "--expired",
+            stdout=StringIO(),
+        )
+        tables = [self.engine.table_name(bucket), self.engine.table_name(bucket + 1)]
+        self.assertEqual(self.rotated_tables(), tables)
+
+        self.now += 3 * 3600
+        self.assertEqual(self.engine.oldest_bucket(), bucket + 1)
+        management.call_command("delete_session_table", "--expired", stdout=StringIO())
+        self.assertEqual(self.rotated_tables(), tables[1:])
+        # The cleanup drops the other one.
+        self.now += 3600
+
+    @override_settings(USE_LOCAL_DYNAMODB_SERVER=False)
+    def test_ttl_is_enabled_on_new_tables(self):
+        client = connection_manager.client()
+        bucket = self.engine.bucket()
+        management.call_command("create_session_table", ignore_logs=True)
+        self.addCleanup(
+            management.call_command,
+            "delete_session_table",
+            "--expired",
+            stdout=StringIO(),
+        )
+        self.addCleanup(setattr, self, "now", self.now + 4 * 3600)
+        for table_name in (
+            self.engine.table_name(bucket),
+            self.engine.table_name(bucket + 1),
+        ):
+            description = client.describe_time_to_live(TableName=table_name)[
+                "TimeToLiveDescription"
+            ]
+            self.assertEqual(description["TimeToLiveStatus"], "ENABLED")
+            self.assertEqual(description["AttributeName"], "ttl")
+
+    def test_expired_tables_are_deleted_despite_protection(self):
+        client = connection_manager.client()
+        bucket = self.engine.bucket()
+        management.call_command(
+            "create_session_table", ignore_logs=True, no_protection=False
+        )
+        self.addCleanup(
+            management.call_command,
+            "delete_session_table",
+            "--expired",
+            stdout=StringIO(),
+        )
+        tables = [self.engine.table_name(bucket), self.engine.table_name(bucket + 1)]
+        for table_name in tables:
+            table = client.describe_table(TableName=table_name)["Table"]
+            self.assertIs(table.get("DeletionProtectionEnabled", False), False)
+        # Tables created with protection before it was left off.
+        client.update_table(TableName=tables[0], DeletionProtectionEnabled=True)
+
+        self.now += 3 * 3600
+        management.call_command("delete_session_table", "--expired", ignore_logs=True)
+        self.assertEqual(self.rotated_tables(), tables[1:])
+        self.now += 3600
+
+    def test_failed_deletions_are_reported(self):
+        bucket = self.engine.bucket()
+        management.call_command("create_session_table", ignore_logs=True)
+        self.addCleanup(
+            management.call_command,
+            "delete_session_table",
+            "--expired",
+            stdout=StringIO(),
+        )
+        self.now += 4 * 3600
+        error = ClientError({"Error": {"Code": "ResourceInUseException"}}, "x")
+        # The client the commands use.
+        backend_module = import_module("dynamodb_sessions.backends.dynamodb")
+        client = backend_module.connection_manager.client()
+        with mock.patch.object(client, "delete_table", side_effect=error):
+            with self.assertRaisesMessage(
+                CommandError, self.engine.table_name(bucket)
+            ):
+                management.call_command(
+                    "delete_session_table",
+                    "--expired",
+                    ignore_logs=True,
+                    stderr=StringIO(),
+                )
+        self.assertEqual(len(self.rotated_tables()), 2)
+
+
+class RoutingEngineTestCase(SimpleTestCase):
+    def setUp(self):
+        self.home, self.near = replicas(0, 0)
+        self.engine = RoutingEngine([self.home, self.near], hedge_percentile=0.5)
+        self.engine.update_item("key", {"data": "value"})
+
+    def measure(self, *latencies):
+        for stats, latency in zip(self.engine.stats, latencies):
+            for _ in range(10):
+                stats.record(latency)
+
+    def test_writes_and_consistent_reads_go_home(self):
+        self.near.items = {}
+        self.assertEqual(self.home.items["key"]["data"], "value")
+        self.measure(0.1, 0.001)
+        with mock.patch.object(self.near, "get_item") as get_item:
+            item, _ = self.engine.get_item("key")
+        get_item.assert_not_called()
+        self.assertEqual(item["data"], "value")
+
+    def test_reads_go_to_fastest_endpoint(self):
+        self.measure(0.1, 0.001)
+        with mock.patch.object(
+            self.near, "get_item", wraps=self.near.get_item
+        ) as get_item:
+            item, _ = self.engine.get_item("key", consistent_read=False)
+        get_item.assert_called_once()
+        self.assertEqual(item["data"], "value")
+
+    def test_hedged_read(self):
+        self.measure(0.001, 0.002)
+        self.home.latency = 1
+        start = time.monotonic()
+        item, _ = self.engine.get_item("key", consistent_read=False)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(item["data"], "value")
+
+    def test_failover(self):
+        self.measure(0.001, 0.002)
+        with mock.patch.object(
+            self.home, "get_item", side_effect=InMemoryEngine._error("x", "GetItem")
+        ):
+            item, _ = self.engine.get_item("key", consistent_read=False)
+            self.assertEqual(item["data"], "value")
+        # The failed endpoint is now ranked last.
+        self.assertEqual(self.engine._ranked(), [1, 0])
+
+        self.near.items = {}
+        with mock.patch.object(
+            self.near, "get_item", side_effect=InMemoryEngine._error("y", "GetItem")
+        ), mock.patch.object(
+            self.home, "get_item", side_effect=InMemoryEngine._error("x", "GetItem")
+        ):
+            with self.assertRaises(ClientError) as raised:
+                self.engine.get_item("key", consistent_read=False)
+        self.assertEqual(raised.exception.response["Error"]["Code"], "y")
+
+    async def test_async_hedged_read(self):
+        self.measure(0.001, 0.002)
+        self.home.latency = 1
+        start = time.monotonic()
+        item, _ = await self.engine.aget_item("key", consistent_read=False)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(item["data"], "value")
+
+
+class SessionMiddlewareTestCase(TestCase):
+    session_engine = "dynamodb_sessions.backends.dynamodb"
+
+    def setUp(self):
+        # The middleware uses the backend imported from SESSION_ENGINE.
+        backend = import_module(self.session_engine)
+        for name, value in (
+            ("READ_CONSISTENCY", "adaptive"),
+            ("recent_writes", LRUCache(10, 5)),
+        ):
+            patcher = mock.patch.object(backend, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = override_settings(SESSION_ENGINE=self.session_engine)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def test_version_cookie(self):
+        def view(request):
+            request.session["foo"] = "bar"
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        response = SessionMiddleware(view)(request)
+        version = request.session.written_version
+        self.assertIsNotNone(version)
+
+        request = RequestFactory().get("/")
+        for name in (settings.SESSION_COOKIE_NAME, VERSION_COOKIE_NAME):
+            request.COOKIES[name] = response.cookies[name].value
+        SessionMiddleware(lambda request: HttpResponse()).process_request(request)
+        self.assertEqual(request.session.expected_version, version)
+        self.assertEqual(request.session["foo"], "bar")
+
+    def test_tampered_version_cookie(self):
+        request = RequestFactory().get("/")
+        request.COOKIES[VERSION_COOKIE_NAME] = "99999999999999999999"
+        SessionMiddleware(lambda request: HttpResponse()).process_request(request)
+        self.assertIsNone(request.session.expected_version)
+
+
+class EngineHelpersTestCase(SimpleTestCase):
+    def test_serialize_round_trip(self):
+        item = {
+            "data": b"\x00payload",
+            "ttl": 1700000000,
+            "user_id": "42",
+            "flags": {"active": True, "missing": None},
+            "history": ["a", 1],
+        }
+        self.assertEqual(
+            {name: deserialize(serialize(value)) for name, value in item.items()},
+            item,
+        )
+
+    def test_update_template_is_reused(self):
+        first = compile_update(("data", "ttl"))
+        self.assertIs(compile_update(("data", "ttl")), first)
+        self.assertEqual(first[0], "SET #n0 = :v0, #n1 = :v1")
+        self.assertEqual(first[1], {"#n0": "data", "#n1": "ttl"})
+
+
+class CodecTestCase(SimpleTestCase):
+    payload = b'{"_auth_user_id":"1","_auth_user_backend":"x"}' * 20
+
+    def test_round_trip(self):
+        codec = Codec("zlib", threshold=0)
+        data = codec.compress(self.payload)
+        self.assertEqual(data[0], ZLIB)
+        self.assertEqual(codec.decompress(data), self.payload)
+
+    def test_small_payloads_are_not_compressed(self):
+        codec = Codec("zlib", threshold=128)
+        data = codec.compress(b"{}")
+        self.assertEqual(data, bytes((RAW,)) + b"{}")
+        self.assertEqual(codec.decompress(data), b"{}")
+
+    def test_uncompressed(self):
+        codec = Codec("none")
+        self.assertEqual(codec.decompress(codec.compress(self.payload)), self.payload)
+
+    def test_legacy_payloads_are_decoded(self):
+        legacy = base64.b64encode(zlib.compress(self.payload))
+        self.assertEqual(Codec("none").decompress(legacy), self.payload)
+
+    @skipIf(zstandard is None, "zstandard is not installed")
+    def test_dictionary_rotation(self):
+        samples = [
+            b'{"_auth_user_id":"%d","_auth_user_backend":"django.contrib.auth'
+            b'.backends.ModelBackend","_auth_user_hash":"%032x"}' % (i, i * 7919)
+            for i in range(500)
+        ]
+        old = zstandard.train_dictionary(2048, samples[:250]).as_bytes()
+        new = zstandard.train_dictionary(2048, samples[250:]).as_bytes()
+        old_data = Codec("zstd", dictionaries=[old]).compress(samples[0])
+        self.assertEqual(old_data[0], ZSTD_DICT)
+
+        # Rotated: payloads written with the previous dictionary still decode.
+        codec = Codec("zstd", dictionaries=[new, old])
+        self.assertEqual(codec.decompress(old_data), samples[0])
+        new_data = codec.compress(samples[1])
+        self.assertEqual(codec.decompress(new_data), samples[1])
+        self.assertLess(len(new_data), len(samples[1]) // 2)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ImproperlyConfigured):
+            Codec("brotli")
+
+
+class MetricsTestCase(SimpleTestCase):
+    def test_null_metrics(self):
+        Metrics().increment("counter")
+        Metrics().observe("histogram", 1)
+
+    def test_counters(self):
+        metrics = InMemoryMetrics()
+        metrics.increment("requests", operation="get_item")
+        metrics.increment("requests", 2, operation="get_item")
+        metrics.increment("requests", operation="update_item")
+        self.assertEqual(metrics.counter("requests", operation="get_item"), 3)
+        self.assertEqual(metrics.counter("requests", operation="delete_item"), 0)
+
+    def test_histograms(self):
+        metrics = InMemoryMetrics(buckets={"latency": (0.1, 1)})
+        for value in (0.05, 0.1, 0.5, 2):
+            metrics.observe("latency", value)
+        buckets, total, count = metrics.histogram("latency")
+        self.assertEqual(buckets, [(0.1, 2), (1, 3), (float("inf"), 4)])
+        self.assertEqual((total, count), (2.65, 4))
+
+    def test_render(self):
+        metrics = InMemoryMetrics(buckets={"latency": (0.1,)})
+        metrics.increment("requests", operation="get_item")
+        metrics.observe("latency", 0.05, operation="get_item")
+        self.assertEqual(
+            metrics.render(),
+            "# TYPE requests counter\n"
+            'requests{operation="get_item"} 1\n'
+            "# TYPE latency histogram\n"
+            'latency_bucket{operation="get_item",le="0.1"} 1\n'
+            'latency_bucket{operation="get_item",le="+Inf"} 1\n'
+            'latency_sum{operation="get_item"} 0.05\n'
+            'latency_count{operation="get_item"} 1\n',
+        )
+
+
+class BenchmarkTestCase(SimpleTestCase):
+    def test_payload(self):
+        payload = make_payload(4096, seed=1)
+        self.assertEqual(payload, make_payload(4096, seed=1))
+        self.assertAlmostEqual(len(json.dumps(payload)), 4096, delta=200)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 100)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_run(self):
+        report = Benchmark(iterations=4).run(
+            benchmark_scenarios(
+                ["dynamodb", "cached_dynamodb"],
+                ["memory"],
+                ["zlib"],
+                [512],
+                [2],
+                ["threads", "async"],
+            )
+        )
+        self.assertEqual(len(report["results"]), 4 * len(OPERATIONS))
+        for result in report["results"]:
+            self.assertEqual(result["ops"], 4)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertEqual(len(compare(report, report)), len(report["results"]))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile(suffix=".json") as output:
+            management.call_command(
+                "benchmark_sessions",
+                "--engines=memory",
+                "--payload-sizes=256",
+                "--concurrency=1",
+                "--iterations=2",
+                "--output=" + output.name,
+                stdout=StringIO(),
+            )
+            report = json.load(output)
+        self.assertEqual(len(report["results"]), 2 * len(OPERATIONS))
+        self.assertIn("commit", report["meta"])
+
+
+class LRUCacheTestCase(SimpleTestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_expiry(self):
+        cache = LRUCache(2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=0)
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(
+            failure_ratio=0.5,
+            window_size=4,
+            minimum_calls=4,
+            slow_call_seconds=1,
+            open_seconds=10,
+            probe_calls=2,
+            clock=lambda: self.now,
+        )
+
+    def test_opens_and_closes(self):
+        for failed in (False, True, False):
+            self.breaker.record(failed)
+        self.assertEqual(self.breaker.state, CLOSED)
+        # Slow calls count as failures.
+        self.breaker.record(False, duration=2)
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            with self.breaker.guard():
+                pass
+
+        self.now = 10
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        for _ in range(4):
+            self.breaker.record(True)
+        self.now = 10
+        with self.assertRaises(ConnectTimeoutError):
+            with self.breaker.guard():
+                raise ConnectTimeoutError(endpoint_url="http://dynamodb")
+        self.assertEqual(self.breaker.state, OPEN)
+        self.now = 19
+        self.assertFalse(self.breaker.allow())
+
+    def test_rejected_requests_are_not_failures(self):
+        for _ in range(4):
+            with self.assertRaises(ValueError):
+                with self.breaker.guard():
+                    raise ValueError
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_is_unavailable(self):
+        def client_error(code, status=400):
+            return ClientError(
+                {
+                    "Error": {"Code": code},
+                    "ResponseMetadata": {"HTTPStatusCode": status},
+                },
+                "GetItem",
+            )
+
+        self.assertTrue(is_unavailable(client_error("ThrottlingException")))
+        self.assertTrue(is_unavailable(client_error("InternalFailure", 500)))
+        self.assertFalse(is_unavailable(client_error("ValidationException")))
+        self.assertTrue(is_unavailable(ConnectTimeoutError(endpoint_url="x")))
+        self.assertTrue(is_unavailable(CircuitOpenError()))
+
+
+CACHE_TABLE_NAME = "cache"
+DYNAMODB_CACHES = {
+    "default": {
+        "BACKEND": "dynamodb_sessions.cache.DynamoDBCache",
+        "LOCATION": CACHE_TABLE_NAME,
+    }
+}
+
+
+@override_settings(CACHES=DYNAMODB_CACHES)
+class DynamoDBCacheTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        management.call_command("create_cache_table", ignore_logs=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        connection_manager.client().delete_table(TableName=CACHE_TABLE_NAME)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = caches["default"]
+        self.addCleanup(self.cache.clear)
+
+    def test_set_get_delete(self):
+        values = {"str": "bar", "int": 42, "dict": {"a": [1]}, "big": 10**40}
+        for key, value in values.items():
+            self.cache.set(key, value)
+        for key, value in values.items():
+            self.assertEqual(self.cache.get(key), value)
+        self.assertIs(self.cache.has_key("str"), True)
+        self.assertIs(self.cache.delete("str"), True)
+        self.assertIs(self.cache.delete("str"), False)
+        self.assertIs(self.cache.has_key("str"), False)
+        self.assertEqual(self.cache.get("str", "default"), "default")
+
+    def test_expiry(self):
+        self.cache.set("foo", "bar", timeout=0)
+        self.assertIsNone(self.cache.get("foo"))
+        self.assertIs(self.cache.touch("foo"), False)
+        # Expired entries are replaced, even before DynamoDB deletes them.
+        self.assertIs(self.cache.add("foo", "baz"), True)
+        self.assertIs(self.cache.add("foo", "qux"), False)
+        self.assertEqual(self.cache.get("foo"), "baz")
+        self.assertIs(self.cache.touch("foo", timeout=None), True)
+        item, _ = self.cache.engine.get_item(self.cache.make_key("foo"))
+        self.assertNotIn("ttl", item)
+
+    def test_incr(self):
+        self.cache.set("count", 1)
+        self.assertEqual(self.cache.incr("count"), 2)
+        self.assertEqual(self.cache.decr("count", 5), -3)
+        self.assertEqual(self.cache.get("count"), -3)
+        self.cache.set("name", "bar")
+        self.cache.set("expired", 1, timeout=0)
+        for key in ("missing", "name", "expired"):
+            with self.assertRaises(ValueError):
+                self.cache.incr(key)
+
+    def test_many(self):
+        data = {"key%d" % i: i for i in range(30)}
+        self.assertEqual(self.cache.set_many(data, timeout=60), [])
+        with mock.patch.object(
+            self.cache.engine, "batch_get", wraps=self.cache.engine.batch_get
+        ) as batch_get:
+            self.assertEqual(self.cache.get_many(list(data) + ["missing"]), data)
+        batch_get.assert_called_once()
+        self.cache.delete_many(list(data)[:20])
+        self.assertEqual(
+            self.cache.get_many(list(data)), {"key%d" % i: i for i in range(20, 30)}
+        )
+
+    def test_clear(self):
+        self.cache.set_many({"a": 1, "b": 2})
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(["a", "b"]), {})
+
+    def test_key_too_long(self):
+        with self.assertRaises(InvalidCacheKey):
+            self.cache.set("x" * 3000, 1)
+
+
+class ClientEngineDynamoDBCacheTestCase(DynamoDBCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache.engine = ClientEngine(
+            CACHE_TABLE_NAME, HASH_ATTRIB_NAME, connection_manager
+        )
+
+
+class InMemoryEngineDynamoDBCacheTestCase(DynamoDBCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache.engine = InMemoryEngine(CACHE_TABLE_NAME, HASH_ATTRIB_NAME)
+
+    async def test_async(self):
+        self.assertIs(await self.cache.aadd("foo", 1), True)
+        self.assertIs(await self.cache.aadd("foo", 2), False)
+        self.assertEqual(await self.cache.aincr("foo", 2), 3)
+        await self.cache.aset_many({"a": "b", "c": "d"})
+        self.assertEqual(
+            await self.cache.aget_many(["foo", "a", "c"]),
+            {"foo": 3, "a": "b", "c": "d"},
+        )
+        self.assertIs(await self.cache.atouch("a", timeout=0), True)
+        self.assertIs(await self.cache.ahas_key("a"), False)
+        await self.cache.adelete_many(["c"])
+        self.assertIsNone(await self.cache.aget("c"))
+        self.assertIs(await self.cache.adelete("foo"), True)
+
+
+class ConnectionManagerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.manager = ConnectionManager(
+            max_pool_connections=25, service_name="dynamodb", region_name="us-west-2"
+        )
+
+    def test_client_is_reused(self):
+        self.assertIs(self.manager.client(), self.manager.client())
+        self.assertEqual(self.manager.client().meta.config.max_pool_connections, 25)
+
+    def test_client_is_rebuilt_after_fork(self):
+        client = self.manager.client()
+        # Pretend we're running in a forked child.
+        self.manager._pid = -1
+        self.assertIsNot(self.manager.client(), client)
+
+    def test_tables_are_per_thread(self):
+        tables = []
+        thread = threading.Thread(
+            target=lambda: tables.append(self.manager.table(TABLE_NAME))
+        )
+        thread.start()
+        thread.join()
+        self.assertIs(self.manager.table(TABLE_NAME), self.manager.table(TABLE_NAME))
+        self.assertIsNot(self.manager.table(TABLE_NAME), tables[0])
+
+    def test_resources_share_a_client(self):
+        resources = [self.manager.resource()]
+        with mock.patch("boto3.session.Session") as session:
+            thread = threading.Thread(
+                target=lambda: resources.append(self.manager.resource())
+            )
+            thread.start()
+            thread.join()
+        # The thread's resource is built without a session of its own.
+        session.assert_not_called()
+        self.assertIsNot(resources[0], resources[1])
+        self.assertIs(resources[0].meta.client, resources[1].meta.client)
+        # Not the low-level client: the resource layer registers its
+        # (de)serialization handlers on it.
+        self.assertIsNot(resources[0].meta.client, self.manager.client())
+
+    def test_prewarm(self):
+        client = self.manager.client()
+        error = ClientError({"Error": {"Code": "AccessDeniedException"}}, "x")
+        with mock.patch.object(
+            client, "describe_endpoints", side_effect=[{}, error, {}]
+        ) as describe_endpoints:
+            self.manager.prewarm(connections=3)
+        self.assertEqual(describe_endpoints.call_count, 3)
+
+    def test_prewarm_endpoints(self):
+        backend_module = import_module("dynamodb_sessions.backends.dynamodb")
+        manager = backend_module.connection_manager
+        error = ClientError({"Error": {"Code": "AccessDeniedException"}}, "x")
+        with mock.patch.object(manager, "prewarm", side_effect=error) as prewarm:
+            # Errors are only logged.
+            backend_module.prewarm()
+        prewarm.assert_called_once_with(
+            backend_module.PREWARM_CONNECTIONS,
+            resource=backend_module.ENGINE == "resource",
+        )
+
+    @skipIf(not AIOBOTOCORE_INSTALLED, "aiobotocore is not installed")
+    def test_async_config_merges_user_config(self):
+        manager = AsyncConnectionManager(
+            max_pool_connections=25, config=Config(connect_timeout=5)
+        )
+        self.assertEqual(manager.config.max_pool_connections, 25)
+        self.assertEqual(manager.config.connect_timeout, 5)
+        # Options explicitly set win over the defaults.
+        manager = AsyncConnectionManager(config=Config(max_pool_connections=3))
+        self.assertEqual(manager.config.max_pool_connections, 3)
+
+    @skipIf(not AIOBOTOCORE_INSTALLED, "aiobotocore is not installed")
+    async def test_aclose(self):
+        backend_module = import_module("dynamodb_sessions.backends.dynamodb")
+        client = await backend_module.async_connection_manager.client()
+        with mock.patch.object(client, "close", wraps=client.close) as close:
+            await backend_module.aclose()
+        close.assert_awaited_once_with()
+        self.assertIsNot(await backend_module.async_connection_manager.client(), client)
+        await backend_module.aclose()
+
+
+class WriteBehindCachedDynamoDBTestCase(CachedDynamoDBTestCase):
+    def setUp(self):
+        self.queue = WriteBehindQueue(session_engine, maxsize=100, flush_interval=0)
+        patcher = mock.patch.object(cached_dynamodb, "write_behind", self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.queue.flush()
+
+    def test_save_is_written_behind(self):
+        self.session.save()
+        self.session["foo"] = "bar"
+        with mock.patch.object(session_engine, "update_item") as update_item:
+            self.session.save()
+        update_item.assert_not_called()
+        self.queue.flush()
+        self.assertEqual(DynamoDBSession(self.session.session_key)["foo"], "bar")
+
+    def test_exists_many_ignores_expired(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        self.queue.flush()
+        session_key = self.session.session_key
+        item, _ = session_engine.get_item(session_key)
+        self.queue.put(session_key, dict(item, ttl=int(time.time()) - 10))
+        cached_dynamodb.cache.delete(self.session.cache_key)
+        self.assertEqual(
+            dict(self.backend.exists_many([session_key])), {session_key: False}
+        )
+        self.assertEqual(dict(self.backend.load_many([session_key])), {})
+
+    def test_lazy_create_is_not_written_behind(self):
+        backend_module = sys.modules[self.backend._send_update.__module__]
+        with mock.patch.object(backend_module, "LAZY_CREATE", True):
+            self.session.create()
+            self.session["foo"] = "bar"
+            self.session.save()
+        self.assertIs(self.queue.pending(self.session.session_key), False)
+        self.assertEqual(DynamoDBSession(self.session.session_key)["foo"], "bar")
+
+    def test_writes_are_coalesced(self):
+        self.session.save()
+        for value in range(5):
+            self.session["foo"] = value
+            self.session.save()
+        self.assertEqual(
+            self.queue.pending(self.session.session_key)["data"],
+            self.session.encode({"foo": 4}),
+        )
+        with mock.patch.object(
+            session_engine, "batch_write", wraps=session_engine.batch_write
+        ) as batch_write:
+            self.queue.flush()
+        batch_write.assert_called_once()
+        self.assertEqual(len(batch_write.call_args[0][0]), 1)
+        self.assertEqual(DynamoDBSession(self.session.session_key)["foo"], 4)
+
+    def test_pending_delete(self):
+        self.session["foo"] = "bar"
+        self.session.save()
+        session_key = self.session.session_key
+        self.queue.flush()
+        self.session.delete()
+        self.assertIs(self.queue.pending(session_key), DELETE)
+        self.assertIs(self.backend().exists(session_key), False)
+        self.queue.flush()
+        self.assertIs(DynamoDBSession().exists(session_key), False)
+
+    def test_create_is_queued_when_unavailable(self):
+        timeout = ConnectTimeoutError(endpoint_url="http://dynamodb")
+        self.session["foo"] = "bar"
+        with mock.patch.object(
+            cached_dynamodb, "CIRCUIT_BREAKER_FALLBACK", "cache"
+        ), mock.patch.object(self.backend, "_send_update", side_effect=timeout):
+            self.session.create()
+        self.assertTrue(self.queue.pending(self.session.session_key))
+        self.assertEqual(self.backend(self.session.session_key)["foo"], "bar")
+        self.queue.flush()
+        self.assertEqual(DynamoDBSession(self.session.session_key)["foo"], "bar")
+
+    def test_full_queue_writes_synchronously(self):
+        self.queue.maxsize = 0
+        self.session.save()
+        self.session["foo"] = "bar"
+        self.session.save()
+        self.assertIs(self.queue.pending(self.session.session_key), False)
+        self.assertEqual(DynamoDBSession(self.session.session_key)["foo"], "bar")
+
+
+@skipIf(not AIOBOTOCORE_INSTALLED, "aiobotocore is not installed")
+class AsyncDynamoDBTestCase(TestCase):
+    backend = DynamoDBSession
+
+    async def test_save_and_load(self):
+        session = self.backend()
+        await session.aset("foo", "bar")
+        await session.asave()
+        self.assertIs(await session.aexists(session.session_key), True)
+        loaded = self.backend(session.session_key)
+        self.assertEqual(await loaded.aget("foo"), "bar")
+        await session.adelete()
+        self.assertIs(await session.aexists(loaded.session_key), False)
+
+    async def test_create(self):
+        session = self.backend()
+        await session.acreate()
+        self.assertIsNotNone(session.session_key)
+        self.assertIs(await session.aexists(session.session_key), True)
+        await session.adelete()
+
+    async def test_load_missing(self):
+        session = self.backend(self.backend()._get_new_session_key())
+        self.assertEqual(await session.aload(), {})
+        self.assertIsNone(session.session_key)
+
+    async def test_flush(self):
+        session = self.backend()
+        await session.aset("foo", "bar")
+        await session.asave()
+        session_key = session.session_key
+        await session.aflush()
+        self.assertIsNone(session.session_key)
+        self.assertIs(await self.backend().aexists(session_key), False)
+
+    async def test_chunked_session(self):
+        session = self.backend()
+        await session.aset("big", get_random_string(20000))
+        # The module the backend's save path reads its settings from.
+        backend_module = sys.modules[self.backend._send_update.__module__]
+        with mock.patch.object(backend_module, "CHUNK_SIZE", 4000):
+            await session.asave()
+        item, _ = await session_engine.aget_item(session.session_key)
+        keys = chunk_keys(session.session_key, item["chunks"])
+        loaded = self.backend(session.session_key)
+        self.assertEqual(await loaded.aget("big"), await session.aget("big"))
+        await loaded.adelete()
+        self.assertEqual(await session_engine.abatch_get(keys), {})
+
+    async def test_bulk_operations(self):
+        keys = []
+        for index in range(3):
+            session = self.backend()
+            await session.aset("index", index)
+            await session.asave()
+            keys.append(session.session_key)
+        loaded = {key: data async for key, data in self.backend.aload_many(keys)}
+        self.assertEqual([loaded[key]["index"] for key in keys], [0, 1, 2])
+        self.assertEqual(await self.backend.adelete_many(keys), [])
+        exists = {key: found async for key, found in self.backend.aexists_many(keys)}
+        self.assertEqual(exists, dict.fromkeys(keys, False))
+
+    async def test_aexists_many_ignores_expired(self):
+        session = self.backend()
+        await session.aset("foo", "bar")
+        await session.asave()
+        await session_engine.aupdate_item(
+            session.session_key, {"ttl": int(time.time()) - 10}
+        )
+        # Only in DynamoDB.
+        await cached_dynamodb.cache.adelete(
+            cached_dynamodb.KEY_PREFIX + session.session_key
+        )
+        exists = {
+            key: found
+            async for key, found in self.backend.aexists_many([session.session_key])
+        }
+        self.assertEqual(exists, {session.session_key: False})
+        await session.adelete()
+
+
+class AsyncCachedDynamoDBTestCase(AsyncDynamoDBTestCase):
+    backend = CachedDynamoDBSession
+
+    async def test_stale_local_entry_does_not_overwrite_other_workers(self):
+        local_caches = [cached_dynamodb.LocalCache(10, 60) for _ in range(2)]
+        session = self.backend()
+        await session.aset("cart", ["book"])
+        await session.asave()
+        session_key = session.session_key
+        with mock.patch.object(cached_dynamodb, "local_cache", local_caches[1]):
+            self.assertEqual(await self.backend(session_key).aget("cart"), ["book"])
+        with mock.patch.object(cached_dynamodb, "local_cache", local_caches[0]):
+            session = self.backend(session_key)
+            await session.aset("cart", ["book", "pen"])
+            await session.asave()
+
+        with mock.patch.object(cached_dynamodb, "local_cache", local_caches[1]):
+            session = self.backend(session_key)
+            self.assertEqual(await session.aget("cart"), ["book"])
+            await session.aset("n", 1)
+            await session.asave()
+        loaded = DynamoDBSession(session_key)
+        self.assertEqual(await loaded.aget("cart"), ["book", "pen"])
+        self.assertEqual(await loaded.aget("n"), 1)
+        await session.adelete()
@@ -0,0 +1,141 @@
+"""
+Write-behind queue flushing session writes to DynamoDB in the background.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dynamodb_sessions.engines import BATCH_WRITE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Marks a pending delete in the queue.
+DELETE = None
+
+
+class WriteBehindQueue:
+    """
+    Bounded, per-process queue of pending session writes.
+
+    Only the latest pending write (a full item to put, or ``DELETE``) is
+    kept per session key, so repeated saves of the same session coalesce
+    into one write. A single background thread flushes the queue in
+    ``BatchWriteItem`` calls, which also keeps the writes to a given key in
+    order. The queue is flushed when the process exits; after a fork, the
+    child drops what it inherited (the parent flushes it) and starts its own
+    thread.
+
+    :param engine: Engine the batches are written through.
+    :param int maxsize: Maximum number of pending keys. ``put`` refuses new
+        keys beyond it, and callers should write synchronously instead.
+    :param float flush_interval: Seconds to wait after the first pending
+        write, letting more writes coalesce before flushing.
+    """
+
+    def __init__(self, engine, maxsize=10000, flush_interval=0.05):
+        self.engine = engine
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._thread = None
+        self._pid = os.getpid()
+        atexit.register(self.close)
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending.clear()
+            self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="dynamodb-sessions-write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def put(self, session_key, item):
+        """
+        Queues ``item`` (or ``DELETE``) for ``session_key``.
+
+        :returns: ``False`` if the queue is full.
+        """
+        with self._cond:
+            self._check_fork()
+            if session_key not in self._pending and len(self._pending) >= self.maxsize:
+                return False
+            self._pending[session_key] = item
+            self._ensure_thread()
+            self._cond.notify()
+        return True
+
+    def pending(self, session_key, default=False):
+        """
+        Returns the pending item (or ``DELETE``) for ``session_key``, or
+        ``default`` if nothing is pending.
+        """
+        with self._cond:
+            self._check_fork()
+            return self._pending.get(session_key, default)
+
+    def _take(self):
+        with self._cond:
+            batch = []
+            while self._pending and len(batch) < BATCH_WRITE_SIZE:
+                batch.append(self._pending.popitem(last=False))
+            return batch
+
+    def _requeue(self, batch):
+        # Put failed writes back, unless a newer write for the key came in.
+        with self._cond:
+            for session_key, item in batch:
+                self._pending.setdefault(session_key, item)
+
+    def _write(self, batch):
+        put_items = [item for _, item in batch if item is not DELETE]
+        delete_keys = [key for key, item in batch if item is DELETE]
+        try:
+            unprocessed = set(self.engine.batch_write(put_items, delete_keys))
+        except Exception:
+            logger.exception("Write-behind flush of %d sessions failed.", len(batch))
+            self._requeue(batch)
+            return False
+        if unprocessed:
+            logger.warning("%d sessions left unprocessed, requeued.", len(unprocessed))
+            self._requeue([entry for entry in batch if entry[0] in unprocessed])
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.flush_interval)
+            while True:
+                batch = self._take()
+                if not batch:
+                    break
+                if not self._write(batch):
+                    # Back off before retrying what was requeued.
+                    time.sleep(self.flush_interval * 10)
+                    break
+
+    def flush(self, max_rounds=10):
+        """
+        Synchronously writes everything pending.
+        """
+        for _ in range(max_rounds):
+            batch = self._take()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        if self._pid == os.getpid():
+            self.flush()